@@ -0,0 +1,45 @@
+"""
+Sends public read traffic to read replicas.
+
+Replicas are the database aliases configured from ``<NAME>_DATABASE_URL``
+environment variables (see settings.DATABASE_REPLICAS). Reads only go to a
+replica while ``ReplicaRoutingMiddleware`` has marked the current request as
+a public read; admin views, writes, management commands and background tasks
+all stay on the primary.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+_use_replica = ContextVar('use_replica', default=False)
+
+# Sessions and users are read on every request and must see fresh logins
+REPLICA_APP_LABELS = {'site_admin'}
+
+
+def use_replica(enabled):
+    """Sets replica routing for the current context; returns a reset token"""
+    return _use_replica.set(enabled)
+
+
+def reset_replica(token):
+    _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICAS and _use_replica.get() and model._meta.app_label in REPLICA_APP_LABELS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive schema changes through replication
+        return db == 'default'
@@ -0,0 +1,151 @@
+import os
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.urls import Resolver404, resolve
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .db_router import reset_replica, use_replica
+
+# Views whose reads may be served by a replica
+REPLICA_VIEW_MODULES = ('public.',)
+
+# Snapshot files written by public/snapshot.py: name.<content hash>.json
+SNAPSHOT_FILE_RE = re.compile(r'^[a-z]+\.[0-9a-f]{12}\.json$')
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise middleware that also runs natively under ASGI.
+
+    Stock WhiteNoise is sync-only, which makes Django run every request under
+    ASGI on a worker thread and cancels out async views. Outside autorefresh
+    mode a static file lookup is a dict lookup, so it is safe on the event loop.
+
+    It also serves the atlas snapshot directory under STATIC_URL + 'atlas/'.
+    Snapshots are rebuilt while the server runs, so a hashed snapshot file
+    missing from the startup scan is looked up on disk once and remembered.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        # Set once the static prefix is known; the startup scan runs before
+        self.snapshot_prefix = None
+        super().__init__(get_response, *args, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+        self.snapshot_root = os.path.abspath(settings.ATLAS_SNAPSHOT_DIR)
+        self.snapshot_prefix = f'{self.static_prefix}atlas/'
+        if self.autorefresh or os.path.isdir(self.snapshot_root):
+            self.add_files(self.snapshot_root, prefix=self.snapshot_prefix)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        static_file = self.lookup(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+            if static_file is None and self.is_snapshot_url(request.path_info):
+                static_file = await sync_to_async(self.find_snapshot_file)(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+    def lookup(self, url):
+        if self.autorefresh:
+            return self.find_file(url)
+        static_file = self.files.get(url)
+        if static_file is None and self.is_snapshot_url(url):
+            static_file = self.find_snapshot_file(url)
+        return static_file
+
+    def is_snapshot_url(self, url):
+        if self.snapshot_prefix is None or not url.startswith(self.snapshot_prefix):
+            return False
+        return bool(SNAPSHOT_FILE_RE.match(url[len(self.snapshot_prefix):]))
+
+    def find_snapshot_file(self, url):
+        path = os.path.join(self.snapshot_root, url[len(self.snapshot_prefix):])
+        if not os.path.isfile(path):
+            return None
+        self.add_file_to_dictionary(url, path)
+        return self.files.get(url)
+
+    def immutable_file_test(self, path, url):
+        if self.is_snapshot_url(url):
+            return True
+        return super().immutable_file_test(path, url)
+
+
+PRIMARY_PIN_COOKIE = 'primary_pin'
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Marks GET/HEAD requests to public views as safe to read from a replica.
+
+    Any write request sets a short-lived cookie that pins the client to the
+    primary, so the admin's redirect after saving a college (and the next
+    few page views) read their own writes despite replication lag.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = use_replica(self.replica_allowed(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_replica(token)
+        return self.pin_after_write(request, response)
+
+    async def __acall__(self, request):
+        token = use_replica(self.replica_allowed(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            reset_replica(token)
+        return self.pin_after_write(request, response)
+
+    def replica_allowed(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return False
+        if request.method not in ('GET', 'HEAD') or PRIMARY_PIN_COOKIE in request.COOKIES:
+            return False
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return match.func.__module__.startswith(REPLICA_VIEW_MODULES)
+
+    def pin_after_write(self, request, response):
+        if settings.DATABASE_REPLICAS and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE,
+                '1',
+                max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -52,13 +52,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'college_atlas.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'college_atlas.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'college_atlas.urls'
@@ -99,6 +100,103 @@ if not DATABASES['default']:
         }
     }
 
+# Read replicas: every other <NAME>_DATABASE_URL variable adds a database alias
+# <name>, e.g. REPLICA_DATABASE_URL -> 'replica'. Public GET requests read from
+# them; everything else uses the primary. Locally two SQLite files work too:
+# REPLICA_DATABASE_URL=sqlite:///replica.sqlite3 with a copy of db.sqlite3.
+
+DATABASE_REPLICAS = []
+for key, url in sorted(os.environ.items()):
+    if key.endswith('_DATABASE_URL') and url:
+        alias = key[:-len('_DATABASE_URL')].lower()
+        DATABASES[alias] = dj_database_url.parse(
+            url,
+            conn_max_age=600,
+            conn_health_checks=True,
+            ssl_require=not url.startswith('sqlite'),
+        )
+        DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+        DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['college_atlas.db_router.ReplicaRouter']
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    # Trigram lookups (pg_trgm) for the fuzzy college search
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+# How long a client reads from the primary after making a write, to cover
+# replication lag on the redirect that follows a save
+DATABASE_REPLICA_PIN_SECONDS = 10
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            # Room for one cached card per college plus derived data
+            'MAX_ENTRIES': 20000,
+        },
+    }
+}
+
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+
+
+# Pagination
+# Filtered result sets larger than this are counted from planner estimates
+# (Postgres) or a per-query cached count instead of an exact COUNT(*).
+
+PAGINATOR_EXACT_COUNT_THRESHOLD = int(os.environ.get('PAGINATOR_EXACT_COUNT_THRESHOLD', 1000))
+PAGINATOR_COUNT_CACHE_TIMEOUT = 60 * 15
+
+# Rendered college cards are keyed by row version, so they can live long
+COLLEGE_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+API_CACHE_TIMEOUT = 60 * 15
+# Seconds a process trusts its copy of the dataset version before reading
+# it from the database again, i.e. how long writes made by another process
+# can take to reach this one's caches and college index
+DATASET_VERSION_CHECK_INTERVAL = 2
+PUBLIC_PAGE_CACHE_TIMEOUT = 60 * 15
+
+# Token bucket rate limits per client IP for the public endpoints that
+# scrapers walk, as "<requests>/<second|minute|hour|day>". The whole bucket
+# may be spent in a burst; it refills evenly over the period. Limits are
+# shared across workers only with a shared cache (REDIS_URL).
+
+THROTTLE_ENABLED = os.environ.get('THROTTLE_ENABLED', 'True').lower() == 'true'
+THROTTLE_RATES = {
+    'geography': '120/minute',
+    'listing': '60/minute',
+    'api': '120/minute',
+}
+# Proxies in front of the app that append to X-Forwarded-For (Render has one)
+THROTTLE_PROXY_COUNT = int(os.environ.get('THROTTLE_PROXY_COUNT', 1 if RENDER_EXTERNAL_HOSTNAME else 0))
+
+# /api/changes/ holds back rows younger than this so that transactions still
+# committing are not skipped, and returns at most this many changes per page
+CHANGE_FEED_SETTLE_SECONDS = 5
+CHANGE_FEED_PAGE_SIZE = 500
+
+# Most colleges /api/colleges/ returns details for in one request
+COLLEGE_API_MAX_IDS = 100
+
+# Largest page of the /api/v1/ list endpoints (and the default ?limit=)
+API_V1_PAGE_SIZE = 100
+
+# Listing search: words of the query that match nothing are corrected to
+# known names at least this trigram-similar (0-1), and an empty result
+# offers up to SEARCH_SUGGESTION_LIMIT "did you mean" alternatives
+SEARCH_SIMILARITY_THRESHOLD = 0.35
+SEARCH_SUGGESTION_LIMIT = 3
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -136,11 +234,75 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Precompressed, content-hashed JSON snapshots of the public data (see
+# public/snapshot.py), served by WhiteNoise under STATIC_URL + 'atlas/'.
+# They are rebuilt in the background ATLAS_SNAPSHOT_DEBOUNCE seconds after
+# the first edit of a burst, and at most ATLAS_SNAPSHOT_MAX_DELAY seconds
+# after it while edits keep coming. Until then pages use the live API.
+
+ATLAS_SNAPSHOT_ENABLED = os.environ.get('ATLAS_SNAPSHOT_ENABLED', 'True').lower() == 'true'
+ATLAS_SNAPSHOT_DIR = os.environ.get('ATLAS_SNAPSHOT_DIR', BASE_DIR / 'snapshots')
+ATLAS_SNAPSHOT_DEBOUNCE = 30
+ATLAS_SNAPSHOT_MAX_DELAY = 120
+
+# The map page draws a heat layer from /api/map/density/ at this zoom and
+# below, and individual markers only once zoomed in further
+MAP_HEATMAP_MAX_ZOOM = 7
 
 MEDIA_URL = '/college_images/'
 MEDIA_ROOT = BASE_DIR / 'college_images'
 
+# External college images (College.image_url) are fetched once, resized and
+# served locally from a size-bounded LRU cache on disk
+
+IMAGE_PROXY_ENABLED = os.environ.get('IMAGE_PROXY_ENABLED', 'True').lower() == 'true'
+IMAGE_PROXY_CACHE_DIR = os.environ.get('IMAGE_PROXY_CACHE_DIR', BASE_DIR / 'image_cache')
+IMAGE_PROXY_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_PROXY_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+IMAGE_PROXY_FETCHER = 'public.image_proxy.urllib_fetcher'
+IMAGE_PROXY_TIMEOUT = 5
+IMAGE_PROXY_MAX_SOURCE_BYTES = 10 * 1024 * 1024
+IMAGE_PROXY_FAILURE_TTL = 60 * 10
+
+# Background tasks are stored in the database and run by `manage.py run_worker`.
+# Without a separate worker process, the embedded worker drains the queue on a
+# thread in the web process instead.
+
+TASK_QUEUE_EMBEDDED_WORKER = os.environ.get('TASK_QUEUE_EMBEDDED_WORKER', 'True').lower() == 'true'
+TASK_QUEUE_CONCURRENCY = {
+    'default': 2,
+    'images': 1,
+    'imports': 1,
+}
+TASK_LOCK_TIMEOUT = 60 * 30
+TASK_RETRY_BACKOFF = 30
+TASK_POLL_INTERVAL = 2
+# Longest the embedded worker sleeps between looks at the queue, and how
+# often it returns tasks left running by a restarted process
+TASK_EMBEDDED_MAX_SLEEP = 60
+
+IMPORT_DATA_DIR = BASE_DIR / 'data'
+
+# Uploaded CSV/XLSX files wait here until the import task has read them; a
+# separate worker service needs this on a disk it shares with the web service
+BULK_IMPORT_UPLOAD_DIR = os.environ.get('BULK_IMPORT_UPLOAD_DIR', BASE_DIR / 'imports')
+BULK_IMPORT_MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+# District boundary polygons (GeoJSON) for assigning districts to colleges
+# from their coordinates, during imports and with `manage.py assign_districts`.
+# Points outside every polygon take the nearest district centroid up to this
+# far away.
+DISTRICT_BOUNDARIES_FILE = os.environ.get('DISTRICT_BOUNDARIES_FILE', BASE_DIR / 'data' / 'district_boundaries.geojson')
+GEOCODER_MAX_FALLBACK_KM = 25
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/6.0/ref/settings/#default-auto-field
 
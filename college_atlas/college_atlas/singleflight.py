@@ -0,0 +1,121 @@
+"""
+Single-flight cache reads with stale-while-revalidate.
+
+``get_or_build`` keeps a value in the cache inside an envelope that records
+when it goes stale and which data version it was built from. When it is
+stale, exactly one caller rebuilds it: threads in a process coordinate
+through a lock per key (striped), processes through a short lease stored in the cache.
+Everyone else keeps serving the previous value instead of piling onto the
+database. Only a cold miss (no previous value at all) makes callers wait,
+and then only for the one rebuild in flight.
+"""
+import logging
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+ENVELOPE_VERSION = 1
+
+# Polling interval while another process builds a missing value
+WAIT_INTERVAL = 0.05
+
+# Keys share a fixed set of locks, picked by hash, so that memory does not
+# grow with the distinct keys seen (facet keys come from free-text queries).
+# Reentrant: a build may itself read another key that lands on its lock.
+LOCK_STRIPES = 64
+_locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
+
+
+def _lock_for(key):
+    return _locks[hash(key) % LOCK_STRIPES]
+
+
+def _lease_key(key):
+    return f'singleflight-lease:{key}'
+
+
+def _is_fresh(envelope, version):
+    return envelope['data_version'] == version and time.time() < envelope['fresh_until']
+
+
+def _read(key):
+    envelope = cache.get(key)
+    if not isinstance(envelope, dict) or envelope.get('envelope') != ENVELOPE_VERSION:
+        return None
+    return envelope
+
+
+def _build_and_store(key, build, ttl, stale_ttl, version):
+    value = build()
+    cache.set(key, {
+        'envelope': ENVELOPE_VERSION,
+        'value': value,
+        'data_version': version,
+        'fresh_until': time.time() + ttl,
+    }, ttl + stale_ttl)
+    return value
+
+
+def _acquire_lease(key, lease_timeout):
+    token = uuid.uuid4().hex
+    return token if cache.add(_lease_key(key), token, lease_timeout) else None
+
+
+def _release_lease(key, token):
+    if cache.get(_lease_key(key)) == token:
+        cache.delete(_lease_key(key))
+
+
+def get_or_build(key, build, ttl, stale_ttl=60 * 60, version=None, lease_timeout=30):
+    """
+    Returns the cached value for ``key``, calling ``build()`` to produce it.
+
+    The value is fresh for ``ttl`` seconds and for as long as ``version``
+    (e.g. the dataset version) is unchanged; after that it is served stale
+    for up to ``stale_ttl`` more seconds while a single caller rebuilds it.
+    ``lease_timeout`` bounds how long a crashed rebuild can block others.
+    """
+    envelope = _read(key)
+    if envelope is not None and _is_fresh(envelope, version):
+        return envelope['value']
+
+    lock = _lock_for(key)
+
+    if envelope is not None:
+        # Stale: one caller refreshes, everyone else serves the old value
+        if not lock.acquire(blocking=False):
+            return envelope['value']
+        try:
+            token = _acquire_lease(key, lease_timeout)
+            if token is None:
+                return envelope['value']
+            try:
+                return _build_and_store(key, build, ttl, stale_ttl, version)
+            except Exception:
+                logger.exception('Rebuilding %s failed; serving the stale value', key)
+                return envelope['value']
+            finally:
+                _release_lease(key, token)
+        finally:
+            lock.release()
+
+    # Cold miss: wait for whichever thread or process is already building
+    with lock:
+        deadline = time.time() + lease_timeout
+        while True:
+            envelope = _read(key)
+            if envelope is not None:
+                return envelope['value']
+            token = _acquire_lease(key, lease_timeout)
+            if token is not None:
+                try:
+                    return _build_and_store(key, build, ttl, stale_ttl, version)
+                finally:
+                    _release_lease(key, token)
+            if time.time() >= deadline:
+                return _build_and_store(key, build, ttl, stale_ttl, version)
+            time.sleep(WAIT_INTERVAL)
@@ -0,0 +1,184 @@
+"""
+Per-client rate limiting for public endpoints.
+
+Each (scope, client IP) pair gets a token bucket, implemented as GCRA: the
+cache holds a single "theoretical arrival time" per bucket, so a check is
+one round trip. With the Redis cache the check runs as a Lua script, which
+makes it atomic across every gunicorn worker; other backends fall back to a
+lock that is only process-wide, which is exact for the local memory cache.
+
+Rates come from settings.THROTTLE_RATES as ``"<count>/<period>"``. A bucket
+holds ``count`` requests and refills continuously over ``period``.
+"""
+import logging
+import math
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+METRICS_KEY = 'throttle-metrics'
+
+# KEYS[1] = bucket; ARGV = interval and burst window in milliseconds.
+# Returns 0 when allowed, otherwise the milliseconds until it would be.
+GCRA_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval
+local allow_at = new_tat - window
+if now < allow_at then
+    return allow_at - now
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return 0
+"""
+
+_local_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """``'120/minute'`` -> (120, 60)"""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period.strip()[0].lower()]
+
+
+def client_ip(request):
+    """
+    The client address, taken from X-Forwarded-For when the app runs behind
+    THROTTLE_PROXY_COUNT trusted proxies (the rightmost entries are theirs)
+    """
+    proxies = settings.THROTTLE_PROXY_COUNT
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if proxies and forwarded:
+        addresses = [address.strip() for address in forwarded.split(',')]
+        return addresses[max(len(addresses) - proxies, 0)]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _redis_client(key):
+    # Django's Redis backend has no public hook for scripts
+    client = getattr(cache, '_cache', None)
+    if client is None or not hasattr(client, 'get_client'):
+        return None
+    return client.get_client(key, write=True)
+
+
+def _check_local(key, interval, window):
+    now = int(time.time() * 1000)
+    with _local_lock:
+        tat = max(cache.get(key) or now, now)
+        new_tat = tat + interval
+        allow_at = new_tat - window
+        if now < allow_at:
+            return allow_at - now
+        cache.set(key, new_tat, math.ceil((new_tat - now) / 1000))
+        return 0
+
+
+def check(scope, ident):
+    """
+    Takes one token from the bucket of ``ident`` in ``scope``. Returns 0 if
+    the request may proceed, otherwise the seconds to wait before retrying.
+    """
+    count, period = parse_rate(settings.THROTTLE_RATES[scope])
+    interval = period * 1000 // count
+    window = period * 1000
+    key = f'throttle:{scope}:{ident}'
+
+    try:
+        redis = _redis_client(key)
+        if redis is not None:
+            wait = redis.eval(GCRA_SCRIPT, 1, cache.make_and_validate_key(key), interval, window)
+        else:
+            wait = _check_local(key, interval, window)
+    except Exception:
+        # A cache outage must not take the endpoints down with it
+        logger.exception('Throttle check for %s failed; allowing the request', scope)
+        return 0
+    return math.ceil(int(wait) / 1000)
+
+
+def _record_throttled(scope):
+    key = f'{METRICS_KEY}:{scope}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+    cache.set(f'{key}:last', timezone.now().isoformat(), timeout=None)
+
+
+def throttled_counts():
+    """Throttled request counts and last occurrence per scope, for the metrics API"""
+    keys = {
+        scope: (f'{METRICS_KEY}:{scope}', f'{METRICS_KEY}:{scope}:last')
+        for scope in settings.THROTTLE_RATES
+    }
+    values = cache.get_many([key for pair in keys.values() for key in pair])
+    return {
+        scope: {
+            'rate': settings.THROTTLE_RATES[scope],
+            'throttled': values.get(count_key, 0),
+            'last_throttled': values.get(last_key),
+        }
+        for scope, (count_key, last_key) in keys.items()
+    }
+
+
+def _allow(request, scope):
+    if not settings.THROTTLE_ENABLED:
+        return 0
+    wait = check(scope, client_ip(request))
+    if wait:
+        _record_throttled(scope)
+        logger.warning('Throttled %s from %s on %s', scope, client_ip(request), request.path)
+    return wait
+
+
+def _too_many_requests(request, wait):
+    if request.path.startswith('/api/'):
+        response = JsonResponse({'error': 'Too many requests', 'retry_after': wait}, status=429)
+    else:
+        response = HttpResponse(f'Too many requests; try again in {wait} seconds.', status=429, content_type='text/plain')
+    response['Retry-After'] = str(max(wait, 1))
+    return response
+
+
+def throttle(scope):
+    """
+    View decorator applying the ``scope`` rate from THROTTLE_RATES per
+    client IP. Works for sync and async views.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                wait = await sync_to_async(_allow, thread_sensitive=False)(request, scope)
+                if wait:
+                    return _too_many_requests(request, wait)
+                return await view(request, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            wait = _allow(request, scope)
+            if wait:
+                return _too_many_requests(request, wait)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,269 @@
+"""
+Versioned read API under /api/v1/ for third-party consumers.
+
+Every list endpoint takes ``fields=`` (a sparse fieldset: only the columns
+behind the requested fields are selected), ``limit=`` and an opaque
+``after=`` cursor, and answers ``{'results': [...], 'next': token,
+'has_more': bool}`` like the change feed. Pages are ordered by id, or by
+distance for colleges sorted that way, so they stay put while rows are
+added.
+
+/colleges filters exactly like the listing page (q, country, state,
+district, type, degree, university, sort=distance&lat=&lng=), on the
+in-memory CollegeIndex, and loads only the colleges of the page.
+
+A malformed or unknown parameter is answered with 400 and
+``{'error': message}`` rather than ignored.
+
+Responses are encoded with orjson when it is installed.
+"""
+import base64
+import json
+import math
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from site_admin.models import College, Degree, District, State
+from college_atlas.throttling import throttle
+from .college_api import college_queryset, parse_fields, serialize_college
+from .college_index import get_college_index
+from .facets import FILTER_PARAMS, ID_PARAMS, SORT_PARAMS, SORTS, normalize_filters
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Query parameters every list endpoint takes; any other is rejected
+LIST_PARAMS = ('fields', 'limit', 'after')
+COLLEGE_PARAMS = (*LIST_PARAMS, *FILTER_PARAMS, *SORT_PARAMS)
+
+COLLEGE_DEFAULT_FIELDS = (
+    'name', 'university_id', 'university', 'college_type', 'district_id', 'district', 'latitude', 'longitude', 'url',
+)
+
+
+def _extent(row, part):
+    if not row['located_colleges']:
+        return None
+    if part == 'centroid':
+        return [row['centroid_latitude'], row['centroid_longitude']]
+    return [[row['min_latitude'], row['min_longitude']], [row['max_latitude'], row['max_longitude']]]
+
+
+# Field name -> (columns for .values(), value from the row)
+REGION_FIELDS = {
+    'located_colleges': (('located_colleges',), lambda row: row['located_colleges']),
+    'centroid': (
+        ('located_colleges', 'centroid_latitude', 'centroid_longitude'),
+        lambda row: _extent(row, 'centroid'),
+    ),
+    'bbox': (
+        ('located_colleges', 'min_latitude', 'min_longitude', 'max_latitude', 'max_longitude'),
+        lambda row: _extent(row, 'bbox'),
+    ),
+}
+
+MODEL_FIELDS = {
+    'state': {
+        'name': (('name',), lambda row: row['name']),
+        'country_id': (('country_id',), lambda row: row['country_id']),
+        'country': (('country__name',), lambda row: row['country__name']),
+        **REGION_FIELDS,
+    },
+    'district': {
+        'name': (('name',), lambda row: row['name']),
+        'state_id': (('state_id',), lambda row: row['state_id']),
+        'state': (('state__name',), lambda row: row['state__name']),
+        **REGION_FIELDS,
+    },
+    'degree': {
+        'name': (('name',), lambda row: row['name']),
+        'duration_years': (('duration_years',), lambda row: row['duration_years']),
+    },
+}
+
+
+def api_response(payload, status=200):
+    if orjson is not None:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return HttpResponse(body, status=status, content_type='application/json')
+
+
+def _error(message):
+    return api_response({'error': message}, status=400)
+
+
+def encode_cursor(*parts):
+    raw = ':'.join(repr(part) for part in parts)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, types):
+    """Parses an ``after`` token into values of ``types``; raises ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        parts = raw.split(':')
+        if len(parts) != len(types):
+            raise ValueError
+        values = tuple(kind(part) for kind, part in zip(types, parts))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor token')
+    if not all(math.isfinite(value) for value in values):
+        raise ValueError('Invalid cursor token')
+    return values
+
+
+def _check_params(params, allowed):
+    unknown = set(params) - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown parameter{'s' if len(unknown) > 1 else ''}: {', '.join(sorted(unknown))}")
+
+
+def _limit(params):
+    """The page size from ?limit=, capped at API_V1_PAGE_SIZE; raises ValueError"""
+    limit = settings.API_V1_PAGE_SIZE
+    value = params.get('limit', '')
+    if value:
+        if not (value.isascii() and value.isdigit()) or int(value) < 1:
+            raise ValueError('limit must be a positive integer')
+        limit = min(int(value), limit)
+    return limit
+
+
+def _fields(params, available, default):
+    requested = [field.strip() for field in params.get('fields', '').split(',') if field.strip()]
+    if not requested:
+        return tuple(default)
+    unknown = set(requested) - set(available) - {'id'}
+    if unknown:
+        raise ValueError(f"Unknown field{'s' if len(unknown) > 1 else ''}: {', '.join(sorted(unknown))}")
+    return tuple(field for field in available if field in requested)
+
+
+@require_GET
+@throttle('api')
+def colleges(request):
+    """Colleges matching the listing filters, with a sparse fieldset"""
+    try:
+        _check_params(request.GET, COLLEGE_PARAMS)
+        fields = parse_fields(request.GET.get('fields'), default=COLLEGE_DEFAULT_FIELDS)
+        limit = _limit(request.GET)
+        _id_filters(request.GET, dict.fromkeys(ID_PARAMS))
+        filters = normalize_filters(request.GET)
+        _check_sort(request.GET, filters)
+    except ValueError as e:
+        return _error(str(e))
+    index = get_college_index()
+    mask = index.match(filters)
+    token = request.GET.get('after', '')
+
+    distances = {}
+    try:
+        if filters['sort'] == 'distance':
+            after = decode_cursor(token, (float, int)) if token else None
+            ids, page_distances, next_cursor, _ = index.nearest(
+                mask, float(filters['lat']), float(filters['lng']), limit, after,
+            )
+            ids = ids.tolist()
+            distances = dict(zip(ids, page_distances.tolist()))
+            has_more = next_cursor is not None
+            next_token = encode_cursor(*next_cursor) if has_more else ''
+        else:
+            after = decode_cursor(token, (int,))[0] if token else 0
+            ids = index.ids_after(mask, after, limit + 1).tolist()
+            has_more = len(ids) > limit
+            ids = ids[:limit]
+            next_token = encode_cursor(ids[-1]) if ids else token
+    except ValueError as e:
+        return _error(str(e))
+
+    loaded = {college.pk: college for college in college_queryset(fields).filter(pk__in=ids)}
+    results = []
+    for pk in ids:
+        if pk in loaded:
+            data = serialize_college(loaded[pk], fields)
+            if pk in distances:
+                data['distance_km'] = round(distances[pk], 3)
+            results.append(data)
+    return api_response({'results': results, 'next': next_token, 'has_more': has_more})
+
+
+def _check_sort(params, filters):
+    """Raises ValueError for the type and sort parameters normalize_filters would drop"""
+    if params.get('type') and not filters['type']:
+        raise ValueError(f"type must be one of: {', '.join(dict(College.COLLEGE_TYPES))}")
+    if params.get('sort') and params['sort'] not in SORTS:
+        raise ValueError(f"sort must be one of: {', '.join(SORTS)}")
+    if params.get('sort') and not filters['sort']:
+        raise ValueError('sort=distance needs lat between -90 and 90 and lng between -180 and 180')
+    if (params.get('lat') or params.get('lng')) and not params.get('sort'):
+        raise ValueError('lat and lng are only used with sort=distance')
+
+
+def _model_list(request, model, name, filters, allowed=()):
+    available = MODEL_FIELDS[name]
+    try:
+        _check_params(request.GET, (*LIST_PARAMS, *allowed))
+        fields = _fields(request.GET, available, available)
+        limit = _limit(request.GET)
+        after = decode_cursor(request.GET['after'], (int,))[0] if request.GET.get('after') else 0
+    except ValueError as e:
+        return _error(str(e))
+
+    columns = {'id', *(column for field in fields for column in available[field][0])}
+    rows = list(
+        model.objects.filter(pk__gt=after, **filters).order_by('pk').values(*sorted(columns))[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    results = [
+        {'id': row['id'], **{field: available[field][1](row) for field in fields}}
+        for row in rows
+    ]
+    next_token = encode_cursor(rows[-1]['id']) if rows else request.GET.get('after', '')
+    return api_response({'results': results, 'next': next_token, 'has_more': has_more})
+
+
+def _id_filters(params, names):
+    """Queryset filters from the id parameters given, e.g. ?state=3"""
+    filters = {}
+    for param, lookup in names.items():
+        value = params.get(param, '')
+        if value:
+            if not (value.isascii() and value.isdigit()):
+                raise ValueError(f'{param} must be an id')
+            filters[lookup] = int(value)
+    return filters
+
+
+@require_GET
+@throttle('api')
+def states(request):
+    """States, optionally of one ?country="""
+    try:
+        filters = _id_filters(request.GET, {'country': 'country_id'})
+    except ValueError as e:
+        return _error(str(e))
+    return _model_list(request, State, 'state', filters, allowed=('country',))
+
+
+@require_GET
+@throttle('api')
+def districts(request):
+    """Districts, optionally of one ?state= or ?country="""
+    try:
+        filters = _id_filters(request.GET, {'state': 'state_id', 'country': 'state__country_id'})
+    except ValueError as e:
+        return _error(str(e))
+    return _model_list(request, District, 'district', filters, allowed=('state', 'country'))
+
+
+@require_GET
+@throttle('api')
+def degrees(request):
+    """Degrees"""
+    return _model_list(request, Degree, 'degree', {})
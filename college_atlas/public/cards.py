@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from site_admin.models import College
+# The version of everything a card shows besides the college row itself:
+# the degree set and the district/state names. Bumped by public.signals.
+from site_admin.versioning import get_card_version
+
+CARD_TEMPLATES = {
+    'card': 'public/partials/college_card.html',
+    'map': 'public/partials/map_college_item.html',
+}
+
+
+def _get(college, field):
+    if isinstance(college, dict):
+        return college[field]
+    return getattr(college, field)
+
+
+def card_cache_key(kind, college, version):
+    updated_at = _get(college, 'updated_at')
+    stamp = int(updated_at.timestamp() * 1000000) if updated_at else 0
+    return f"college-card:{kind}:{_get(college, 'id')}:{stamp}:{version}"
+
+
+def _annotate_degree_counts(colleges):
+    """Attach degree_count to model instances with one grouped query"""
+    instances = [college for college in colleges if not isinstance(college, dict)]
+    if not instances:
+        return
+    counts = dict(
+        College.degrees.through.objects
+        .filter(college_id__in=[college.id for college in instances])
+        .values_list('college_id')
+        .annotate(total=Count('id'))
+    )
+    for college in instances:
+        college.degree_count = counts.get(college.id, 0)
+
+
+def render_college_cards(colleges, kind='card'):
+    """
+    Returns the rendered markup for each college in ``colleges``, in order.
+
+    Every card on the page is looked up in a single ``get_many`` keyed by
+    ``(college.id, college.updated_at, card version)``; only the misses are
+    rendered and written back with one ``set_many``. ``colleges`` may be
+    model instances or ``.values()`` dicts that include ``updated_at``.
+    """
+    colleges = list(colleges)
+    version = get_card_version()
+    keys = [card_cache_key(kind, college, version) for college in colleges]
+    cached = cache.get_many(keys)
+
+    missing = [college for college, key in zip(colleges, keys) if key not in cached]
+    if missing:
+        if kind == 'card':
+            _annotate_degree_counts(missing)
+        template_name = CARD_TEMPLATES[kind]
+        rendered = {
+            card_cache_key(kind, college, version): render_to_string(template_name, {'college': college})
+            for college in missing
+        }
+        cache.set_many(rendered, settings.COLLEGE_CARD_CACHE_TIMEOUT)
+        cached.update(rendered)
+
+    return [mark_safe(cached[key]) for key in keys]
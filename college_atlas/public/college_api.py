@@ -0,0 +1,99 @@
+"""
+Sparse field sets for the college JSON APIs.
+
+Clients name the fields they want; the queryset loads only the columns
+behind them (.only()), joins the district and state only when asked for,
+and prefetches degrees in one extra query for the whole batch.
+"""
+from django.db.models import Prefetch
+from django.urls import reverse
+from site_admin.models import College, Degree
+from .templatetags.college_images import college_image_url
+
+# Field name -> columns it needs. 'district' adds the state name too,
+# 'degrees' is prefetched, 'url' needs nothing beyond the id.
+FIELDS = {
+    'name': ('name',),
+    'university_id': ('university',),
+    'university': ('university__name',),
+    'college_type': ('college_type',),
+    'college_type_display': ('college_type',),
+    'address_line': ('address_line',),
+    'pincode': ('pincode',),
+    'website': ('website',),
+    'email': ('email',),
+    'phone_number': ('phone_number',),
+    'latitude': ('latitude',),
+    'longitude': ('longitude',),
+    'district_id': ('district',),
+    'district': ('district__name', 'district__state__name'),
+    'degrees': (),
+    'image': ('image', 'image_url', 'image_variants'),
+    'url': (),
+    'updated_at': ('updated_at',),
+}
+
+DEFAULT_FIELDS = ('name', 'university', 'college_type_display', 'district', 'url')
+
+
+def parse_fields(value, default=DEFAULT_FIELDS):
+    """
+    The requested field names from a comma separated parameter, in FIELDS
+    order. 'id' is accepted but always included. Raises ValueError naming
+    any unknown field.
+    """
+    requested = {field.strip() for field in (value or '').split(',') if field.strip()}
+    if not requested:
+        return tuple(default)
+    unknown = requested - set(FIELDS) - {'id'}
+    if unknown:
+        raise ValueError(f"Unknown field{'s' if len(unknown) > 1 else ''}: {', '.join(sorted(unknown))}")
+    return tuple(field for field in FIELDS if field in requested)
+
+
+def college_queryset(fields):
+    """Colleges loading just the columns and relations behind ``fields``"""
+    columns = {'id', *(column for field in fields for column in FIELDS[field])}
+    colleges = College.objects.order_by().only(*sorted(columns))
+    if 'district' in fields:
+        colleges = colleges.select_related('district__state')
+    if 'university' in fields:
+        colleges = colleges.select_related('university')
+    if 'degrees' in fields:
+        colleges = colleges.prefetch_related(
+            Prefetch('degrees', queryset=Degree.objects.only('id', 'name').order_by('name')),
+        )
+    return colleges
+
+
+def _float(value):
+    return float(value) if value is not None else None
+
+
+def serialize_college(college, fields):
+    data = {'id': college.pk}
+    for field in fields:
+        if field == 'district':
+            data['district'] = college.district.name
+            data['state'] = college.district.state.name
+        elif field == 'district_id':
+            data[field] = college.district_id
+        elif field == 'university':
+            data[field] = college.university.name if college.university_id else None
+        elif field == 'university_id':
+            data[field] = college.university_id
+        elif field == 'degrees':
+            data['degrees'] = [{'id': degree.pk, 'name': degree.name} for degree in college.degrees.all()]
+        elif field == 'college_type_display':
+            data[field] = college.get_college_type_display()
+        elif field in ('latitude', 'longitude'):
+            data[field] = _float(getattr(college, field))
+        elif field == 'image':
+            data['image'] = college_image_url(college, 'popup') or None
+        elif field == 'url':
+            data['url'] = reverse('college_detail', args=[college.pk])
+        elif field == 'updated_at':
+            data[field] = college.updated_at.isoformat()
+        else:
+            data[field] = getattr(college, field)
+    return data
@@ -0,0 +1,320 @@
+"""
+Process-local columnar snapshot of the College table for the listing.
+
+Colleges are held in name order as NumPy columns (ids, names, coordinates,
+type/district/state/country/university codes) plus packed bitmaps with one
+bit per college for every district, state, country, type and degree. A
+filter combination is a handful of bitwise ANDs over those bitmaps, facet
+counts are bincounts over the matching rows, and the listing only asks the
+database for the colleges on the page being shown.
+
+Text search matches names as substrings, widened by the SearchAlias
+synonyms; search.py adds spelling suggestions on top.
+
+Sorting by distance only computes haversine distances for the matching
+colleges inside a bounding box around the point, widening the box until it
+holds a full page, and pages with a (distance, id) cursor.
+
+The snapshot records the dataset version it was built from. When the
+version moves on, one thread rebuilds it while the others keep using the
+previous snapshot. It is always read from the primary: a lagging replica
+would leave it stale under the new version until the next write.
+"""
+import threading
+from functools import cached_property
+
+import numpy as np
+from site_admin.models import College, Country, Degree, District, SearchAlias, State, University
+from site_admin.universities import university_key
+from site_admin.versioning import get_dataset_version
+from college_atlas.db_router import reset_replica, use_replica
+from .search import MIN_WORD_LENGTH, TrigramIndex, WordIndex, alias_variants, compile_aliases, words
+
+COLLEGE_TYPES = tuple(code for code, _ in College.COLLEGE_TYPES)
+
+BITMAP_PARAMS = ('country', 'state', 'district', 'type', 'degree')
+
+EARTH_RADIUS_KM = 6371.0
+
+# First radius searched when sorting by distance; quadrupled until a page is found
+NEAREST_INITIAL_RADIUS_KM = 25.0
+
+_current = {'index': None}
+_rebuild_lock = threading.Lock()
+
+
+def _lower_strings(values):
+    return np.array([value.lower() for value in values], dtype=np.dtypes.StringDType())
+
+
+def _codes(values, vocabulary):
+    """Maps ids to positions in ``vocabulary``; -1 where missing"""
+    lookup = {value: code for code, value in enumerate(vocabulary)}
+    return np.fromiter((lookup.get(value, -1) for value in values), dtype=np.int32, count=len(values))
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """Great circle distances from one point to arrays of points"""
+    lat1, lng1 = np.radians(latitude), np.radians(longitude)
+    lat2, lng2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(1.0, a)))
+
+
+def _bitmaps(codes, vocabulary, size):
+    """Packed bitmap of the rows having each value, keyed by value"""
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(vocabulary) + 1))
+    bitmaps = {}
+    for code, value in enumerate(vocabulary):
+        bits = np.zeros(size, dtype=bool)
+        bits[order[bounds[code]:bounds[code + 1]]] = True
+        bitmaps[value] = np.packbits(bits)
+    return bitmaps
+
+
+class CollegeIndex:
+    def __init__(self, version):
+        self.version = version
+
+        rows = list(
+            College.objects.order_by('name', 'id').values_list(
+                'id', 'name', 'latitude', 'longitude', 'college_type', 'district_id', 'university_id',
+            )
+        )
+        size = self.size = len(rows)
+        ids, names, latitudes, longitudes, types, districts, universities = list(zip(*rows)) or [()] * 7
+
+        self.ids = np.array(ids, dtype=np.int64)
+        self.positions = {pk: position for position, pk in enumerate(ids)}
+        self.names_lower = _lower_strings(names)
+        self.name_words = WordIndex(self.names_lower)
+        self.latitudes = np.array([np.nan if value is None else float(value) for value in latitudes], dtype=np.float64)
+        self.longitudes = np.array([np.nan if value is None else float(value) for value in longitudes], dtype=np.float64)
+
+        district_rows = list(District.objects.order_by('id').values_list('id', 'name', 'state_id'))
+        state_rows = list(State.objects.order_by('id').values_list('id', 'name', 'country_id'))
+        self.district_ids = [pk for pk, _, _ in district_rows]
+        self.district_names = {pk: name for pk, name, _ in district_rows}
+        self.district_state = {pk: state_id for pk, _, state_id in district_rows}
+        self.state_ids = [pk for pk, _, _ in state_rows]
+        self.state_names = {pk: name for pk, name, _ in state_rows}
+        self.state_country = {pk: country_id for pk, _, country_id in state_rows}
+        self.country_ids = list(Country.objects.order_by('id').values_list('id', flat=True))
+        self.degree_names = dict(Degree.objects.values_list('id', 'name'))
+        self.degree_ids = sorted(self.degree_names)
+        university_rows = list(University.objects.order_by('id').values_list('id', 'name', 'key'))
+        self.universities = [pk for pk, _, _ in university_rows]
+        self.university_names = {pk: name for pk, name, _ in university_rows}
+        self.university_keys = {key: pk for pk, _, key in university_rows}
+        self.university_lookup = {pk: code for code, pk in enumerate(self.universities)}
+
+        self.type_codes = _codes(types, COLLEGE_TYPES)
+        self.district_codes = _codes(districts, self.district_ids)
+        self.state_codes = _codes([self.district_state.get(pk) for pk in districts], self.state_ids)
+        self.country_codes = _codes(
+            [self.state_country.get(self.district_state.get(pk)) for pk in districts], self.country_ids,
+        )
+        self.university_codes = _codes(universities, self.universities)
+
+        self.all_bits = np.packbits(np.ones(size, dtype=bool))
+        self.bitmaps = {
+            'type': _bitmaps(self.type_codes, COLLEGE_TYPES, size),
+            'district': _bitmaps(self.district_codes, self.district_ids, size),
+            'state': _bitmaps(self.state_codes, self.state_ids, size),
+            'country': _bitmaps(self.country_codes, self.country_ids, size),
+        }
+
+        # Degrees are many-to-many: one bitmap row per degree
+        degree_bits = np.zeros((len(self.degree_ids), size), dtype=bool)
+        degree_codes = {pk: code for code, pk in enumerate(self.degree_ids)}
+        for college_id, degree_id in College.degrees.through.objects.values_list('college_id', 'degree_id'):
+            position = self.positions.get(college_id)
+            if position is not None and degree_id in degree_codes:
+                degree_bits[degree_codes[degree_id], position] = True
+        self.degree_matrix = np.packbits(degree_bits, axis=1)
+        self.bitmaps['degree'] = {pk: self.degree_matrix[code] for pk, code in degree_codes.items()}
+
+        self.district_names_lower = _lower_strings(name for _, name, _ in district_rows)
+        self.state_names_lower = _lower_strings(name for _, name, _ in state_rows)
+        self.alias_pairs = list(SearchAlias.objects.values_list('alias', 'canonical'))
+        self.alias_patterns = compile_aliases(self.alias_pairs)
+
+    @cached_property
+    def vocabulary(self):
+        """Every word of the college, district and state names and the aliases"""
+        texts = [*self.district_names.values(), *self.state_names.values()]
+        texts.extend(name for pair in self.alias_pairs for name in pair)
+        found = {*self.name_words.terms, *(word for text in texts for word in words(text))}
+        return frozenset(word for word in found if len(word) >= MIN_WORD_LENGTH)
+
+    @cached_property
+    def trigram_index(self):
+        return TrigramIndex(self.vocabulary)
+
+    @cached_property
+    def id_order(self):
+        """Row positions in id order, for APIs that page by id"""
+        return np.argsort(self.ids, kind='stable')
+
+    def ids_after(self, mask, after, limit):
+        """Up to ``limit`` ids in ``mask`` greater than ``after``, ascending"""
+        ordered = self.id_order[mask[self.id_order]]
+        ids = self.ids[ordered]
+        start = np.searchsorted(ids, after, side='right')
+        return ids[start:start + limit]
+
+    def _substring_mask(self, query):
+        mask = self.name_words.containing(query)
+        districts = np.flatnonzero(np.strings.find(self.district_names_lower, query) >= 0)
+        if len(districts):
+            mask |= np.isin(self.district_codes, districts)
+        states = np.flatnonzero(np.strings.find(self.state_names_lower, query) >= 0)
+        if len(states):
+            mask |= np.isin(self.state_codes, states)
+        return mask
+
+    def _text_mask(self, query):
+        """
+        Rows whose name, district or state contains ``query`` or one of its
+        alias variants, like icontains
+        """
+        variants = alias_variants(query, self.alias_patterns)
+        mask = self._substring_mask(variants[0])
+        for variant in variants[1:]:
+            mask |= self._substring_mask(variant)
+        return mask
+
+    def match(self, filters):
+        """Boolean mask, in name order, of the colleges matching normalized filters"""
+        bits = self.all_bits
+        for param in BITMAP_PARAMS:
+            if not filters[param]:
+                continue
+            value = filters[param] if param == 'type' else int(filters[param])
+            bitmap = self.bitmaps[param].get(value)
+            if bitmap is None:
+                return np.zeros(self.size, dtype=bool)
+            bits = bits & bitmap
+        mask = np.unpackbits(bits, count=self.size).astype(bool)
+
+        if filters['university']:
+            # An id, or a name as older links and API clients pass it
+            value = filters['university']
+            pk = int(value) if value.isascii() and value.isdigit() else self.university_keys.get(university_key(value))
+            code = self.university_lookup.get(pk)
+            if code is None:
+                return np.zeros(self.size, dtype=bool)
+            mask &= self.university_codes == code
+        if filters['q']:
+            mask &= self._text_mask(filters['q'])
+        return mask
+
+    def matching_ids(self, filters):
+        """Ids of the matching colleges in listing (name) order"""
+        return self.ids[self.match(filters)]
+
+    def nearest(self, mask, latitude, longitude, limit, after=None):
+        """
+        The ``limit`` colleges in ``mask`` with coordinates closest to the
+        point, after the ``(distance, id)`` cursor ``after``. Returns
+        ``(ids, distances in km, next cursor or None, located count)``.
+        """
+        rows = np.flatnonzero(mask & np.isfinite(self.latitudes) & np.isfinite(self.longitudes))
+        after_distance, after_id = after or (-1.0, -1)
+        radius = max(NEAREST_INITIAL_RADIUS_KM, after_distance * 2)
+        while True:
+            # Everything within radius of the point lies inside this box
+            angle = radius / EARTH_RADIUS_KM
+            everywhere = angle >= np.pi or np.sin(angle) >= np.cos(np.radians(latitude))
+            candidates = rows
+            if not everywhere:
+                lat_span = np.degrees(angle)
+                lng_span = np.degrees(np.arcsin(np.sin(angle) / np.cos(np.radians(latitude))))
+                lng_offset = np.abs((self.longitudes[rows] - longitude + 180) % 360 - 180)
+                candidates = rows[(np.abs(self.latitudes[rows] - latitude) <= lat_span) & (lng_offset <= lng_span)]
+
+            distances = haversine_km(latitude, longitude, self.latitudes[candidates], self.longitudes[candidates])
+            ids = self.ids[candidates]
+            keep = (distances > after_distance) | ((distances == after_distance) & (ids > after_id))
+            if not everywhere:
+                # Beyond the radius, closer colleges may lie outside the box
+                keep &= distances <= radius
+            # One extra row tells whether there is a next page
+            if everywhere or np.count_nonzero(keep) > limit:
+                break
+            radius *= 4
+
+        ids, distances = ids[keep], distances[keep]
+        order = np.lexsort((ids, distances))[:limit + 1]
+        next_cursor = None
+        if len(order) > limit:
+            order = order[:limit]
+            next_cursor = (float(distances[order[-1]]), int(ids[order[-1]]))
+        return ids[order], distances[order], next_cursor, len(rows)
+
+    def facet_counts(self, mask, limit):
+        """
+        ``{facet: [(value, label, count), ...]}`` over the rows in ``mask``,
+        most frequent first, plus the total
+        """
+        def top(counts, values, label):
+            order = np.argsort(-counts, kind='stable')[:limit]
+            return [
+                (values[code], label(values[code]), int(counts[code]))
+                for code in order if counts[code] > 0
+            ]
+
+        def bincount(codes, length):
+            codes = codes[mask]
+            return np.bincount(codes[codes >= 0], minlength=length)
+
+        type_labels = dict(College.COLLEGE_TYPES)
+        packed = np.packbits(mask)
+        if len(self.degree_ids):
+            degree_counts = np.bitwise_count(self.degree_matrix & packed).sum(axis=1)
+        else:
+            degree_counts = np.zeros(0, dtype=np.int64)
+
+        return {
+            'total': int(mask.sum()),
+            'type': top(bincount(self.type_codes, len(COLLEGE_TYPES)), COLLEGE_TYPES, type_labels.get),
+            'state': top(bincount(self.state_codes, len(self.state_ids)), self.state_ids, self.state_names.get),
+            'district': top(bincount(self.district_codes, len(self.district_ids)), self.district_ids, self.district_names.get),
+            'degree': top(degree_counts, self.degree_ids, self.degree_names.get),
+            'university': top(bincount(self.university_codes, len(self.universities)), self.universities, self.university_names.get),
+        }
+
+    def parents(self, param, value):
+        """Location filters implied by picking a state or district"""
+        if param == 'state':
+            return {'country': str(self.state_country.get(value, ''))}
+        if param == 'district':
+            state_id = self.district_state.get(value)
+            return {'state': str(state_id or ''), 'country': str(self.state_country.get(state_id, ''))}
+        return {}
+
+
+def get_college_index():
+    """
+    The snapshot for the current dataset version. While it is rebuilt after
+    a write, other threads keep getting the previous one.
+    """
+    version = get_dataset_version()
+    index = _current['index']
+    if index is not None and index.version == version:
+        return index
+
+    if not _rebuild_lock.acquire(blocking=index is None):
+        return index
+    try:
+        index = _current['index']
+        if index is None or index.version != version:
+            token = use_replica(False)
+            try:
+                index = _current['index'] = CollegeIndex(version)
+            finally:
+                reset_replica(token)
+        return index
+    finally:
+        _rebuild_lock.release()
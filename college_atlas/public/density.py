@@ -0,0 +1,122 @@
+"""
+College density on a square grid, for the map's heat layer.
+
+At national zooms the map shows how colleges are spread rather than one
+marker per college. The grid is binned from the CollegeIndex coordinate
+columns in one vectorized pass: each located college gets a cell key from
+its floored coordinates, and np.unique plus bincount give each cell's count
+and mean position. Cells halve in size with every zoom level.
+
+Grids are cached per zoom, type/degree filter and dataset version; the
+bbox of a request only crops the cached grid.
+"""
+import numpy as np
+from django.conf import settings
+from site_admin.versioning import get_dataset_version
+from college_atlas.singleflight import get_or_build
+from .college_index import get_college_index
+from .facets import normalize_filters
+
+# Cell size at zoom 0; 1 degree at zoom 5, 0.125 degrees at zoom 8
+BASE_CELL_DEGREES = 32.0
+MIN_ZOOM = 0
+MAX_ZOOM = 14
+
+# Only these filters apply, which keeps the number of cached grids small
+DENSITY_FILTERS = ('type', 'degree')
+
+
+def cell_degrees(zoom):
+    return BASE_CELL_DEGREES / 2 ** zoom
+
+
+def parse_zoom(value):
+    """The zoom level from a query parameter, clamped; None when invalid"""
+    try:
+        zoom = int(value)
+    except (TypeError, ValueError):
+        return None
+    return max(MIN_ZOOM, min(MAX_ZOOM, zoom))
+
+
+def parse_bbox(value):
+    """
+    ``(west, south, east, north)`` from "west,south,east,north", the order
+    of Leaflet's toBBoxString(); None when missing or malformed
+    """
+    try:
+        west, south, east, north = (float(part) for part in (value or '').split(','))
+    except ValueError:
+        return None
+    if not all(np.isfinite((west, south, east, north))) or south > north:
+        return None
+    return west, south, east, north
+
+
+def density_filters(params):
+    """The listing filters with everything but the density filters cleared"""
+    filters = normalize_filters(params)
+    return {param: value if param in DENSITY_FILTERS else '' for param, value in filters.items()}
+
+
+def build_grid(index, filters, zoom):
+    """
+    ``(cells, total)`` for the colleges matching ``filters``: cells is an
+    array of [mean latitude, mean longitude, count] rows
+    """
+    mask = index.match(filters) & np.isfinite(index.latitudes) & np.isfinite(index.longitudes)
+    latitudes, longitudes = index.latitudes[mask], index.longitudes[mask]
+    if not len(latitudes):
+        return np.zeros((0, 3)), 0
+
+    cell = cell_degrees(zoom)
+    rows = np.floor(latitudes / cell).astype(np.int64)
+    columns = np.floor(longitudes / cell).astype(np.int64)
+    # One integer key per cell; longitudes span at most 360 / cell columns
+    width = int(np.ceil(360.0 / cell)) + 2
+    keys = rows * width + (columns - columns.min())
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    cells = np.column_stack((
+        np.bincount(inverse, weights=latitudes) / counts,
+        np.bincount(inverse, weights=longitudes) / counts,
+        counts,
+    ))
+    return cells, int(mask.sum())
+
+
+def get_grid(filters, zoom):
+    """The cached grid for a zoom level and density filter set"""
+    key = f"density:{zoom}:{filters['type']}:{filters['degree']}"
+    return get_or_build(
+        key,
+        lambda: build_grid(get_college_index(), filters, zoom),
+        ttl=settings.API_CACHE_TIMEOUT,
+        version=get_dataset_version(),
+    )
+
+
+def density_payload(filters, zoom, bbox=None):
+    """The API response: the grid's cells inside ``bbox``, or all of them"""
+    cells, total = get_grid(filters, zoom)
+    if bbox is not None and len(cells):
+        west, south, east, north = bbox
+        inside = (cells[:, 0] >= south) & (cells[:, 0] <= north)
+        if east - west < 360:
+            # A box crossing the antimeridian has west > east
+            west, east = (west + 180) % 360 - 180, (east + 180) % 360 - 180
+            if west <= east:
+                inside &= (cells[:, 1] >= west) & (cells[:, 1] <= east)
+            else:
+                inside &= (cells[:, 1] >= west) | (cells[:, 1] <= east)
+        cells = cells[inside]
+    return {
+        'zoom': zoom,
+        'cell_degrees': cell_degrees(zoom),
+        'total': total,
+        'max_count': int(cells[:, 2].max()) if len(cells) else 0,
+        'cells': [
+            [round(latitude, 5), round(longitude, 5), int(count)]
+            for latitude, longitude, count in cells.tolist()
+        ],
+    }
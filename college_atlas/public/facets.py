@@ -0,0 +1,118 @@
+"""
+Filters and facet counts for the college listing.
+
+Both are evaluated on the in-memory CollegeIndex (see college_index.py):
+matching a filter set is a few bitmap ANDs and the facets are counted in
+one pass over the matching rows, instead of a COUNT query per facet. Facet
+counts are cached per normalized filter set and dataset version.
+"""
+import hashlib
+
+from django.conf import settings
+from django.utils.http import urlencode
+from site_admin.models import College
+from site_admin.versioning import get_dataset_version
+from college_atlas.singleflight import get_or_build
+from .college_index import get_college_index
+
+FILTER_PARAMS = ('q', 'country', 'state', 'district', 'type', 'degree', 'university')
+ID_PARAMS = ('country', 'state', 'district', 'degree')
+
+# Ordering of the listing; they carry over in links but select no colleges.
+# sort is '' (by name) or 'distance', from the point lat, lng.
+SORT_PARAMS = ('sort', 'lat', 'lng')
+SORTS = ('distance',)
+
+# Options shown per facet, most frequent first
+FACET_LIMIT = 10
+
+# Setting a filter clears the narrower location filters below it
+CLEARS = {
+    'country': ('state', 'district'),
+    'state': ('district',),
+}
+
+
+def normalize_filters(params):
+    """The listing filters from a QueryDict, cleaned so equal searches compare equal"""
+    filters = {}
+    for param in FILTER_PARAMS:
+        value = ' '.join((params.get(param) or '').split())
+        if param in ID_PARAMS and not (value.isascii() and value.isdigit()):
+            value = ''
+        if param == 'type' and value not in dict(College.COLLEGE_TYPES):
+            value = ''
+        filters[param] = value
+
+    filters.update(sort='', lat='', lng='')
+    try:
+        latitude, longitude = float(params.get('lat', '')), float(params.get('lng', ''))
+    except ValueError:
+        return filters
+    if params.get('sort') in SORTS and -90 <= latitude <= 90 and -180 <= longitude <= 180:
+        # About 10 m, plenty for "near me" and kinder to the caches
+        filters.update(sort=params['sort'], lat=f'{latitude:.4f}', lng=f'{longitude:.4f}')
+    return filters
+
+
+def filter_query(filters, **changes):
+    """Query string for the listing with ``changes`` applied, without the page"""
+    filters = {**filters, **changes}
+    for param in changes:
+        for narrower in CLEARS.get(param, ()):
+            if narrower not in changes:
+                filters[narrower] = ''
+    return urlencode({param: value for param, value in filters.items() if value})
+
+
+def count_facets(filters):
+    """Facet counts over the colleges matching ``filters``"""
+    index = get_college_index()
+    return index.facet_counts(index.match(filters), FACET_LIMIT)
+
+
+def get_facets(filters):
+    """Cached facet counts for a normalized filter set"""
+    key = hashlib.md5(filter_query({param: filters[param] for param in FILTER_PARAMS}).encode('utf-8')).hexdigest()
+    return get_or_build(
+        f'facets:{key}',
+        lambda: count_facets(filters),
+        ttl=settings.PUBLIC_PAGE_CACHE_TIMEOUT,
+        version=get_dataset_version(),
+    )
+
+
+FACET_LABELS = (
+    ('type', 'Type'),
+    ('state', 'State'),
+    ('district', 'District'),
+    ('degree', 'Degree'),
+    ('university', 'University'),
+)
+
+
+def facet_groups(facets, filters):
+    """Facet options with their links, in display order, for the template"""
+    index = get_college_index()
+    groups = []
+    for param, label in FACET_LABELS:
+        options = []
+        for value, name, count in facets[param]:
+            if not name:
+                continue
+            active = str(value) == filters[param]
+            changes = {param: ''} if active else {param: str(value), **index.parents(param, value)}
+            options.append({
+                'label': name,
+                'count': count,
+                'active': active,
+                'url': '?' + filter_query(filters, **changes),
+            })
+        if options:
+            groups.append({
+                'param': param,
+                'label': label,
+                'options': options,
+                'clear_url': '?' + filter_query(filters, **{param: ''}) if filters[param] else '',
+            })
+    return groups
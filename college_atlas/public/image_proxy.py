@@ -0,0 +1,225 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import logging
+import os
+import socket
+import threading
+import time
+import urllib.request
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from site_admin.images import IMAGE_VARIANTS, IMAGE_FORMATS, open_rgb, encode_variant
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
+# Touching a file on every hit would be a syscall per image request; the LRU
+# order only needs to be approximately right
+ACCESS_TOUCH_INTERVAL = 60 * 60
+
+# Fetches of the same URL share a lock; a fixed set of them, picked by the
+# URL's digest, so that memory does not grow with the URLs seen
+LOCK_STRIPES = 64
+_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+def url_digest(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]
+
+
+def proxy_url(college, variant='card', fmt='jpeg'):
+    """Local URL serving a resized copy of the college's external image_url"""
+    return reverse('college_image_proxy', args=[college.pk, url_digest(college.image_url), variant, fmt])
+
+
+def is_public_address(address):
+    """False for private, loopback, link-local, reserved and multicast addresses"""
+    address = ipaddress.ip_address(address)
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+def _public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None, **kwargs):
+    """
+    socket.create_connection() that refuses hosts resolving to non-public
+    addresses. It connects to the address it checked, so a second DNS
+    answer cannot swap in an internal one.
+    """
+    host, port = address
+    addresses = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    for resolved in addresses:
+        if not is_public_address(resolved):
+            raise ImageFetchError(f'{host} resolves to a non-public address: {resolved}')
+    error = None
+    for resolved in addresses:
+        try:
+            return socket.create_connection((resolved, port), timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error or ImageFetchError(f'{host} did not resolve')
+
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _public_connection
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def do_open(self, http_class, request, **kwargs):
+        return super().do_open(_PublicHTTPConnection, request, **kwargs)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def do_open(self, http_class, request, **kwargs):
+        return super().do_open(_PublicHTTPSConnection, request, **kwargs)
+
+
+class _RedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, request, fp, code, msg, headers, newurl):
+        if urlparse(newurl).scheme not in ('http', 'https'):
+            raise ImageFetchError(f'Redirect to an unsupported URL scheme: {newurl}')
+        return super().redirect_request(request, fp, code, msg, headers, newurl)
+
+
+def urllib_fetcher(url, timeout, max_bytes):
+    """
+    Default fetcher. Fetchers take ``(url, timeout, max_bytes)`` and return
+    the raw image bytes or raise; IMAGE_PROXY_FETCHER can point at another
+    callable, e.g. one that talks to a local stub server in tests.
+
+    image_url is editable by admins and imports, so every connection,
+    redirects included, is refused unless the host resolves to public
+    addresses only. Environment proxies are not used: they would connect
+    on our behalf to hosts never checked.
+    """
+    if urlparse(url).scheme not in ('http', 'https'):
+        raise ImageFetchError(f'Unsupported URL scheme: {url}')
+    opener = urllib.request.build_opener(
+        urllib.request.ProxyHandler({}), _PublicHTTPHandler, _PublicHTTPSHandler, _RedirectHandler,
+    )
+    request = urllib.request.Request(url, headers={'User-Agent': 'CollegeAtlas-ImageProxy/1.0'})
+    with opener.open(request, timeout=timeout) as response:
+        data = response.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ImageFetchError(f'Image larger than {max_bytes} bytes: {url}')
+    return data
+
+
+def _cache_dir():
+    path = settings.IMAGE_PROXY_CACHE_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _cache_path(digest, variant, fmt):
+    return os.path.join(_cache_dir(), f'{digest}-{variant}.{fmt}')
+
+
+def _lock_for(digest):
+    return _locks[int(digest, 16) % LOCK_STRIPES]
+
+
+def _failure_key(digest):
+    return f'image-proxy-failed:{digest}'
+
+
+def _touch(path):
+    try:
+        if time.time() - os.stat(path).st_mtime > ACCESS_TOUCH_INTERVAL:
+            os.utime(path)
+    except OSError:
+        pass
+
+
+def _evict_to_limit():
+    """Deletes least recently used files until the cache fits its byte budget"""
+    entries = []
+    total = 0
+    with os.scandir(_cache_dir()) as scan:
+        for entry in scan:
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+    limit = settings.IMAGE_PROXY_CACHE_MAX_BYTES
+    if total <= limit:
+        return
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        if total <= limit:
+            break
+
+
+def _store(digest, data):
+    """Writes every variant and format from one download, atomically per file"""
+    original = open_rgb(io.BytesIO(data))
+    for variant, size in IMAGE_VARIANTS.items():
+        for fmt in IMAGE_FORMATS:
+            path = _cache_path(digest, variant, fmt)
+            temp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(temp_path, 'wb') as output:
+                output.write(encode_variant(original, size, fmt))
+            os.replace(temp_path, path)
+    _evict_to_limit()
+
+
+def get_proxied_image(url, variant, fmt):
+    """
+    Returns the path of a cached, resized copy of an external image, fetching
+    it at most once per URL. Concurrent requests for the same URL wait on one
+    fetch; failures are remembered for IMAGE_PROXY_FAILURE_TTL so dead hosts
+    are not retried on every page view. Returns None if the image is
+    unavailable.
+    """
+    digest = url_digest(url)
+    path = _cache_path(digest, variant, fmt)
+    if os.path.exists(path):
+        _touch(path)
+        return path
+    if cache.get(_failure_key(digest)):
+        return None
+
+    with _lock_for(digest):
+        # Another request may have completed the fetch while we waited
+        if os.path.exists(path):
+            return path
+        if cache.get(_failure_key(digest)):
+            return None
+
+        fetcher = import_string(settings.IMAGE_PROXY_FETCHER)
+        try:
+            data = fetcher(url, settings.IMAGE_PROXY_TIMEOUT, settings.IMAGE_PROXY_MAX_SOURCE_BYTES)
+            _store(digest, data)
+        except Exception as e:
+            logger.warning('Image proxy could not fetch %s: %s', url, e)
+            cache.set(_failure_key(digest), True, settings.IMAGE_PROXY_FAILURE_TTL)
+            return None
+
+    return path if os.path.exists(path) else None
@@ -0,0 +1,20 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from public.snapshot import brotli, build_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Writes the precompressed geography, college and map cluster snapshots'
+
+    def handle(self, *args, **options):
+        manifest = build_snapshot()
+        for name, filename in manifest['files'].items():
+            size = os.path.getsize(os.path.join(settings.ATLAS_SNAPSHOT_DIR, filename))
+            self.stdout.write(f'  {name}: {filename} ({size // 1024} KB)')
+        if brotli is None:
+            self.stdout.write(self.style.WARNING('Brotli is not installed; wrote gzip variants only'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot for dataset version {manifest['dataset_version']} written to {settings.ATLAS_SNAPSHOT_DIR}"
+        ))
@@ -0,0 +1,246 @@
+"""
+Typo and transliteration tolerant search for the college listing.
+
+The listing search itself is a substring match on the CollegeIndex. On top
+of that:
+
+* SearchAlias rows (Trichy -> Tiruchirappalli, Kovai -> Coimbatore) are
+  expanded into query variants, in both directions, before matching.
+* When a search finds nothing, each word of the query is swapped for the
+  most trigram-similar words of the college, district and state names, and
+  the combinations that find colleges are offered as "did you mean"
+  suggestions.
+
+Similar words are looked up with pg_trgm on Postgres (GIN indexes on the
+names, see migration 0011; the alias table is small enough to scan) and
+with an in-process trigram inverted index elsewhere. Both draw on the same
+columns, VOCABULARY_COLUMNS.
+Trigrams follow pg_trgm: each word is lowercased and padded with two spaces
+in front and one behind, so both backends score words alike.
+"""
+import itertools
+import re
+
+import numpy as np
+from django.conf import settings
+from django.db import connections, router
+from site_admin.models import College, District, SearchAlias, State
+
+WORD_RE = re.compile(r'[^\W_]+')
+
+# Shorter words are too ambiguous to correct
+MIN_WORD_LENGTH = 3
+
+# Corrections tried per misspelled word
+CANDIDATES_PER_WORD = 3
+
+# Columns whose words are candidate corrections: CollegeIndex.vocabulary
+# for the in-process index, searched with pg_trgm on Postgres
+VOCABULARY_COLUMNS = (
+    (College, 'name'),
+    (District, 'name'),
+    (State, 'name'),
+    (SearchAlias, 'alias'),
+    (SearchAlias, 'canonical'),
+)
+
+
+def words(text):
+    return WORD_RE.findall(text.lower())
+
+
+def trigrams(text):
+    """The pg_trgm trigram set of ``text``"""
+    grams = set()
+    for word in words(text):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    """pg_trgm similarity(): shared trigrams over all distinct trigrams"""
+    a, b = trigrams(a), trigrams(b)
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def compile_aliases(pairs):
+    """Patterns replacing each alias with its canonical name and back"""
+    patterns = []
+    for alias, canonical in pairs:
+        alias, canonical = ' '.join(words(alias)), ' '.join(words(canonical))
+        if alias and canonical and alias != canonical:
+            patterns.append((re.compile(rf'\b{re.escape(alias)}\b'), canonical))
+            patterns.append((re.compile(rf'\b{re.escape(canonical)}\b'), alias))
+    return patterns
+
+
+def alias_variants(query, patterns):
+    """``query`` lowercased, plus one variant per alias it mentions"""
+    query = query.lower()
+    variants = [query]
+    for pattern, replacement in patterns:
+        variant = pattern.sub(replacement, query)
+        if variant != query and variant not in variants:
+            variants.append(variant)
+    return variants
+
+
+class WordIndex:
+    """
+    Substring search over many short texts (college names) that only scans
+    the texts sharing the query's words. Each word of the query is looked
+    up in the much smaller list of distinct words, and the texts holding
+    one of the words containing it are the candidates.
+    """
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.size = len(texts)
+        term_ids = {}
+        term_list, row_list = [], []
+        for row, text in enumerate(texts.tolist()):
+            for word in set(words(text)):
+                term_list.append(term_ids.setdefault(word, len(term_ids)))
+                row_list.append(row)
+        self.terms = list(term_ids)
+
+        term_list = np.array(term_list, dtype=np.int32)
+        order = np.argsort(term_list, kind='stable')
+        self.rows = np.array(row_list, dtype=np.int32)[order]
+        self.offsets = np.searchsorted(term_list[order], np.arange(len(self.terms) + 1))
+
+        # All terms in one string, so that finding the terms containing a
+        # word is a single C-level scan
+        self.blob = '\n'.join(self.terms)
+        lengths = np.fromiter((len(term) + 1 for term in self.terms), dtype=np.int64, count=len(self.terms))
+        self.starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    def _word_mask(self, word):
+        positions = [match.start() for match in re.finditer(re.escape(word), self.blob)]
+        mask = np.zeros(self.size, dtype=bool)
+        if positions:
+            terms = np.unique(np.searchsorted(self.starts, positions, side='right') - 1)
+            mask[np.concatenate([self.rows[self.offsets[t]:self.offsets[t + 1]] for t in terms])] = True
+        return mask
+
+    def containing(self, query):
+        """Boolean mask of the texts containing the lowercase ``query``"""
+        query_words = words(query)
+        if not query_words:
+            return np.strings.find(self.texts, query) >= 0
+        # Short words occur in too many terms to narrow anything down
+        long_words = [word for word in query_words if len(word) >= MIN_WORD_LENGTH] or query_words[:1]
+
+        mask = self._word_mask(long_words[0])
+        for word in long_words[1:]:
+            mask &= self._word_mask(word)
+        if query_words == [query]:
+            # A single bare word can only occur inside one word of a text
+            return mask
+        candidates = np.flatnonzero(mask)
+        mask[candidates] = np.strings.find(self.texts[candidates], query) >= 0
+        return mask
+
+
+class TrigramIndex:
+    """
+    Inverted index from trigram to the vocabulary words containing it. A
+    lookup adds up the posting lists of the query word's trigrams, which
+    gives the shared trigram count for every word at once.
+    """
+
+    def __init__(self, vocabulary):
+        self.terms = sorted(vocabulary)
+        postings = {}
+        sizes = np.zeros(len(self.terms), dtype=np.int32)
+        for term_id, term in enumerate(self.terms):
+            grams = trigrams(term)
+            sizes[term_id] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(term_id)
+        self.sizes = sizes
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def similar(self, word, limit, threshold):
+        """``[(term, similarity), ...]``, most similar first"""
+        grams = trigrams(word)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not lists:
+            return []
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.terms))
+        candidates = np.flatnonzero(shared)
+        scores = shared[candidates] / (len(grams) + self.sizes[candidates] - shared[candidates])
+        keep = scores >= threshold
+        candidates, scores = candidates[keep], scores[keep]
+        order = np.argsort(-scores, kind='stable')[:limit]
+        return [(self.terms[candidates[i]], float(scores[i])) for i in order]
+
+
+def _postgres_similar(word, limit, threshold):
+    # Imported here: it needs psycopg, which only Postgres deployments have
+    from django.contrib.postgres.search import TrigramWordSimilarity
+
+    names = []
+    for model, column in VOCABULARY_COLUMNS:
+        names.extend(
+            model.objects
+            .filter(**{f'{column}__trigram_word_similar': word})
+            .annotate(similarity=TrigramWordSimilarity(word, column))
+            .order_by('-similarity')
+            .values_list(column, flat=True)[:limit]
+        )
+    # The index finds names containing a similar word; pick out that word
+    scores = {}
+    for name in names:
+        for term in words(name):
+            if len(term) >= MIN_WORD_LENGTH and term not in scores:
+                scores[term] = similarity(word, term)
+    ranked = sorted(
+        ((term, score) for term, score in scores.items() if score >= threshold),
+        key=lambda item: -item[1],
+    )
+    return ranked[:limit]
+
+
+def similar_words(index, word, limit):
+    """Known words most similar to ``word``, as ``[(term, similarity), ...]``"""
+    threshold = settings.SEARCH_SIMILARITY_THRESHOLD
+    if connections[router.db_for_read(College)].vendor == 'postgresql':
+        return _postgres_similar(word, limit, threshold)
+    return index.trigram_index.similar(word, limit, threshold)
+
+
+def suggest(index, filters):
+    """
+    Corrected versions of ``filters['q']`` that find colleges under the
+    other filters, as ``[(query, count), ...]`` with the most similar first
+    """
+    tokens = words(filters['q'])
+    # Known words are candidates for themselves too: the data has its own
+    # misspellings, and a query of known words can still find nothing
+    options = [
+        similar_words(index, token, CANDIDATES_PER_WORD) if len(token) >= MIN_WORD_LENGTH else [(token, 1.0)]
+        for token in tokens
+    ]
+    combinations = sorted(
+        (
+            combination for combination in itertools.product(*options)
+            if [term for term, _ in combination] != tokens
+        ),
+        key=lambda combination: -sum(score for _, score in combination),
+    )
+    limit = settings.SEARCH_SUGGESTION_LIMIT
+    suggestions = []
+    # Counting is the expensive part, so only try a few times the limit
+    for combination in combinations[:limit * CANDIDATES_PER_WORD]:
+        query = ' '.join(term for term, _ in combination)
+        count = int(index.match({**filters, 'q': query}).sum())
+        if count:
+            suggestions.append((query, count))
+            if len(suggestions) == limit:
+                break
+    return suggestions
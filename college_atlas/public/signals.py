@@ -0,0 +1,27 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from site_admin.models import College, Degree, State, District
+from site_admin.versioning import bump_card_version, dataset_version_bumped
+from .snapshot import schedule_snapshot
+
+
+@receiver(post_save, sender=Degree)
+@receiver(post_save, sender=District)
+@receiver(post_save, sender=State)
+@receiver(post_delete, sender=Degree)
+def card_dependencies_changed(sender, **kwargs):
+    """Names shown on cached college cards changed"""
+    bump_card_version()
+
+
+@receiver(m2m_changed, sender=College.degrees.through)
+def college_degrees_changed(sender, action, **kwargs):
+    """Degree counts on cached college cards changed"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_card_version()
+
+
+@receiver(dataset_version_bumped)
+def dataset_changed(sender, **kwargs):
+    """Rebuild the static atlas snapshot once the burst of edits settles"""
+    schedule_snapshot()
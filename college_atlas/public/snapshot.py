@@ -0,0 +1,223 @@
+"""
+Precompressed static snapshots of the public atlas data.
+
+``build_snapshot`` serializes the geography tree, a compact college list and
+map clusters into content-hashed JSON files under ATLAS_SNAPSHOT_DIR, each
+with .gz (and .br when Brotli is installed) siblings. AsyncWhiteNoiseMiddleware
+serves them under STATIC_URL + 'atlas/' with immutable caching, so the map
+and dropdown data cost no Python time per request. ``manifest.json`` maps
+each snapshot name to its current file.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from site_admin.extents import EXTENT_FIELDS, serialize_extent
+from site_admin.models import College, Country, District, State
+from site_admin.versioning import get_dataset_version
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_URL_PREFIX = 'atlas/'
+MANIFEST_NAME = 'manifest.json'
+
+# Superseded files are kept this long for pages that still reference them
+STALE_FILE_TTL = 60 * 60
+
+# Grid cell size in degrees for each map zoom level that is served clustered
+CLUSTER_CELL_DEGREES = {
+    4: 2.0,
+    5: 1.0,
+    6: 0.5,
+    7: 0.25,
+    8: 0.125,
+}
+
+SCHEDULED_KEY = 'atlas:snapshot-scheduled'
+
+_manifest_cache = {'mtime': None, 'data': {}}
+
+
+def _dumps(payload):
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def geography_payload():
+    """Countries > states > districts, for the dropdowns"""
+    districts = defaultdict(list)
+    for row in District.objects.order_by('name').values('id', 'name', 'state_id', *EXTENT_FIELDS):
+        districts[row['state_id']].append({'id': row['id'], 'name': row['name'], **serialize_extent(row)})
+    states = defaultdict(list)
+    for row in State.objects.order_by('name').values('id', 'name', 'country_id', *EXTENT_FIELDS):
+        states[row['country_id']].append(
+            {'id': row['id'], 'name': row['name'], **serialize_extent(row), 'districts': districts[row['id']]}
+        )
+    return {
+        'countries': [
+            {'id': row['id'], 'name': row['name'], **serialize_extent(row), 'states': states[row['id']]}
+            for row in Country.objects.order_by('name').values('id', 'name', *EXTENT_FIELDS)
+        ],
+    }
+
+
+def colleges_payload():
+    """Every mapped college as compact rows, with district names looked up once"""
+    colleges = College.objects.filter(latitude__isnull=False, longitude__isnull=False).order_by('id')
+    rows = [
+        [pk, name, round(float(latitude), 6), round(float(longitude), 6), district_id]
+        for pk, name, latitude, longitude, district_id in colleges.values_list(
+            'id', 'name', 'latitude', 'longitude', 'district_id',
+        )
+    ]
+    district_ids = {row[4] for row in rows}
+    return {
+        'fields': ['id', 'name', 'latitude', 'longitude', 'district'],
+        'rows': rows,
+        'districts': {
+            pk: [name, state]
+            for pk, name, state in District.objects.filter(pk__in=district_ids).values_list('id', 'name', 'state__name')
+        },
+    }
+
+
+def clusters_payload(colleges):
+    """Grid clusters per zoom level: [latitude, longitude, count] at the cell's mean position"""
+    levels = {}
+    for zoom, cell in CLUSTER_CELL_DEGREES.items():
+        cells = defaultdict(lambda: [0.0, 0.0, 0])
+        for _, _, latitude, longitude, _ in colleges['rows']:
+            entry = cells[(int(latitude // cell), int(longitude // cell))]
+            entry[0] += latitude
+            entry[1] += longitude
+            entry[2] += 1
+        levels[zoom] = [
+            [round(lat_sum / count, 5), round(lng_sum / count, 5), count]
+            for lat_sum, lng_sum, count in cells.values()
+        ]
+    return {'levels': levels}
+
+
+def _write(path, data):
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as output:
+        output.write(data)
+    os.replace(temp_path, path)
+
+
+def _write_compressed(directory, name, data):
+    """Writes a content-hashed file plus precompressed siblings; returns its file name"""
+    digest = hashlib.md5(data).hexdigest()[:12]
+    filename = f'{name}.{digest}.json'
+    path = os.path.join(directory, filename)
+    if not os.path.exists(path):
+        _write(f'{path}.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write(f'{path}.br', brotli.compress(data))
+        _write(path, data)
+    return filename
+
+
+def _remove_stale_files(directory, current):
+    cutoff = time.time() - STALE_FILE_TTL
+    with os.scandir(directory) as scan:
+        for entry in scan:
+            base = entry.name.split('.json')[0] + '.json'
+            if entry.name == MANIFEST_NAME or base in current:
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                continue
+
+
+def build_snapshot():
+    """Writes every snapshot file and the manifest; returns the manifest"""
+    directory = settings.ATLAS_SNAPSHOT_DIR
+    os.makedirs(directory, exist_ok=True)
+
+    version = get_dataset_version()
+    colleges = colleges_payload()
+    files = {
+        'geography': _write_compressed(directory, 'geography', _dumps(geography_payload())),
+        'colleges': _write_compressed(directory, 'colleges', _dumps(colleges)),
+        'clusters': _write_compressed(directory, 'clusters', _dumps(clusters_payload(colleges))),
+    }
+
+    manifest = {
+        'files': files,
+        'dataset_version': version,
+        'generated_at': timezone.now().isoformat(),
+    }
+    _write(os.path.join(directory, MANIFEST_NAME), _dumps(manifest))
+    _remove_stale_files(directory, set(files.values()))
+    return manifest
+
+
+def read_manifest():
+    """The current manifest, re-read only when the file changes"""
+    path = os.path.join(settings.ATLAS_SNAPSHOT_DIR, MANIFEST_NAME)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return {}
+    if _manifest_cache['mtime'] != mtime:
+        try:
+            with open(path, 'rb') as manifest:
+                _manifest_cache['data'] = json.load(manifest)
+        except (OSError, ValueError):
+            return {}
+        _manifest_cache['mtime'] = mtime
+    return _manifest_cache['data']
+
+
+def snapshot_url(name):
+    """
+    Static URL of the current snapshot file, or '' if none was built or the
+    data changed since it was, so that pages fall back to the live API
+    until the rebuild
+    """
+    manifest = read_manifest()
+    if manifest.get('dataset_version', 0) < get_dataset_version():
+        return ''
+    filename = manifest.get('files', {}).get(name)
+    # Not static(): the snapshot is outside the collectstatic manifest
+    return f'{settings.STATIC_URL}{SNAPSHOT_URL_PREFIX}{filename}' if filename else ''
+
+
+def schedule_snapshot():
+    """
+    Rebuilds the snapshot after ATLAS_SNAPSHOT_DEBOUNCE seconds. Writes during
+    that window share the one queued rebuild, which is never put off more
+    than ATLAS_SNAPSHOT_MAX_DELAY seconds past the first of them.
+    """
+    if not settings.ATLAS_SNAPSHOT_ENABLED:
+        return
+    debounce = settings.ATLAS_SNAPSHOT_DEBOUNCE
+    if not cache.add(SCHEDULED_KEY, True, debounce):
+        return
+
+    from site_admin.task_queue import enqueue
+    try:
+        enqueue(
+            'atlas.build_snapshot',
+            delay=timedelta(seconds=debounce),
+            dedupe_key='atlas-snapshot',
+            max_delay=timedelta(seconds=settings.ATLAS_SNAPSHOT_MAX_DELAY),
+        )
+    except Exception:
+        cache.delete(SCHEDULED_KEY)
+        logger.exception('Could not schedule an atlas snapshot rebuild')
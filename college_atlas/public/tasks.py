@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from site_admin.models import College
+from site_admin.task_queue import task
+from .cards import render_college_cards
+from .snapshot import SCHEDULED_KEY, build_snapshot
+
+WARM_BATCH_SIZE = 200
+
+
+@task('cards.warm', priority=-1, max_attempts=1)
+def warm_college_cards(ctx):
+    """
+    Renders every listing and map card into the cache so the first visitors
+    after a deploy or a bulk edit do not pay for the renders
+    """
+    listing = College.objects.select_related(
+        'district', 'district__state', 'district__state__country', 'university',
+    ).order_by('id')
+    mapped = College.objects.filter(latitude__isnull=False, longitude__isnull=False).values(
+        'id', 'name', 'university__name', 'latitude', 'longitude',
+        'district__name', 'district__state__name', 'updated_at',
+    ).order_by('id')
+
+    total = listing.count() + mapped.count()
+    done = 0
+    for queryset, kind in ((listing, 'card'), (mapped, 'map')):
+        batch = []
+        for college in queryset.iterator(chunk_size=WARM_BATCH_SIZE):
+            batch.append(college)
+            if len(batch) == WARM_BATCH_SIZE:
+                render_college_cards(batch, kind=kind)
+                done += len(batch)
+                batch = []
+                ctx.set_progress(done, total, f'Rendering {kind} cards')
+        if batch:
+            render_college_cards(batch, kind=kind)
+            done += len(batch)
+            ctx.set_progress(done, total, f'Rendering {kind} cards')
+    return {'cards': done}
+
+
+@task('atlas.build_snapshot', max_attempts=2)
+def build_atlas_snapshot(ctx):
+    """Regenerates the static geography, college and cluster files"""
+    # Edits made while this runs schedule another build
+    cache.delete(SCHEDULED_KEY)
+    ctx.set_progress(0, 1, 'Writing snapshot files')
+    manifest = build_snapshot()
+    ctx.set_progress(1, 1, 'Snapshot written')
+    return manifest['files']
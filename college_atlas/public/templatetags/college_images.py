@@ -0,0 +1,52 @@
+from django import template
+from django.conf import settings
+from site_admin.images import IMAGE_VARIANTS
+from public.image_proxy import proxy_url
+
+register = template.Library()
+
+# Rendered widths of each derivative in the public layouts, for `sizes`
+VARIANT_SIZES = {
+    'popup': '320px',
+    'card': '(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw',
+    'hero': '100vw',
+}
+
+
+@register.filter
+def college_image_url(college, variant='card'):
+    """
+    Best single image URL for a college: the JPEG derivative when it has been
+    generated, then the original upload, then the locally proxied copy of the
+    external image_url.
+    """
+    if college.image:
+        return college.get_image_variant_url(variant) or college.image.url
+    if college.image_url and settings.IMAGE_PROXY_ENABLED:
+        return proxy_url(college, variant)
+    return college.image_url or ''
+
+
+def _proxy_srcset(college, fmt):
+    entries = sorted(IMAGE_VARIANTS.items(), key=lambda item: item[1][0])
+    return ', '.join(f'{proxy_url(college, variant, fmt)} {size[0]}w' for variant, size in entries)
+
+
+@register.inclusion_tag('public/partials/college_picture.html')
+def college_picture(college, variant='card', css_class=''):
+    """<picture> element with WebP and JPEG srcsets for a college image"""
+    webp_srcset = jpeg_srcset = ''
+    if college.image and college.image_variants:
+        webp_srcset = college.get_image_srcset('webp')
+        jpeg_srcset = college.get_image_srcset('jpeg')
+    elif not college.image and college.image_url and settings.IMAGE_PROXY_ENABLED:
+        webp_srcset = _proxy_srcset(college, 'webp')
+        jpeg_srcset = _proxy_srcset(college, 'jpeg')
+    return {
+        'college': college,
+        'src': college_image_url(college, variant),
+        'webp_srcset': webp_srcset,
+        'jpeg_srcset': jpeg_srcset,
+        'sizes': VARIANT_SIZES.get(variant, '100vw'),
+        'css_class': css_class,
+    }
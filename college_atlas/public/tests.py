@@ -1,3 +1,576 @@
-from django.test import TestCase
+import io
+import json
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from PIL import Image
+from college_atlas import singleflight, throttling
+from college_atlas.singleflight import get_or_build
+from college_atlas.throttling import throttle, throttled_counts
+from site_admin.models import College, Country, DatasetVersion, Degree, District, SearchAlias, State, University
+from site_admin.versioning import VERSION_ROW, get_dataset_version
+
+from . import college_index, image_proxy
+from .api_v1 import encode_cursor
+from .cards import render_college_cards
+from .college_index import CollegeIndex, get_college_index
+from .facets import normalize_filters
+from .image_proxy import ImageFetchError, get_proxied_image, urllib_fetcher
+from .search import _postgres_similar, alias_variants, compile_aliases, similar_words
+
+STUB_URL = 'https://images.example.com/campus.jpg'
+fetched = []
+
+
+def stub_fetcher(url, timeout, max_bytes):
+    """IMAGE_PROXY_FETCHER for tests: a small JPEG, or an error for URLs containing 'missing'"""
+    fetched.append(url)
+    if 'missing' in url:
+        raise ImageFetchError(f'Not found: {url}')
+    output = io.BytesIO()
+    Image.new('RGB', (800, 600), (200, 120, 40)).save(output, 'JPEG')
+    return output.getvalue()
+
+
+class ImageProxyTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        fetched.clear()
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings = override_settings(
+            IMAGE_PROXY_FETCHER='public.tests.stub_fetcher', IMAGE_PROXY_CACHE_DIR=cache_dir.name,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_fetches_once_and_serves_every_variant_from_the_cache(self):
+        path = get_proxied_image(STUB_URL, 'card', 'jpeg')
+        self.assertTrue(path.endswith('-card.jpeg'))
+        with Image.open(path) as image:
+            self.assertLessEqual(image.width, 800)
+        self.assertTrue(get_proxied_image(STUB_URL, 'popup', 'webp'))
+        self.assertEqual(fetched, [STUB_URL])
+
+    def test_failures_are_remembered(self):
+        url = 'https://images.example.com/missing.jpg'
+        with self.assertLogs('public.image_proxy', 'WARNING'):
+            self.assertIsNone(get_proxied_image(url, 'card', 'jpeg'))
+        self.assertIsNone(get_proxied_image(url, 'card', 'jpeg'))
+        self.assertEqual(fetched, [url])
+
+    def test_concurrent_requests_share_one_fetch(self):
+        threads = [threading.Thread(target=get_proxied_image, args=(STUB_URL, 'card', 'jpeg')) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(fetched, [STUB_URL])
+
+
+class RedirectingHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.send_response(302)
+        self.send_header('Location', self.server.redirect_to)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class UrllibFetcherTests(SimpleTestCase):
+
+    def test_refuses_non_public_addresses(self):
+        for url in (
+            'http://127.0.0.1/image.jpg', 'http://localhost/image.jpg', 'http://10.0.0.5/image.jpg',
+            'http://169.254.169.254/latest/meta-data/', 'http://[::1]/image.jpg', 'http://0x7f000001/image.jpg',
+        ):
+            with self.subTest(url=url), self.assertRaisesMessage(ImageFetchError, 'non-public address'):
+                urllib_fetcher(url, 1, 1024)
+
+    def test_refuses_hosts_with_any_internal_address(self):
+        answers = [
+            (2, 1, 6, '', ('93.184.216.34', 80)),
+            (2, 1, 6, '', ('192.168.1.10', 80)),
+        ]
+        with mock.patch('socket.getaddrinfo', return_value=answers), \
+                self.assertRaisesMessage(ImageFetchError, '192.168.1.10'):
+            urllib_fetcher('http://images.example.com/image.jpg', 1, 1024)
+
+    def test_refuses_unsupported_schemes(self):
+        with self.assertRaisesMessage(ImageFetchError, 'Unsupported URL scheme'):
+            urllib_fetcher('file:///etc/passwd', 1, 1024)
+
+    def redirect_server(self, redirect_to):
+        server = HTTPServer(('127.0.0.1', 0), RedirectingHandler)
+        server.redirect_to = redirect_to
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f'http://127.0.0.1:{server.server_port}/image.jpg'
+
+    def test_checks_every_redirect_hop(self):
+        # Only the stub server itself counts as public here
+        url = self.redirect_server('http://169.254.169.254/latest/meta-data/')
+        with mock.patch.object(image_proxy, 'is_public_address', lambda address: address == '127.0.0.1'), \
+                self.assertRaisesMessage(ImageFetchError, '169.254.169.254'):
+            urllib_fetcher(url, 2, 1024)
+
+    def test_refuses_redirects_to_other_schemes(self):
+        url = self.redirect_server('ftp://127.0.0.1/image.jpg')
+        with mock.patch.object(image_proxy, 'is_public_address', lambda address: address == '127.0.0.1'), \
+                self.assertRaisesMessage(ImageFetchError, 'unsupported URL scheme'):
+            urllib_fetcher(url, 2, 1024)
+
+
+def create_places():
+    """A few colleges in two districts, and aliases for both"""
+    country = Country.objects.create(name='India')
+    state = State.objects.create(name='Tamil Nadu', country=country)
+    districts = [
+        District.objects.create(name=name, state=state) for name in ('Tiruchirappalli', 'Coimbatore')
+    ]
+    for number, name in enumerate(('St. Joseph College', 'Bishop Heber College', 'PSG College of Technology')):
+        College.objects.create(
+            name=name, district=districts[number // 2], address_line='1 Main Road', pincode='620001',
+        )
+    # Migration 0010 seeds these; the tests must not depend on it
+    SearchAlias.objects.get_or_create(alias='Trichy', defaults={'canonical': 'Tiruchirappalli'})
+    SearchAlias.objects.get_or_create(alias='Kovai', defaults={'canonical': 'Coimbatore'})
+
+
+class SimilarWordsTests(TestCase):
+    MISSPELLINGS = ('trichi', 'kovay', 'coimbatur', 'colege', 'tecnology')
+
+    @classmethod
+    def setUpTestData(cls):
+        create_places()
+
+    def test_aliases_are_candidate_corrections(self):
+        index = CollegeIndex(0)
+        self.assertIn('trichy', dict(similar_words(index, 'trichi', 5)))
+        self.assertIn('kovai', dict(similar_words(index, 'kovay', 5)))
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'Needs Postgres with pg_trgm')
+    def test_postgres_agrees_with_the_in_process_index(self):
+        index = CollegeIndex(0)
+        threshold = settings.SEARCH_SIMILARITY_THRESHOLD
+        for word in self.MISSPELLINGS:
+            with self.subTest(word=word):
+                self.assertEqual(
+                    dict(_postgres_similar(word, 10, threshold)),
+                    dict(index.trigram_index.similar(word, 10, threshold)),
+                )
+
+
+def orm_matching_ids(filters):
+    """The listing filters as plain ORM lookups, as filter_college ran them before the index"""
+    colleges = College.objects.all()
+    lookups = {
+        'country': 'district__state__country_id', 'state': 'district__state_id', 'district': 'district_id',
+        'type': 'college_type', 'degree': 'degrees',
+    }
+    for param, lookup in lookups.items():
+        if filters[param]:
+            colleges = colleges.filter(**{lookup: filters[param]})
+    if filters['university']:
+        value = filters['university']
+        colleges = colleges.filter(university_id=value) if value.isdigit() else colleges.filter(university__name=value)
+    if filters['q']:
+        patterns = compile_aliases(SearchAlias.objects.values_list('alias', 'canonical'))
+        text = Q()
+        for variant in alias_variants(filters['q'], patterns):
+            text |= (
+                Q(name__icontains=variant) | Q(district__name__icontains=variant)
+                | Q(district__state__name__icontains=variant)
+            )
+        colleges = colleges.filter(text)
+    return list(colleges.distinct().order_by('name', 'id').values_list('id', flat=True))
+
+
+@override_settings(TASK_QUEUE_EMBEDDED_WORKER=False, DATASET_VERSION_CHECK_INTERVAL=0)
+class CollegeIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_places()
+        kerala = State.objects.create(name='Kerala', country=Country.objects.get(name='India'))
+        kochi = District.objects.create(name='Kochi', state=kerala)
+        university = University.objects.create(name='Bharathidasan University')
+        engineering = Degree.objects.create(name='B.E. Civil Engineering')
+        cls.kochi_college = College.objects.create(
+            name='Cochin College of Engineering', district=kochi, college_type='eng',
+            address_line='1 Beach Road', pincode='682001',
+        )
+        cls.kochi_college.degrees.add(engineering)
+        College.objects.filter(name__in=['St. Joseph College', 'Bishop Heber College']).update(
+            university=university, college_type='arts',
+        )
+        College.objects.get(name='PSG College of Technology').degrees.add(engineering)
+        cls.ids = {
+            'kerala': kerala.pk, 'kochi': kochi.pk, 'university': university.pk, 'degree': engineering.pk,
+            'country': kerala.country_id, 'tamil_nadu': State.objects.get(name='Tamil Nadu').pk,
+        }
+
+    def test_index_matches_the_orm_filters(self):
+        ids = self.ids
+        index = CollegeIndex(0)
+        for params in (
+            {}, {'country': ids['country']}, {'state': ids['tamil_nadu']}, {'state': ids['kerala']},
+            {'district': ids['kochi']}, {'type': 'arts'}, {'type': 'eng'}, {'degree': ids['degree']},
+            {'degree': ids['degree'], 'state': ids['kerala']}, {'university': ids['university']},
+            {'university': 'Bharathidasan University'}, {'q': 'college'}, {'q': 'trichy'}, {'q': 'kovai'},
+            {'q': 'tamil'}, {'q': 'heber', 'type': 'arts'}, {'q': 'nowhere'}, {'state': '99999'},
+        ):
+            filters = normalize_filters({param: str(value) for param, value in params.items()})
+            with self.subTest(params=params):
+                expected = orm_matching_ids(filters)
+                self.assertEqual(index.matching_ids(filters).tolist(), expected)
+                self.assertEqual(index.facet_counts(index.match(filters), 10)['total'], len(expected))
+
+    def test_index_follows_writes_from_any_process(self):
+        index = get_college_index()
+        self.assertEqual(index.version, get_dataset_version())
+        # As another process would: bump the row, not this process's memo
+        DatasetVersion.objects.filter(pk=VERSION_ROW).update(version=index.version + 1)
+        College.objects.filter(pk=self.kochi_college.pk).update(name='Renamed College')
+        rebuilt = get_college_index()
+        self.assertEqual(rebuilt.version, index.version + 1)
+        self.assertIn(self.kochi_college.pk, rebuilt.matching_ids(normalize_filters({'q': 'renamed'})).tolist())
+
+
+
+@override_settings(TASK_QUEUE_EMBEDDED_WORKER=False, DATASET_VERSION_CHECK_INTERVAL=0)
+class CollegeCardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_places()
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self, name='PSG College of Technology'):
+        college = College.objects.select_related('district__state').get(name=name)
+        return str(render_college_cards([college])[0])
+
+    def card_version(self):
+        return DatasetVersion.objects.get(pk=VERSION_ROW).card_version
+
+    def test_renaming_a_district_invalidates_its_cards(self):
+        self.assertIn('Coimbatore', self.render())
+        version = self.card_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            district = District.objects.get(name='Coimbatore')
+            district.name = 'Kovai District'
+            district.save()
+        self.assertEqual(self.card_version(), version + 1)
+        card = self.render()
+        self.assertIn('Kovai District', card)
+        self.assertNotIn('Coimbatore', card)
+
+    def test_cards_follow_bumps_from_any_process(self):
+        self.assertIn('Coimbatore', self.render())
+        # As another process would: rename and bump the row, without this process's signals or memo
+        District.objects.filter(name='Coimbatore').update(name='Kovai District')
+        self.assertIn('Coimbatore', self.render())
+        DatasetVersion.objects.filter(pk=VERSION_ROW).update(card_version=self.card_version() + 1)
+        self.assertIn('Kovai District', self.render())
+
+    def test_editing_a_college_keeps_other_cards(self):
+        version = self.card_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            college = College.objects.get(name='St. Joseph College')
+            college.name = "St. Joseph's College"
+            college.save()
+        self.assertEqual(self.card_version(), version)
+        self.assertIn("St. Joseph&#x27;s College", self.render("St. Joseph's College"))
+
+
+@override_settings(TASK_QUEUE_EMBEDDED_WORKER=False, DATASET_VERSION_CHECK_INTERVAL=0, THROTTLE_ENABLED=False)
+class ApiV1Tests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_places()
+        points = {
+            'St. Joseph College': (10.8155, 78.6965),
+            'Bishop Heber College': (10.8270, 78.6640),
+            'PSG College of Technology': (11.0247, 77.0028),
+        }
+        for name, (latitude, longitude) in points.items():
+            College.objects.filter(name=name).update(latitude=latitude, longitude=longitude)
+        kerala = State.objects.create(name='Kerala', country=Country.objects.get(name='India'))
+        cls.kochi = District.objects.create(name='Kochi', state=kerala)
+        College.objects.create(
+            name='Cochin College', district=cls.kochi, college_type='med', address_line='1 Beach Road',
+            pincode='682001',
+        )
+        Degree.objects.create(name='B.A. English', duration_years=3)
+        Degree.objects.create(name='B.E. Civil Engineering', duration_years=4)
+
+    def setUp(self):
+        index = mock.patch.dict(college_index._current, {'index': None})
+        index.start()
+        self.addCleanup(index.stop)
+
+    def get(self, path, status=200, **params):
+        response = self.client.get(f'/api/v1/{path}/', params)
+        self.assertEqual(response.status_code, status, response.content)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return json.loads(response.content)
+
+    def assertRejected(self, path, message, **params):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.get(path, status=400, **params), {'error': message})
+
+    def walk(self, path, **params):
+        """Every result and the has_more flags, one page at a time"""
+        results, flags, token = [], [], ''
+        while True:
+            page = self.get(path, **params, **({'after': token} if token else {}))
+            results += page['results']
+            flags.append(page['has_more'])
+            if not page['has_more']:
+                return results, flags
+            token = page['next']
+
+    def test_unknown_parameters_are_rejected(self):
+        for path in ('colleges', 'states', 'districts', 'degrees'):
+            with self.subTest(path=path):
+                self.assertRejected(path, 'Unknown parameter: since', since='2024-01-01')
+        self.assertRejected('colleges', 'Unknown parameters: page, since', since='1', page='2')
+        # Filters of other endpoints are not accepted either
+        self.assertRejected('degrees', 'Unknown parameter: state', state='1')
+
+    def test_malformed_values_are_rejected(self):
+        for value in ('0', '-1', 'abc', '\u00b2', '1.5'):
+            with self.subTest(limit=value):
+                self.assertRejected('colleges', 'limit must be a positive integer', limit=value)
+                self.assertRejected('degrees', 'limit must be a positive integer', limit=value)
+        for value in ('abc', '\u00b2', '-1'):
+            with self.subTest(state=value):
+                self.assertRejected('colleges', 'state must be an id', state=value)
+                self.assertRejected('districts', 'state must be an id', state=value)
+        self.assertRejected('colleges', 'Invalid cursor token', after='not a cursor')
+        self.assertRejected('states', 'Invalid cursor token', after=encode_cursor(1, 2))
+        self.assertRejected('colleges', 'Unknown fields: colour, size', fields='name,size,colour')
+        self.assertRejected('colleges', 'lat and lng are only used with sort=distance', lat='10')
+        self.assertRejected(
+            'colleges', 'sort=distance needs lat between -90 and 90 and lng between -180 and 180',
+            sort='distance', lat='100', lng='78',
+        )
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.post('/api/v1/colleges/').status_code, 405)
+
+    def test_sparse_fieldsets(self):
+        self.assertEqual(
+            self.get('colleges', fields='id')['results'],
+            [{'id': pk} for pk in College.objects.order_by('pk').values_list('pk', flat=True)],
+        )
+        college = self.get('colleges', fields='district,name', q='cochin')['results']
+        self.assertEqual(college, [{
+            'id': College.objects.get(name='Cochin College').pk,
+            'name': 'Cochin College', 'district': 'Kochi', 'state': 'Kerala',
+        }])
+        self.assertEqual(
+            self.get('degrees', fields='duration_years')['results'],
+            [{'id': pk, 'duration_years': years} for pk, years in Degree.objects.order_by('pk').values_list(
+                'pk', 'duration_years',
+            )],
+        )
+        kochi = self.get('districts', fields='name,state', state=str(self.kochi.state_id))['results']
+        self.assertEqual(kochi, [{'id': self.kochi.pk, 'name': 'Kochi', 'state': 'Kerala'}])
+
+    def test_cursor_pages_cover_every_row_once(self):
+        results, flags = self.walk('colleges', fields='id', limit='3')
+        ids = list(College.objects.order_by('pk').values_list('pk', flat=True))
+        self.assertEqual([row['id'] for row in results], ids)
+        self.assertEqual(flags, [True, False])
+        results, flags = self.walk('districts', fields='name', limit='1')
+        self.assertEqual([row['name'] for row in results], ['Tiruchirappalli', 'Coimbatore', 'Kochi'])
+        self.assertEqual(flags, [True, True, False])
+        # A college added after the cursor was handed out does not shift the pages
+        first = self.get('colleges', fields='id', limit='2')
+        with self.captureOnCommitCallbacks(execute=True):
+            added = College.objects.create(
+                name='New College', district=self.kochi, address_line='2 Beach Road', pincode='682002',
+            )
+        rest = self.get('colleges', fields='id', after=first['next'])['results']
+        self.assertEqual(rest[-1]['id'], added.pk)
+        self.assertEqual(len(first['results']) + len(rest), College.objects.count())
+
+    @override_settings(API_V1_PAGE_SIZE=2)
+    def test_limit_is_capped_at_the_page_size(self):
+        page = self.get('colleges', fields='id', limit='50')
+        self.assertEqual((len(page['results']), page['has_more']), (2, True))
+
+    def test_filters_and_distance_sort(self):
+        trichy = self.get('colleges', fields='name', q='trichy')['results']
+        self.assertEqual({row['name'] for row in trichy}, {'St. Joseph College', 'Bishop Heber College'})
+        self.assertEqual(
+            [row['name'] for row in self.get('colleges', fields='name', type='med')['results']], ['Cochin College'],
+        )
+        results, flags = self.walk(
+            'colleges', fields='name', sort='distance', lat='10.8155', lng='78.6965', limit='1',
+        )
+        self.assertEqual(
+            [row['name'] for row in results],
+            ['St. Joseph College', 'Bishop Heber College', 'PSG College of Technology'],
+        )
+        distances = [row['distance_km'] for row in results]
+        self.assertEqual(distances[0], 0)
+        self.assertEqual(distances, sorted(distances))
+        self.assertEqual(flags[-1], False)
+
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.builds = []
+
+    def builder(self, value, delay=0, release=None):
+        def build():
+            self.builds.append(value)
+            if release is not None:
+                release.wait(5)
+            time.sleep(delay)
+            return value
+        return build
+
+    def in_threads(self, count, target):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(target())) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_cold_miss_builds_once_for_concurrent_callers(self):
+        build = self.builder('counted', delay=0.2)
+        results = self.in_threads(5, lambda: get_or_build('facets:cold', build, ttl=60))
+        self.assertEqual(results, ['counted'] * 5)
+        self.assertEqual(self.builds, ['counted'])
+
+    def test_stale_value_is_served_while_one_caller_rebuilds(self):
+        get_or_build('facets:stale', self.builder('old'), ttl=60, version=1)
+        release = threading.Event()
+        rebuild = threading.Thread(
+            target=get_or_build, args=('facets:stale', self.builder('new', release=release)),
+            kwargs={'ttl': 60, 'version': 2},
+        )
+        rebuild.start()
+        while len(self.builds) < 2:
+            time.sleep(0.01)
+        # The rebuild for version 2 is in flight: other callers get the old value at once
+        results = self.in_threads(3, lambda: get_or_build('facets:stale', self.builder('again'), ttl=60, version=2))
+        release.set()
+        rebuild.join()
+        self.assertEqual(results, ['old'] * 3)
+        self.assertEqual(self.builds, ['old', 'new'])
+        self.assertEqual(get_or_build('facets:stale', self.builder('unused'), ttl=60, version=2), 'new')
+
+    def test_another_process_rebuilding_holds_the_lease(self):
+        get_or_build('facets:leased', self.builder('old'), ttl=0)
+        cache.add('singleflight-lease:facets:leased', 'other-process', 30)
+        self.assertEqual(get_or_build('facets:leased', self.builder('new'), ttl=60), 'old')
+        self.assertEqual(self.builds, ['old'])
+
+    def test_failed_rebuild_keeps_serving_the_stale_value(self):
+        get_or_build('facets:failing', self.builder('old'), ttl=0)
+
+        def broken():
+            raise RuntimeError('database unavailable')
+
+        with self.assertLogs('college_atlas.singleflight', 'ERROR'):
+            self.assertEqual(get_or_build('facets:failing', broken, ttl=60), 'old')
+
+    def test_locks_do_not_grow_with_keys(self):
+        for number in range(500):
+            get_or_build(f'facets:{number}', self.builder(number), ttl=60)
+        self.assertEqual(len(singleflight._locks), singleflight.LOCK_STRIPES)
+
+
+@override_settings(THROTTLE_ENABLED=True, THROTTLE_RATES={'test': '3/minute'}, THROTTLE_PROXY_COUNT=0)
+class ThrottleTests(SimpleTestCase):
+    """GCRA over the local memory cache: 3 requests a minute, one back every 20 seconds"""
+
+    def setUp(self):
+        cache.clear()
+        self.now = 1_000_000.0
+        clock = mock.patch.object(throttling, 'time', mock.Mock(time=lambda: self.now))
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.view = throttle('test')(lambda request: HttpResponse('ok'))
+
+    def get(self, path='/', address='10.0.0.1', **extra):
+        return self.view(RequestFactory().get(path, REMOTE_ADDR=address, **extra))
+
+    def get_throttled(self, path='/', address='10.0.0.1', **extra):
+        with self.assertLogs('college_atlas.throttling', 'WARNING'):
+            response = self.get(path, address, **extra)
+        self.assertEqual(response.status_code, 429)
+        return response
+
+    def test_burst_beyond_the_bucket_gets_429_with_retry_after(self):
+        for _ in range(3):
+            self.assertEqual(self.get('/api/v1/colleges/').status_code, 200)
+        response = self.get_throttled('/api/v1/colleges/')
+        self.assertEqual(response['Retry-After'], '20')
+        self.assertEqual(json.loads(response.content), {'error': 'Too many requests', 'retry_after': 20})
+        self.assertEqual(throttled_counts()['test']['throttled'], 1)
+
+    def test_bucket_refills_over_time(self):
+        for _ in range(3):
+            self.get()
+        self.now += 15
+        response = self.get_throttled()
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.now += 5
+        self.assertEqual(self.get().status_code, 200)
+        # One token came back, not the whole bucket
+        self.get_throttled()
+
+    def test_clients_have_separate_buckets(self):
+        for _ in range(3):
+            self.get(address='10.0.0.1')
+        self.get_throttled(address='10.0.0.1')
+        self.assertEqual(self.get(address='10.0.0.2').status_code, 200)
+
+    @override_settings(THROTTLE_PROXY_COUNT=1)
+    def test_client_is_taken_from_the_trusted_proxy_hop(self):
+        for _ in range(3):
+            self.get(address='10.9.9.9', HTTP_X_FORWARDED_FOR='203.0.113.5, 198.51.100.7')
+        # A spoofed leftmost entry does not buy a fresh bucket
+        self.get_throttled(address='10.9.9.9', HTTP_X_FORWARDED_FOR='1.2.3.4, 203.0.113.5, 198.51.100.7')
+        self.assertEqual(self.get(address='10.9.9.9', HTTP_X_FORWARDED_FOR='198.51.100.8').status_code, 200)
+
+    def test_async_views_are_throttled(self):
+        async def view(request):
+            return HttpResponse('ok')
+
+        self.view = async_to_sync(throttle('test')(view))
+        statuses = [self.get().status_code for _ in range(3)]
+        self.get_throttled()
+        self.assertEqual(statuses, [200, 200, 200])
+
+    def test_cache_outage_lets_requests_through(self):
+        with mock.patch.object(throttling, '_check_local', side_effect=ConnectionError('cache down')), \
+                self.assertLogs('college_atlas.throttling', 'ERROR'):
+            statuses = [self.get().status_code for _ in range(5)]
+        self.assertEqual(statuses, [200] * 5)
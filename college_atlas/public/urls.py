@@ -1,11 +1,22 @@
 from django.urls import path
-from . import views
+from . import api_v1, views
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('college/<int:pk>/', views.college_detail, name='college_detail'),
     path('filter/', views.filter_college, name='filter_college'),
     path('map-search/', views.map_search, name='map_search'),
+    path('universities/', views.university_list, name='university_list'),
     path('api/get-states/', views.get_states, name='get_states'),
     path('api/get-districts/', views.get_districts, name='get_districts'),
+    path('api/colleges/', views.colleges_api, name='colleges_api'),
+    path('api/map/colleges/', views.map_colleges_api, name='map_colleges_api'),
+    path('api/map/density/', views.map_density_api, name='map_density_api'),
+    path('api/search/', views.search_api, name='search_api'),
+    path('api/changes/', views.changes_api, name='changes_api'),
+    path('api/v1/colleges/', api_v1.colleges, name='api_v1_colleges'),
+    path('api/v1/states/', api_v1.states, name='api_v1_states'),
+    path('api/v1/districts/', api_v1.districts, name='api_v1_districts'),
+    path('api/v1/degrees/', api_v1.degrees, name='api_v1_degrees'),
+    path('images/college/<int:pk>/<slug:digest>/<slug:variant>.<slug:fmt>', views.college_image_proxy, name='college_image_proxy'),
 ]
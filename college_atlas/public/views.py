@@ -1,8 +1,31 @@
+import hashlib
+import math
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404
-from django.db.models import Q
+from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.http import JsonResponse
-from site_admin.models import College, State, District, Country
+from django.urls import reverse
+from django.db.models import Count, Q
+from django.http import JsonResponse, FileResponse, HttpResponse, Http404
+from django.views.decorators.http import require_GET
+from site_admin.models import College, State, District, Country, University
+from site_admin.images import IMAGE_VARIANTS
+from site_admin.changes import changes_since, decode_cursor
+from site_admin.extents import EXTENT_FIELDS, serialize_extent
+from site_admin.versioning import aget_dataset_version, get_dataset_version
+from college_atlas.db_router import reset_replica, use_replica
+from college_atlas.singleflight import get_or_build
+from college_atlas.throttling import throttle
+from .cards import get_card_version, render_college_cards
+from .image_proxy import CONTENT_TYPES, url_digest, get_proxied_image
+from .college_api import college_queryset, parse_fields, serialize_college
+from .college_index import get_college_index
+from .density import density_filters, density_payload, parse_bbox, parse_zoom
+from .facets import facet_groups, filter_query, get_facets, normalize_filters
+from .search import suggest
+from .snapshot import snapshot_url
 
 def home(request):
     """
@@ -10,7 +33,12 @@ def home(request):
     """
     states = State.objects.all()
     countries = Country.objects.all()
-    college_count = College.objects.count()
+    college_count = get_or_build(
+        'home:college-count',
+        College.objects.count,
+        ttl=settings.PUBLIC_PAGE_CACHE_TIMEOUT,
+        version=get_dataset_version(),
+    )
     
     context = {
         'states': states,
@@ -23,92 +51,414 @@ def college_detail(request, pk):
     """
     Renders the detail view for a specific college.
     """
-    college = get_object_or_404(College, pk=pk)
+    college = get_object_or_404(College.objects.select_related('district__state', 'university'), pk=pk)
     return render(request, 'public/college.html', {'college': college})
 
+LISTING_PAGE_SIZE = 12
+UNIVERSITY_PAGE_SIZE = 30
+
+
+def _decode_distance_cursor(token):
+    """The (distance, id) of the last college on the previous page, or None"""
+    distance, _, pk = token.partition(':')
+    try:
+        cursor = float(distance), int(pk)
+    except ValueError:
+        return None
+    return cursor if math.isfinite(cursor[0]) else None
+
+
+@throttle('listing')
 def filter_college(request):
     """
     Handles searching and filtering of colleges.
     """
-    query = request.GET.get('q', '')
-    country_id = request.GET.get('country')
-    state_id = request.GET.get('state')
-    district_id = request.GET.get('district')
-    
-    colleges = College.objects.select_related('district', 'district__state', 'district__state__country').all()
-    
-    if query:
-        colleges = colleges.filter(
-            Q(name__icontains=query) | 
-            Q(district__name__icontains=query) | 
-            Q(district__state__name__icontains=query)
+    filters = normalize_filters(request.GET)
+    index = get_college_index()
+    matching_ids = index.matching_ids(filters)
+
+    # Nothing matched the search: show the colleges for the best spelling
+    # correction and offer the others
+    searched_for = ''
+    suggestions = []
+    if not len(matching_ids) and filters['q']:
+        suggestions = suggest(index, filters)
+        if suggestions:
+            searched_for = filters['q']
+            filters = {**filters, 'q': suggestions[0][0]}
+            matching_ids = index.matching_ids(filters)
+
+    distance_page = None
+    distances = {}
+    if filters['sort'] == 'distance':
+        # Nearest first, paged with a cursor so that pages stay put while
+        # colleges are added
+        page_ids, page_distances, next_cursor, located = index.nearest(
+            index.match(filters), float(filters['lat']), float(filters['lng']),
+            LISTING_PAGE_SIZE, _decode_distance_cursor(request.GET.get('after', '')),
         )
-    
-    if country_id:
-        colleges = colleges.filter(district__state__country__id=country_id)
-        
-    if state_id:
-        colleges = colleges.filter(district__state__id=state_id)
-        
-    if district_id:
-        colleges = colleges.filter(district__id=district_id)
-
-    sort_by = request.GET.get('sort', 'name')
-    if sort_by == 'name':
-        colleges = colleges.order_by('name')
-        
-    paginator = Paginator(colleges, 12) # Show 12 colleges per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
+        page_ids = page_ids.tolist()
+        distances = dict(zip(page_ids, page_distances.tolist()))
+        distance_page = {
+            'count': located,
+            'first_url': '?' + filter_query(filters) if request.GET.get('after') else '',
+            'next_url': '?' + filter_query(filters) + f'&after={next_cursor[0]!r}:{next_cursor[1]}' if next_cursor else '',
+        }
+    else:
+        paginator = Paginator(matching_ids, LISTING_PAGE_SIZE)
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
+        page_ids = page_obj.object_list.tolist()
+
+    # Filtering ran in memory; only the colleges on this page are loaded
+    colleges = College.objects.select_related(
+        'district', 'district__state', 'district__state__country', 'university',
+    ).in_bulk(page_ids)
+    page_colleges = [colleges[pk] for pk in page_ids if pk in colleges]
+    if distance_page is None:
+        page_obj.object_list = page_colleges
+    else:
+        page_obj = page_colleges
+
+    country_id = filters['country']
+    state_id = filters['state']
     countries = Country.objects.all()
     states = State.objects.filter(country_id=country_id) if country_id else []
     districts = District.objects.filter(state_id=state_id) if state_id else []
 
+    facets = get_facets(filters)
+
     context = {
         'colleges': page_obj,
+        # Cards are cached per college, so the distance is shown beside them
+        'college_cards': [
+            (card, distances.get(college.pk))
+            for card, college in zip(render_college_cards(page_colleges), page_colleges)
+        ],
+        'distance_page': distance_page,
+        'name_sort_query': filter_query(filters, sort='', lat='', lng=''),
+        'geography_snapshot_url': snapshot_url('geography'),
         'countries': countries,
         'states': states,
         'districts': districts,
-        'current_filters': {
-            'q': query,
-            'country': country_id,
-            'state': state_id,
-            'district': district_id,
-        }
+        'facet_groups': facet_groups(facets, filters),
+        'filter_query': filter_query(filters),
+        'current_filters': filters,
+        'searched_for': searched_for,
+        'other_suggestions': [
+            {'query': query, 'count': count, 'url': '?' + filter_query(filters, q=query)}
+            for query, count in suggestions[1:]
+        ],
     }
     return render(request, 'public/filter_college.html', context)
 
-def map_search(request):
+def university_list(request):
     """
-    Renders the map search view with college data for the map.
+    Lists the universities with how many colleges are affiliated to each,
+    optionally searched by name
     """
+    query = request.GET.get('q', '').strip()
+    universities = University.objects.annotate(college_count=Count('colleges')).filter(college_count__gt=0)
+    if query:
+        universities = universities.filter(name__icontains=query)
+    paginator = Paginator(universities.order_by('name'), UNIVERSITY_PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    return render(request, 'public/university_list.html', {
+        'universities': page_obj,
+        'query': query,
+    })
+
+def _map_search_context():
     colleges = College.objects.filter(
         latitude__isnull=False, 
         longitude__isnull=False
-    ).values('id', 'name', 'latitude', 'longitude', 'district__name', 'district__state__name')
-    
+    ).values(
+        'id', 'name', 'university__name', 'latitude', 'longitude',
+        'district__name', 'district__state__name', 'updated_at',
+    )
+    colleges = list(colleges)
+
+    return {
+        'college_items': render_college_cards(colleges, kind='map'),
+        # Pass as list to be easily serialized to JSON in template
+        'colleges_data': [
+            {key: college[key] for key in ('id', 'name', 'latitude', 'longitude', 'district__name', 'district__state__name')}
+            for college in colleges
+        ],
+    }
+
+def map_search(request):
+    """
+    Renders the map search view with college data for the map.
+    """
+    # Every college is on this page; after an admin save one request
+    # rebuilds it while the rest keep serving the previous version
+    context = get_or_build(
+        'map-search',
+        _map_search_context,
+        ttl=settings.PUBLIC_PAGE_CACHE_TIMEOUT,
+        version=(get_dataset_version(), get_card_version()),
+    )
+    # When a snapshot exists the page loads markers from it instead of
+    # carrying every college inline
     context = {
-        'colleges_data': list(colleges) # Pass as list to be easily serialized to JSON in template
+        **context,
+        'colleges_snapshot_url': snapshot_url('colleges'),
+        'map_bbox': _map_region(request.GET).bbox,
+        'heatmap_max_zoom': settings.MAP_HEATMAP_MAX_ZOOM,
+        'college_api_max_ids': settings.COLLEGE_API_MAX_IDS,
     }
     return render(request, 'public/map_search.html', context)
 
-def get_states(request):
+def _map_region(params):
+    """
+    The district or state asked for in ``params``, else the country with
+    the most located colleges, for the map to open on. Its stored extent
+    replaces fitting the bounds of every marker on the client.
+    """
+    for model, key in ((District, 'district'), (State, 'state')):
+        value = params.get(key, '')
+        if value.isascii() and value.isdigit():
+            region = model.objects.filter(pk=value, located_colleges__gt=0).first()
+            if region:
+                return region
+    return Country.objects.order_by('-located_colleges').first() or Country()
+
+async def _cached_json(key, build):
+    """
+    Returns the payload cached under ``key`` for the current dataset version,
+    building it with the coroutine ``build`` on a miss
+    """
+    key = f"{key}:{await aget_dataset_version()}"
+    payload = await cache.aget(key)
+    if payload is None:
+        payload = await build()
+        await cache.aset(key, payload, settings.API_CACHE_TIMEOUT)
+    return payload
+
+
+@require_GET
+@throttle('geography')
+async def get_states(request):
     """
     AJAX endpoint to get states for a selected country.
     """
-    country_id = request.GET.get('country_id')
-    if country_id:
-        states = State.objects.filter(country_id=country_id).values('id', 'name')
-        return JsonResponse({'states': list(states)})
-    return JsonResponse({'states': []})
+    country_id = request.GET.get('country_id', '')
+    if not (country_id.isascii() and country_id.isdigit()):
+        return JsonResponse({'states': []})
+
+    async def build():
+        states = State.objects.filter(country_id=country_id).order_by('name').values('id', 'name', *EXTENT_FIELDS)
+        return [{'id': state['id'], 'name': state['name'], **serialize_extent(state)} async for state in states]
 
-def get_districts(request):
+    return JsonResponse({'states': await _cached_json(f'api:states:{country_id}', build)})
+
+
+@require_GET
+@throttle('geography')
+async def get_districts(request):
     """
     AJAX endpoint to get districts for a selected state.
     """
-    state_id = request.GET.get('state_id')
-    if state_id:
-        districts = District.objects.filter(state_id=state_id).values('id', 'name')
-        return JsonResponse({'districts': list(districts)})
-    return JsonResponse({'districts': []})
+    state_id = request.GET.get('state_id', '')
+    if not (state_id.isascii() and state_id.isdigit()):
+        return JsonResponse({'districts': []})
+
+    async def build():
+        districts = District.objects.filter(state_id=state_id).order_by('name').values('id', 'name', *EXTENT_FIELDS)
+        return [{'id': district['id'], 'name': district['name'], **serialize_extent(district)} async for district in districts]
+
+    return JsonResponse({'districts': await _cached_json(f'api:districts:{state_id}', build)})
+
+
+@require_GET
+@throttle('api')
+async def map_colleges_api(request):
+    """
+    JSON marker data for the map, optionally limited to a state or district,
+    with the region's bounding box to fit the map to.
+    """
+    # Anything but an id is ignored
+    state_id, district_id = (
+        value if value.isascii() and value.isdigit() else ''
+        for value in (request.GET.get('state', ''), request.GET.get('district', ''))
+    )
+
+    async def build():
+        colleges = College.objects.filter(latitude__isnull=False, longitude__isnull=False)
+        if state_id:
+            colleges = colleges.filter(district__state_id=state_id)
+        if district_id:
+            colleges = colleges.filter(district_id=district_id)
+        colleges = colleges.values_list(
+            'id', 'name', 'latitude', 'longitude', 'district__name', 'district__state__name',
+        )
+        region = None
+        if district_id:
+            region = await District.objects.filter(pk=district_id).values(*EXTENT_FIELDS).afirst()
+        elif state_id:
+            region = await State.objects.filter(pk=state_id).values(*EXTENT_FIELDS).afirst()
+        markers = [
+            {
+                'id': pk,
+                'name': name,
+                'latitude': float(latitude),
+                'longitude': float(longitude),
+                'district': district,
+                'state': state,
+            }
+            async for pk, name, latitude, longitude, district, state in colleges
+        ]
+        return {'colleges': markers, 'bbox': serialize_extent(region)['bbox'] if region else None}
+
+    key = f"api:map:{state_id}:{district_id}"
+    return JsonResponse(await _cached_json(key, build))
+
+
+@require_GET
+@throttle('api')
+def map_density_api(request):
+    """
+    College counts on a square grid sized for ``zoom``, within ``bbox``
+    (west,south,east,north) when given, optionally filtered by type or degree.
+    """
+    zoom = parse_zoom(request.GET.get('zoom'))
+    if zoom is None:
+        return JsonResponse({'error': 'zoom must be an integer'}, status=400)
+    bbox = None
+    if request.GET.get('bbox'):
+        bbox = parse_bbox(request.GET['bbox'])
+        if bbox is None:
+            return JsonResponse({'error': 'bbox must be west,south,east,north'}, status=400)
+    return JsonResponse(density_payload(density_filters(request.GET), zoom, bbox))
+
+
+@require_GET
+@throttle('api')
+async def colleges_api(request):
+    """
+    Details of up to COLLEGE_API_MAX_IDS colleges by id, with only the
+    requested fields, e.g. ?ids=1,2,3&fields=name,degrees
+    """
+    ids = []
+    for value in request.GET.get('ids', '').split(','):
+        value = value.strip()
+        if not (value.isascii() and value.isdigit()):
+            return JsonResponse({'error': 'ids must be a comma separated list of college ids'}, status=400)
+        if int(value) not in ids:
+            ids.append(int(value))
+    if len(ids) > settings.COLLEGE_API_MAX_IDS:
+        return JsonResponse({'error': f'At most {settings.COLLEGE_API_MAX_IDS} ids per request'}, status=400)
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    async def build():
+        colleges = {
+            college.pk: serialize_college(college, fields)
+            async for college in college_queryset(fields).filter(pk__in=ids)
+        }
+        return [colleges[pk] for pk in ids if pk in colleges]
+
+    request_key = f"{','.join(map(str, ids))}|{','.join(fields)}"
+    key = f"api:colleges:{hashlib.md5(request_key.encode('utf-8')).hexdigest()}"
+    return JsonResponse({'colleges': await _cached_json(key, build)})
+
+
+SEARCH_API_LIMIT = 10
+
+
+@require_GET
+@throttle('api')
+async def search_api(request):
+    """
+    Typeahead search over college names and locations.
+    """
+    query = ' '.join(request.GET.get('q', '').split()).lower()
+    if len(query) < 2:
+        return JsonResponse({'results': []})
+
+    async def build():
+        colleges = College.objects.filter(
+            Q(name__icontains=query) |
+            Q(district__name__icontains=query) |
+            Q(district__state__name__icontains=query)
+        ).order_by('name').values_list('id', 'name', 'district__name', 'district__state__name')
+        return [
+            {
+                'id': pk,
+                'name': name,
+                'district': district,
+                'state': state,
+                'url': reverse('college_detail', args=[pk]),
+            }
+            async for pk, name, district, state in colleges[:SEARCH_API_LIMIT]
+        ]
+
+    key = f"api:search:{hashlib.md5(query.encode('utf-8')).hexdigest()}"
+    return JsonResponse({'results': await _cached_json(key, build)})
+
+
+@require_GET
+@throttle('api')
+async def changes_api(request):
+    """
+    Delta sync feed: colleges, districts, states, degrees and countries
+    created, updated or deleted after the ``since`` cursor token.
+    """
+    try:
+        cursor = decode_cursor(request.GET.get('since', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid since token; sync again from the start'}, status=400)
+
+    limit = settings.CHANGE_FEED_PAGE_SIZE
+    requested = request.GET.get('limit', '')
+    if requested.isascii() and requested.isdigit():
+        limit = max(1, min(int(requested), limit))
+
+    return JsonResponse(await sync_to_async(_primary_changes_since)(cursor, limit))
+
+
+def _primary_changes_since(cursor, limit):
+    # A replica lagging by more than the settle window would be missing rows
+    # that the returned cursor already points past
+    token = use_replica(False)
+    try:
+        return changes_since(cursor, limit)
+    finally:
+        reset_replica(token)
+
+
+PLACEHOLDER_IMAGE = (
+    '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 16 9">'
+    '<rect width="16" height="9" fill="#e2e8f0"/></svg>'
+)
+
+
+@require_GET
+def college_image_proxy(request, pk, digest, variant, fmt):
+    """
+    Serves a resized local copy of a college's external image_url so listing
+    pages never hot-link third-party hosts. The URL digest ties each response
+    to one source URL, which makes the long-lived immutable caching safe.
+    """
+    if variant not in IMAGE_VARIANTS or fmt not in CONTENT_TYPES:
+        raise Http404
+    college = get_object_or_404(College.objects.only('id', 'image_url'), pk=pk)
+    if not college.image_url or url_digest(college.image_url) != digest:
+        raise Http404
+
+    path = get_proxied_image(college.image_url, variant, fmt)
+    try:
+        response = FileResponse(open(path, 'rb'), content_type=CONTENT_TYPES[fmt]) if path else None
+    except FileNotFoundError:
+        response = None  # Evicted between lookup and open
+
+    if response is None:
+        response = HttpResponse(PLACEHOLDER_IMAGE, content_type='image/svg+xml')
+        response['Cache-Control'] = f'public, max-age={settings.IMAGE_PROXY_FAILURE_TTL}'
+        return response
+
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Country, State, District, Degree, College
+from django.db.models import Count
+from .models import Country, State, District, Degree, College, DuplicateCandidate, SearchAlias, Task, University
 
 @admin.register(Country)
 class CountryAdmin(admin.ModelAdmin):
@@ -23,17 +24,30 @@ class DegreeAdmin(admin.ModelAdmin):
     list_display = ('name', 'duration_years', 'created_at')
     search_fields = ('name',)
 
+@admin.register(University)
+class UniversityAdmin(admin.ModelAdmin):
+    list_display = ('name', 'college_count', 'updated_at')
+    search_fields = ('name', 'key')
+    readonly_fields = ('key',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(college_count=Count('colleges'))
+
+    @admin.display(ordering='college_count', description='Colleges')
+    def college_count(self, obj):
+        return obj.college_count
+
 @admin.register(College)
 class CollegeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'college_type', 'district', 'created_at')
+    list_display = ('name', 'college_type', 'district', 'university', 'created_at')
     list_filter = ('college_type', 'district__state', 'degrees')
-    search_fields = ('name', 'district__name', 'district__state__name')
-    autocomplete_fields = ['district'] # Useful if many districts
+    search_fields = ('name', 'university__name', 'district__name', 'district__state__name')
+    autocomplete_fields = ['district', 'university'] # Useful if many districts
     filter_horizontal = ('degrees',) # Better UI for ManyToMany
     
     fieldsets = (
         ('Basic Information', {
-            'fields': ('name', 'college_type', 'image')
+            'fields': ('name', 'college_type', 'university', 'image')
         }),
         ('Location Details', {
             'fields': ('district', 'address_line', 'pincode', 'latitude', 'longitude')
@@ -54,3 +68,20 @@ class CollegeAdmin(admin.ModelAdmin):
             'https://unpkg.com/leaflet@1.9.4/dist/leaflet.js',
             'site_admin/js/admin_map_picker.js',
         )
+
+@admin.register(SearchAlias)
+class SearchAliasAdmin(admin.ModelAdmin):
+    list_display = ('alias', 'canonical', 'updated_at')
+    search_fields = ('alias', 'canonical')
+
+@admin.register(DuplicateCandidate)
+class DuplicateCandidateAdmin(admin.ModelAdmin):
+    list_display = ('college', 'other', 'score', 'reasons', 'status')
+    list_filter = ('status',)
+    raw_id_fields = ('college', 'other')
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'queue', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'queue', 'name')
+    search_fields = ('name', 'dedupe_key')
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class SiteAdminConfig(AppConfig):
     name = 'site_admin'
+
+    def ready(self):
+        from django.core.signals import request_started
+        from . import signals  # noqa: F401
+        from .task_queue import start_embedded_worker
+        request_started.connect(start_embedded_worker, dispatch_uid='site_admin.embedded_worker')
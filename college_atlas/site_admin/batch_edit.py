@@ -0,0 +1,165 @@
+"""
+Batch editing of colleges from the admin dashboard grid and action bar.
+
+Grid edits arrive as a diff of changed cells. Colleges are grouped by the set
+of fields that changed so each group is written with one bulk_update, rather
+than a save() per college. Bulk writes skip model signals, so these helpers
+set updated_at themselves (cached cards are keyed on it) and bump the dataset
+version and refresh the region extents once per batch.
+"""
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .changes import feed_transaction
+from .extents import deferred_extents, update_extents
+from .models import College, Degree, District
+from .universities import UniversityResolver
+from .versioning import bump_dataset_version
+
+GRID_FIELDS = ('name', 'university', 'college_type', 'latitude', 'longitude')
+
+BULK_ACTIONS = {
+    'set_type': 'Set type',
+    'set_district': 'Move to district',
+    'add_degree': 'Add degree',
+    'remove_degree': 'Remove degree',
+    'delete': 'Delete',
+}
+
+
+def _clean_cell(college, field_name, raw):
+    raw = '' if raw is None else str(raw).strip()
+    if field_name == 'university':
+        # Typed as a name; resolved to its University once every cell is valid
+        return raw
+    field = College._meta.get_field(field_name)
+    if raw == '' and field.null:
+        return None
+    return field.clean(raw, college)
+
+
+def apply_grid_changes(changes):
+    """
+    Applies ``{college id: {field: raw value}}`` from the grid. Either every
+    change is written or, if any cell is invalid, none are. Returns
+    ``(updated count, {college id: {field: error}})``.
+    """
+    errors = defaultdict(dict)
+    cleaned = {}
+    for college_id, fields in changes.items():
+        unknown = set(fields) - set(GRID_FIELDS)
+        if unknown:
+            errors[college_id].update({field: 'This field cannot be edited here' for field in unknown})
+            continue
+        cleaned[int(college_id)] = fields
+
+    colleges = College.objects.only('id', 'district_id', *GRID_FIELDS).in_bulk(list(cleaned))
+    groups = defaultdict(list)
+    university_names = {}
+    for college_id, fields in cleaned.items():
+        college = colleges.get(college_id)
+        if college is None:
+            errors[str(college_id)]['name'] = 'This college no longer exists'
+            continue
+        for field_name, raw in fields.items():
+            try:
+                value = _clean_cell(college, field_name, raw)
+            except ValidationError as e:
+                errors[str(college_id)][field_name] = ' '.join(e.messages)
+                continue
+            if field_name == 'university':
+                university_names[college] = value
+            else:
+                setattr(college, field_name, value)
+        groups[tuple(sorted(fields))].append(college)
+
+    if errors:
+        return 0, dict(errors)
+
+    # Renaming must not collide with another college in the same district
+    renamed = [college for college in colleges.values() if 'name' in cleaned[college.id]]
+    if renamed:
+        taken = set(
+            College.objects.filter(
+                district_id__in={college.district_id for college in renamed},
+                name__in={college.name for college in renamed},
+            ).exclude(pk__in=[college.id for college in renamed]).values_list('name', 'district_id')
+        )
+        seen = set()
+        for college in renamed:
+            key = (college.name, college.district_id)
+            if key in taken or key in seen:
+                errors[str(college.id)]['name'] = 'A college with this name already exists in the district'
+            seen.add(key)
+        if errors:
+            return 0, dict(errors)
+
+    now = timezone.now()
+    with feed_transaction():
+        if university_names:
+            universities = UniversityResolver()
+            universities.load(university_names.values())
+            for college, name in university_names.items():
+                college.university_id = universities.id(name)
+        for field_names, group in groups.items():
+            for college in group:
+                college.updated_at = now
+            College.objects.bulk_update(group, [*field_names, 'updated_at'])
+    update_extents(
+        college.district_id for field_names, group in groups.items()
+        if {'latitude', 'longitude'} & set(field_names) for college in group
+    )
+    bump_dataset_version()
+
+    return sum(len(group) for group in groups.values()), {}
+
+
+def apply_bulk_action(colleges, action, value=None):
+    """
+    Runs an action bar operation over a College queryset with a constant
+    number of queries. Returns the number of colleges affected.
+    """
+    now = timezone.now()
+    college_ids = colleges.values('id')
+
+    with feed_transaction():
+        if action == 'set_type':
+            if value not in dict(College.COLLEGE_TYPES):
+                raise ValidationError('Choose a college type')
+            count = colleges.update(college_type=value, updated_at=now)
+
+        elif action == 'set_district':
+            if not District.objects.filter(pk=value).exists():
+                raise ValidationError('Choose a district')
+            moved_from = set(colleges.values_list('district_id', flat=True).distinct())
+            count = colleges.update(district_id=value, updated_at=now)
+            update_extents([*moved_from, int(value)])
+
+        elif action in ('add_degree', 'remove_degree'):
+            if not Degree.objects.filter(pk=value).exists():
+                raise ValidationError('Choose a degree')
+            Through = College.degrees.through
+            ids = list(colleges.values_list('id', flat=True))
+            if action == 'add_degree':
+                Through.objects.bulk_create(
+                    [Through(college_id=college_id, degree_id=value) for college_id in ids],
+                    ignore_conflicts=True,
+                    batch_size=500,
+                )
+            else:
+                Through.objects.filter(college_id__in=ids, degree_id=value).delete()
+            count = College.objects.filter(pk__in=ids).update(updated_at=now)
+
+        elif action == 'delete':
+            # Queryset delete still sends post_delete per college for the
+            # cache, version and extent signals
+            with deferred_extents():
+                count = College.objects.filter(pk__in=college_ids).delete()[1].get(College._meta.label, 0)
+
+        else:
+            raise ValidationError('Unknown action')
+
+    bump_dataset_version()
+    return count
@@ -0,0 +1,428 @@
+"""
+Bulk college upload from CSV or XLSX files.
+
+Rows are streamed from the file and handled in batches: each batch resolves
+its districts and degrees with a few queries, validates every row, and is
+written with bulk_create/bulk_update in its own transaction. Colleges are
+matched on their natural key (name, district), so re-uploading a corrected
+file updates rows instead of duplicating them.
+"""
+import csv
+import io
+import os
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.core.validators import EmailValidator, URLValidator
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .changes import feed_transaction
+from .extents import deferred_extents, update_extents
+from .geocoder import get_locator
+from .models import College, Degree, District
+from .universities import UniversityResolver
+from .versioning import bump_dataset_version
+
+BATCH_SIZE = 500
+
+# Errors beyond this many are counted but not kept in the report
+MAX_REPORTED_ERRORS = 2000
+
+COLUMNS = (
+    'name', 'district', 'state', 'college_type', 'university', 'address_line',
+    'pincode', 'website', 'email', 'phone_number', 'latitude', 'longitude',
+    'image_url', 'degrees',
+)
+REQUIRED_COLUMNS = ('name', 'district', 'state')
+
+UPDATE_FIELDS = [
+    'university', 'college_type', 'address_line', 'pincode', 'website', 'email',
+    'phone_number', 'latitude', 'longitude', 'image_url', 'updated_at',
+]
+
+COLLEGE_TYPE_LOOKUP = {}
+for _code, _label in College.COLLEGE_TYPES:
+    COLLEGE_TYPE_LOOKUP[_code] = _code
+    COLLEGE_TYPE_LOOKUP[_label.lower()] = _code
+
+_validate_url = URLValidator()
+_validate_email = EmailValidator()
+
+
+class ImportFileError(Exception):
+    """The file as a whole cannot be imported (bad format, missing columns)"""
+
+
+def upload_storage():
+    """Private storage for uploads waiting to be imported, outside MEDIA_ROOT"""
+    return FileSystemStorage(location=settings.BULK_IMPORT_UPLOAD_DIR)
+
+
+def _normalize_header(value):
+    return re.sub(r'[^a-z0-9]+', '_', str(value or '').strip().lower()).strip('_')
+
+
+def _check_header(header):
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ImportFileError(f"Missing required column(s): {', '.join(missing)}")
+
+
+def _iter_csv(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.reader(text)
+        try:
+            header = [_normalize_header(value) for value in next(reader)]
+        except StopIteration:
+            raise ImportFileError('The file is empty')
+        except UnicodeDecodeError:
+            raise ImportFileError('CSV files must be UTF-8 encoded')
+        _check_header(header)
+        try:
+            for values in reader:
+                if any(value.strip() for value in values):
+                    yield reader.line_num, dict(zip(header, values))
+        except UnicodeDecodeError:
+            raise ImportFileError(f'Invalid UTF-8 text after line {reader.line_num}')
+    finally:
+        # Leave the underlying file open for the caller
+        text.detach()
+
+
+def _iter_xlsx(fileobj):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError('XLSX uploads require the openpyxl package; upload a CSV instead')
+
+    try:
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception:
+        raise ImportFileError('The file is not a valid XLSX workbook')
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        try:
+            header = [_normalize_header(value) for value in next(rows)]
+        except StopIteration:
+            raise ImportFileError('The file is empty')
+        _check_header(header)
+        for line, values in enumerate(rows, start=2):
+            values = ['' if value is None else str(value) for value in values]
+            if any(value.strip() for value in values):
+                yield line, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def iter_rows(fileobj, filename):
+    """Yields ``(line number, {column: text})`` for each non-empty row"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        return _iter_csv(fileobj)
+    if extension == '.xlsx':
+        return _iter_xlsx(fileobj)
+    raise ImportFileError('Upload a .csv or .xlsx file')
+
+
+def estimate_rows(fileobj, filename):
+    """Cheap row count used for progress reporting; exact for most files"""
+    if filename.lower().endswith('.csv'):
+        count = sum(chunk.count(b'\n') for chunk in iter(lambda: fileobj.read(1 << 20), b''))
+        return max(count - 1, 0)
+    try:
+        from openpyxl import load_workbook
+        workbook = load_workbook(fileobj, read_only=True)
+        count = max((workbook.active.max_row or 1) - 1, 0)
+        workbook.close()
+        return count
+    except Exception:
+        return 0
+
+
+def _decimal(value, low, high, label):
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise ValidationError(f'{label} must be a number')
+    if not number.is_finite() or not low <= number <= high:
+        raise ValidationError(f'{label} must be between {low} and {high}')
+    return number.quantize(Decimal('1e-10'))
+
+
+def _location_key(row):
+    return tuple((row.get(column) or '').strip() for column in ('state', 'latitude', 'longitude'))
+
+
+class BatchResolver:
+    """
+    Resolves districts, degrees and universities by name, remembering them
+    across batches; universities that do not exist yet are created.
+    Rows with coordinates but no district get the district the coordinates
+    fall in, when there is a district boundary file.
+    """
+
+    def __init__(self):
+        self.districts = {}
+        self.degrees = {}
+        self.located = {}
+        self.universities = UniversityResolver()
+        self.locator = get_locator()
+
+    def locate(self, rows):
+        if self.locator is None:
+            return
+        keys = []
+        for _, row in rows:
+            key = _location_key(row)
+            if (row.get('district') or '').strip() or not all(key) or key in self.located:
+                continue
+            try:
+                float(key[1]), float(key[2])
+            except ValueError:
+                continue
+            keys.append(key)
+        if keys:
+            names, _ = self.locator.locate_many(
+                [key[1] for key in keys], [key[2] for key in keys], [key[0] for key in keys],
+            )
+            for key, name in zip(keys, names):
+                self.located[key] = name[1] if name else ''
+
+    def district_name(self, row):
+        """The row's district, or the one its coordinates fall in"""
+        district = (row.get('district') or '').strip()
+        return district or self.located.get(_location_key(row), '')
+
+    def load(self, rows):
+        self.locate(rows)
+        wanted = {
+            (row.get('state', '').strip().lower(), self.district_name(row).lower())
+            for _, row in rows
+        } - set(self.districts)
+        if wanted:
+            matches = (
+                District.objects
+                .annotate(lower_name=Lower('name'), lower_state=Lower('state__name'))
+                .filter(lower_name__in={district for _, district in wanted})
+                .values_list('lower_state', 'lower_name', 'id')
+            )
+            for state, district, pk in matches:
+                self.districts[(state, district)] = pk
+            for key in wanted:
+                self.districts.setdefault(key, None)
+
+        degree_names = {
+            name.strip().lower()
+            for _, row in rows
+            for name in row.get('degrees', '').split(';') if name.strip()
+        } - set(self.degrees)
+        if degree_names:
+            matches = (
+                Degree.objects.annotate(lower_name=Lower('name'))
+                .filter(lower_name__in=degree_names)
+                .values_list('lower_name', 'id')
+            )
+            self.degrees.update(matches)
+            for name in degree_names:
+                self.degrees.setdefault(name, None)
+
+        self.universities.load(row.get('university', '') for _, row in rows)
+
+    def district(self, state, district):
+        return self.districts.get((state.strip().lower(), district.strip().lower()))
+
+    def degree(self, name):
+        return self.degrees.get(name.strip().lower())
+
+    def university(self, name):
+        return self.universities.id(name)
+
+
+def clean_row(row, resolver):
+    """
+    Validates one row. Returns ``(values, degree ids, errors)``; ``values``
+    holds College field values and is None if the row has errors.
+    """
+    errors = []
+
+    def value(column):
+        return (row.get(column) or '').strip()
+
+    name = value('name')
+    if not name:
+        errors.append('Name is required')
+    elif len(name) > 500:
+        errors.append('Name must be at most 500 characters')
+
+    district_id = None
+    district = resolver.district_name(row)
+    if not district or not value('state'):
+        errors.append('District and state are required')
+    else:
+        district_id = resolver.district(value('state'), district)
+        if district_id is None:
+            errors.append(f'Unknown district "{district}" in state "{value("state")}"')
+
+    college_type = 'other'
+    if value('college_type'):
+        college_type = COLLEGE_TYPE_LOOKUP.get(value('college_type').lower())
+        if college_type is None:
+            errors.append(f'Unknown college type "{value("college_type")}"')
+
+    coordinates = {}
+    for column, limit, label in (('latitude', 90, 'Latitude'), ('longitude', 180, 'Longitude')):
+        coordinates[column] = None
+        if value(column):
+            try:
+                coordinates[column] = _decimal(value(column), -limit, limit, label)
+            except ValidationError as e:
+                errors.extend(e.messages)
+
+    for column, validator, label in (
+        ('website', _validate_url, 'Website'),
+        ('image_url', _validate_url, 'Image URL'),
+        ('email', _validate_email, 'Email'),
+    ):
+        if value(column):
+            try:
+                validator(value(column))
+            except ValidationError:
+                errors.append(f'{label} "{value(column)}" is not valid')
+
+    if len(value('pincode')) > 10:
+        errors.append('Pincode must be at most 10 characters')
+    if len(value('phone_number')) > 20:
+        errors.append('Phone number must be at most 20 characters')
+
+    degree_ids = []
+    for degree_name in value('degrees').split(';'):
+        if degree_name.strip():
+            degree_id = resolver.degree(degree_name)
+            if degree_id is None:
+                errors.append(f'Unknown degree "{degree_name.strip()}"')
+            else:
+                degree_ids.append(degree_id)
+
+    if errors:
+        return None, [], errors
+
+    values = {
+        'name': name,
+        'district_id': district_id,
+        'college_type': college_type,
+        'university_id': resolver.university(value('university')),
+        'address_line': value('address_line'),
+        'pincode': value('pincode') or '000000',
+        'website': value('website') or None,
+        'email': value('email') or None,
+        'phone_number': value('phone_number') or None,
+        'image_url': value('image_url') or None,
+        **coordinates,
+    }
+    return values, degree_ids, []
+
+
+def write_batch(rows):
+    """
+    Creates or updates one batch of cleaned rows in a single transaction.
+    ``rows`` maps (name, district_id) to (values, degree ids). Returns the
+    number of created and updated colleges.
+    """
+    now = timezone.now()
+    with feed_transaction():
+        existing = {
+            (college.name, college.district_id): college
+            for college in College.objects.filter(
+                district_id__in={district_id for _, district_id in rows},
+                name__in={name for name, _ in rows},
+            ).only('id', 'name', 'district_id')
+        }
+
+        to_create, to_update = [], []
+        for key, (values, _) in rows.items():
+            college = existing.get(key)
+            if college is None:
+                to_create.append(College(**values))
+            else:
+                for field, field_value in values.items():
+                    setattr(college, field, field_value)
+                # bulk_update skips auto_now; cached cards are keyed on it
+                college.updated_at = now
+                to_update.append(college)
+
+        created = College.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+        if not all(college.pk for college in created):
+            # Backends without RETURNING need a lookup for the new ids
+            created = list(College.objects.filter(
+                district_id__in={college.district_id for college in to_create},
+                name__in={college.name for college in to_create},
+            ).only('id', 'name', 'district_id'))
+        College.objects.bulk_update(to_update, UPDATE_FIELDS, batch_size=BATCH_SIZE)
+
+        ids = {(college.name, college.district_id): college.id for college in [*created, *to_update]}
+        Through = College.degrees.through
+        Through.objects.bulk_create(
+            [
+                Through(college_id=ids[key], degree_id=degree_id)
+                for key, (_, degree_ids) in rows.items()
+                for degree_id in degree_ids
+            ],
+            ignore_conflicts=True,
+            batch_size=BATCH_SIZE,
+        )
+
+    update_extents({district_id for _, district_id in rows})
+    return len(to_create), len(to_update)
+
+
+def import_colleges(fileobj, filename, progress=None):
+    """
+    Imports colleges from an open CSV/XLSX file. ``progress`` is called as
+    ``progress(rows_done)`` after every batch. Returns a summary with the
+    per-row error report; rows with errors are skipped, valid rows in the
+    same batch are still written.
+    """
+    resolver = BatchResolver()
+    summary = {'rows': 0, 'created': 0, 'updated': 0, 'failed': 0, 'errors': []}
+
+    def flush(batch):
+        resolver.load(batch)
+        cleaned = {}
+        for line, row in batch:
+            values, degree_ids, errors = clean_row(row, resolver)
+            if errors:
+                summary['failed'] += 1
+                if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                    summary['errors'].append({'line': line, 'name': row.get('name', ''), 'errors': errors})
+                continue
+            # A later row for the same college wins, as it would row by row
+            cleaned[(values['name'], values['district_id'])] = (values, degree_ids)
+        if cleaned:
+            created, updated = write_batch(cleaned)
+            summary['created'] += created
+            summary['updated'] += updated
+        summary['rows'] += len(batch)
+        if progress:
+            progress(summary['rows'])
+
+    try:
+        with deferred_extents():
+            batch = []
+            for line, row in iter_rows(fileobj, filename):
+                batch.append((line, row))
+                if len(batch) == BATCH_SIZE:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+    finally:
+        if summary['created'] or summary['updated']:
+            # Bulk writes bypass the signals that normally do this
+            bump_dataset_version()
+
+    return summary
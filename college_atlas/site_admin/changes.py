@@ -0,0 +1,162 @@
+"""
+Delta sync feed of colleges and geography for /api/changes/.
+
+Every row carries ``updated_at``; deletions are kept as Tombstone rows. The
+feed merges all of them into one stream ordered by (timestamp, type, id) and
+pages through it with an opaque cursor token, so a client that stores the
+``next`` token only ever downloads what changed since its last sync.
+
+Rows committed in the last CHANGE_FEED_SETTLE_SECONDS are held back: a
+transaction can commit after a later-stamped one, and handing out a cursor
+past its rows would skip them for good. That only holds for transactions
+that commit within the settle window of stamping their rows, so long write
+transactions (imports, bulk edits) run in ``feed_transaction``, which
+restamps their rows just before committing.
+"""
+import base64
+import heapq
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import College, Country, Degree, District, State, Tombstone, University
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Feed types in the order they are applied when timestamps tie, parents first
+FEED_TYPES = ('country', 'state', 'district', 'degree', 'university', 'college')
+TOMBSTONE_RANK = len(FEED_TYPES)
+
+FEED_FIELDS = {
+    'country': (Country, ('id', 'name')),
+    'state': (State, ('id', 'name', 'country_id')),
+    'district': (District, ('id', 'name', 'state_id')),
+    'degree': (Degree, ('id', 'name', 'duration_years')),
+    'university': (University, ('id', 'name')),
+    'college': (College, (
+        'id', 'name', 'university_id', 'college_type', 'district_id', 'address_line',
+        'pincode', 'website', 'email', 'phone_number', 'latitude', 'longitude', 'image_url',
+    )),
+}
+
+FEED_TYPE_BY_MODEL = {model: name for name, (model, _) in FEED_FIELDS.items()}
+
+
+@contextmanager
+def feed_transaction():
+    """
+    transaction.atomic() for writes that may take longer than the settle
+    window. Just before the commit, every feed row and tombstone stamped
+    since the transaction began is stamped again with the current time, so
+    no client can have paged past it by the time it becomes visible. Rows
+    other transactions wrote meanwhile are sent again, which is harmless.
+    """
+    started = timezone.now()
+    with transaction.atomic():
+        yield
+        now = timezone.now()
+        for model, _ in FEED_FIELDS.values():
+            model.objects.filter(updated_at__gte=started).update(updated_at=now)
+        Tombstone.objects.filter(deleted_at__gte=started).update(deleted_at=now)
+
+
+def encode_cursor(moment, rank, pk):
+    micros = (moment - EPOCH) // timedelta(microseconds=1)
+    return base64.urlsafe_b64encode(f'{micros}.{rank}.{pk}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Parses a ``since`` token; '' means from the beginning. Raises ValueError"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        micros, rank, pk = (int(part) for part in raw.split('.'))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor token')
+    if not 0 <= rank <= TOMBSTONE_RANK:
+        raise ValueError('Invalid cursor token')
+    return EPOCH + timedelta(microseconds=micros), rank, pk
+
+
+def _after(cursor, rank, field):
+    """Rows of the source with ``rank`` that sort after the cursor"""
+    if cursor is None:
+        return Q()
+    moment, cursor_rank, pk = cursor
+    if rank > cursor_rank:
+        return Q(**{f'{field}__gte': moment})
+    if rank < cursor_rank:
+        return Q(**{f'{field}__gt': moment})
+    return Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'pk__gt': pk})
+
+
+def _number(value):
+    return float(value) if value is not None else None
+
+
+def _source(name, rank, cursor, until, limit):
+    model, fields = FEED_FIELDS[name]
+    rows = (
+        model.objects
+        .filter(_after(cursor, rank, 'updated_at'), updated_at__lte=until)
+        .order_by('updated_at', 'pk')
+        .values(*fields, 'updated_at')[:limit]
+    )
+    for row in rows:
+        moment = row.pop('updated_at')
+        if name == 'college':
+            row['latitude'] = _number(row['latitude'])
+            row['longitude'] = _number(row['longitude'])
+        yield (moment, rank, row['id']), {'type': name, 'id': row['id'], 'updated_at': moment, 'data': row}
+
+
+def _tombstones(cursor, until, limit):
+    rows = (
+        Tombstone.objects
+        .filter(_after(cursor, TOMBSTONE_RANK, 'deleted_at'), deleted_at__lte=until)
+        .order_by('deleted_at', 'pk')
+        .values_list('pk', 'model', 'object_id', 'deleted_at')[:limit]
+    )
+    for pk, name, object_id, deleted_at in rows:
+        yield (deleted_at, TOMBSTONE_RANK, pk), {'type': name, 'id': object_id, 'deleted': True, 'updated_at': deleted_at}
+
+
+def changes_since(cursor, limit):
+    """
+    Returns up to ``limit`` changes after ``cursor`` (see decode_cursor) as
+    ``{'changes': [...], 'next': token, 'has_more': bool}``. Clients pass
+    ``next`` back as ``since`` and keep paging while ``has_more`` is true.
+    """
+    until = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_SETTLE_SECONDS)
+    # Each source can fill the page on its own, so one extra row from each
+    # tells whether anything is left after it
+    sources = [_source(name, rank, cursor, until, limit + 1) for rank, name in enumerate(FEED_TYPES)]
+    sources.append(_tombstones(cursor, until, limit + 1))
+    merged = list(heapq.merge(*sources, key=lambda entry: entry[0]))
+
+    page = merged[:limit]
+    college_ids = [change['id'] for _, change in page if change['type'] == 'college' and 'data' in change]
+    degree_ids = {college_id: [] for college_id in college_ids}
+    through = College.degrees.through.objects.filter(college_id__in=college_ids).order_by('degree_id')
+    for college_id, degree_id in through.values_list('college_id', 'degree_id'):
+        degree_ids[college_id].append(degree_id)
+    for _, change in page:
+        if change['type'] == 'college' and 'data' in change:
+            change['data']['degree_ids'] = degree_ids[change['id']]
+
+    if page:
+        next_token = encode_cursor(*page[-1][0])
+    elif cursor is not None:
+        next_token = encode_cursor(*cursor)
+    else:
+        next_token = ''
+    return {
+        'changes': [change for _, change in page],
+        'next': next_token,
+        'has_more': len(merged) > limit,
+    }
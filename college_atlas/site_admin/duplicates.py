@@ -0,0 +1,297 @@
+"""
+Finds colleges that were entered twice under slightly different names.
+
+Comparing every pair of colleges is quadratic, so pairs are only compared
+within blocks of colleges that already have something in common: the same
+or a neighbouring geohash cell, the same pincode, or a word of the
+normalized name that few other colleges use. Blocks too large to say
+anything (a word like "college") are skipped.
+
+Each pair is scored on the trigram similarity of the normalized names and
+on how well the locations agree: distance when both have coordinates,
+otherwise the district and pincode. Pairs at or above the threshold are
+stored as DuplicateCandidate rows for review in the admin.
+"""
+import math
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+
+from .models import College, DuplicateCandidate
+
+# Cells of about 1.2 x 0.6 km
+GEOHASH_PRECISION = 6
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Blocks with more colleges than this are too unspecific to compare
+MAX_BLOCK_SIZE = 200
+MAX_NAME_BLOCK_SIZE = 50
+
+# Colleges this far apart are not the same campus
+MAX_DISTANCE_KM = 1.0
+
+NAME_WEIGHT = 0.6
+SCORE_THRESHOLD = 0.75
+
+# District names the importer uses when the source has none
+PLACEHOLDER_DISTRICTS = {'unknown', 'na', 'n a', 'none', 'not available'}
+
+ABBREVIATIONS = {
+    'govt': 'government',
+    'gov': 'government',
+    'engg': 'engineering',
+    'inst': 'institute',
+    'instt': 'institute',
+    'tech': 'technology',
+    'coll': 'college',
+    'clg': 'college',
+    'univ': 'university',
+    'sci': 'science',
+    'mgmt': 'management',
+    'mgt': 'management',
+    'poly': 'polytechnic',
+    'pharm': 'pharmacy',
+    'edu': 'education',
+    'natl': 'national',
+    'st': 'saint',
+    'shri': 'sri',
+    'shree': 'sri',
+}
+STOPWORDS = {'of', 'and', 'the', 'for', 'in', 'at'}
+
+# Why a pair was compared, as bit flags to keep millions of pairs small
+REASONS = ('geohash', 'name', 'pincode')
+GEOHASH, NAME, PINCODE = (1 << bit for bit in range(len(REASONS)))
+
+Pair = namedtuple('Pair', 'college_id other_id score name_similarity distance_km reasons')
+
+
+def normalize_name(name):
+    """
+    Lowercase ASCII words with punctuation, stopwords and common
+    abbreviations ironed out, and initials joined ("A.B.C." -> "abc")
+    """
+    text = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode().lower()
+    text = text.replace('&', ' and ')
+    tokens = []
+    initials = ''
+    for word in re.findall(r'[a-z0-9]+', text):
+        if len(word) == 1 and word.isalpha():
+            initials += word
+            continue
+        if initials:
+            tokens.append(initials)
+            initials = ''
+        word = ABBREVIATIONS.get(word, word)
+        if word not in STOPWORDS:
+            tokens.append(word)
+    if initials:
+        tokens.append(initials)
+    return ' '.join(tokens)
+
+
+def _trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Standard base32 geohash of a point"""
+    ranges = ([-180.0, 180.0], [-90.0, 90.0])
+    values = (longitude, latitude)
+    code = []
+    bits = value = 0
+    for bit in range(precision * 5):
+        axis = ranges[bit % 2]
+        middle = (axis[0] + axis[1]) / 2
+        if values[bit % 2] >= middle:
+            value = value * 2 + 1
+            axis[0] = middle
+        else:
+            value *= 2
+            axis[1] = middle
+        bits += 1
+        if bits == 5:
+            code.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(code)
+
+
+def geohash_neighbourhood(latitude, longitude, precision=GEOHASH_PRECISION):
+    """The cell of the point and the eight cells around it"""
+    longitude_bits = (precision * 5 + 1) // 2
+    latitude_bits = precision * 5 // 2
+    width = 360.0 / 2 ** longitude_bits
+    height = 180.0 / 2 ** latitude_bits
+    return {
+        geohash(
+            max(-90.0, min(90.0, latitude + dy * height)),
+            (longitude + dx * width + 180.0) % 360.0 - 180.0,
+            precision,
+        )
+        for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+    }
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(min(1.0, a)))
+
+
+def _load():
+    rows = College.objects.values_list(
+        'id', 'name', 'district_id', 'district__name', 'pincode', 'latitude', 'longitude',
+    ).order_by('id')
+    colleges = {}
+    for pk, name, district_id, district_name, pincode, latitude, longitude in rows.iterator(chunk_size=2000):
+        normalized = normalize_name(name)
+        has_point = latitude is not None and longitude is not None
+        colleges[pk] = {
+            'normalized': normalized,
+            'trigrams': _trigrams(normalized),
+            'district_id': district_id,
+            'placeholder_district': normalize_name(district_name) in PLACEHOLDER_DISTRICTS,
+            'pincode': ''.join((pincode or '').split()),
+            'point': (float(latitude), float(longitude)) if has_point else None,
+        }
+    return colleges
+
+
+def candidate_pairs(colleges):
+    """``{(id, other_id): reason flags}`` for every pair sharing a usable block"""
+    cells = defaultdict(list)
+    pincodes = defaultdict(list)
+    words = defaultdict(list)
+    for pk, college in colleges.items():
+        if college['point']:
+            cells[geohash(*college['point'])].append(pk)
+        if college['pincode']:
+            pincodes[college['pincode']].append(pk)
+        for word in set(college['normalized'].split()):
+            words[word].append(pk)
+
+    pairs = defaultdict(int)
+
+    def add_block(ids, reason):
+        ids = sorted(ids)
+        for i, pk in enumerate(ids):
+            for other in ids[i + 1:]:
+                pairs[pk, other] |= reason
+
+    for pincode, ids in pincodes.items():
+        if 1 < len(ids) <= MAX_BLOCK_SIZE:
+            add_block(ids, PINCODE)
+    for word, ids in words.items():
+        if 1 < len(ids) <= MAX_NAME_BLOCK_SIZE:
+            add_block(ids, NAME)
+
+    # A pair straddling a cell boundary is found from the neighbouring cell
+    for cell, ids in cells.items():
+        if len(ids) > MAX_BLOCK_SIZE:
+            continue
+        latitude, longitude = colleges[ids[0]]['point']
+        nearby = [
+            pk
+            for neighbour in geohash_neighbourhood(latitude, longitude)
+            if neighbour >= cell and len(cells.get(neighbour, ())) <= MAX_BLOCK_SIZE
+            for pk in cells.get(neighbour, ())
+        ]
+        for pk in ids:
+            for other in nearby:
+                if pk != other:
+                    pairs[min(pk, other), max(pk, other)] |= GEOHASH
+    return pairs
+
+
+def score_pair(college, other):
+    """(score, name similarity, distance in km or None) of two loaded colleges"""
+    shared = len(college['trigrams'] & other['trigrams'])
+    name_similarity = shared / (len(college['trigrams']) + len(other['trigrams']) - shared)
+
+    distance = None
+    if college['point'] and other['point']:
+        distance = haversine_km(*college['point'], *other['point'])
+        location = max(0.0, 1 - distance / MAX_DISTANCE_KM)
+    elif college['district_id'] == other['district_id'] or (college['pincode'] and college['pincode'] == other['pincode']):
+        location = 1.0
+    elif college['placeholder_district'] or other['placeholder_district']:
+        location = 0.8
+    else:
+        location = 0.0
+    score = NAME_WEIGHT * name_similarity + (1 - NAME_WEIGHT) * location
+    return score, name_similarity, distance
+
+
+def find_duplicates(threshold=SCORE_THRESHOLD, progress=None):
+    """Likely duplicate pairs as Pair tuples, best first"""
+    colleges = _load()
+    pairs = candidate_pairs(colleges)
+    found = []
+    for done, ((pk, other), flags) in enumerate(pairs.items(), start=1):
+        score, name_similarity, distance = score_pair(colleges[pk], colleges[other])
+        if score >= threshold:
+            reasons = ', '.join(reason for bit, reason in enumerate(REASONS) if flags & 1 << bit)
+            found.append(Pair(pk, other, round(score, 4), round(name_similarity, 4), distance, reasons))
+        if progress and done % 10000 == 0:
+            progress(done, len(pairs))
+    found.sort(key=lambda pair: -pair.score)
+    return found
+
+
+@transaction.atomic
+def save_candidates(pairs):
+    """Replaces the open candidates with ``pairs``; dismissed pairs stay dismissed"""
+    DuplicateCandidate.objects.filter(status=DuplicateCandidate.STATUS_OPEN).delete()
+    DuplicateCandidate.objects.bulk_create(
+        [
+            DuplicateCandidate(
+                college_id=pair.college_id,
+                other_id=pair.other_id,
+                score=pair.score,
+                name_similarity=pair.name_similarity,
+                distance_km=pair.distance_km,
+                reasons=pair.reasons,
+            )
+            for pair in pairs
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    return DuplicateCandidate.objects.filter(status=DuplicateCandidate.STATUS_OPEN).count()
+
+
+# Copied from the duplicate when the kept college has no value
+MERGE_FIELDS = (
+    'university', 'address_line', 'pincode', 'website', 'email', 'phone_number',
+    'latitude', 'longitude', 'image_url',
+)
+
+
+@transaction.atomic
+def merge_colleges(keep, duplicate):
+    """
+    Moves the duplicate's degrees to ``keep``, fills ``keep``'s empty fields
+    from it and deletes the duplicate
+    """
+    if keep.pk == duplicate.pk:
+        raise ValueError('Cannot merge a college into itself')
+
+    degree_ids = list(duplicate.degrees.values_list('id', flat=True))
+    for field in MERGE_FIELDS:
+        if getattr(keep, field) in (None, '') and getattr(duplicate, field) not in (None, ''):
+            setattr(keep, field, getattr(duplicate, field))
+    if not keep.image and duplicate.image:
+        keep.image = duplicate.image
+        keep.image_variants = duplicate.image_variants
+    if (normalize_name(keep.district.name) in PLACEHOLDER_DISTRICTS
+            and normalize_name(duplicate.district.name) not in PLACEHOLDER_DISTRICTS):
+        keep.district = duplicate.district
+
+    # Deleted first: keep may be taking over its (name, district)
+    duplicate.delete()
+    keep.save()
+    keep.degrees.add(*degree_ids)
+    return keep
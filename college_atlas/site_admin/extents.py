@@ -0,0 +1,155 @@
+"""
+Stored centroids and bounding boxes of districts, states and countries.
+
+When colleges gain, lose or move coordinates, only the districts they were
+and are in are re-aggregated from their colleges; states and countries are
+then rolled up from those district rows, weighting centroids by how many
+located colleges each has. Writes that skip model signals (bulk updates)
+call ``update_extents`` with the districts they touched, and long imports
+wrap themselves in ``deferred_extents`` to do it once at the end.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db.models import Avg, Count, Max, Min
+
+from .models import College, Country, District, State
+from .versioning import bump_dataset_version
+
+EXTENT_FIELDS = (
+    'located_colleges', 'centroid_latitude', 'centroid_longitude',
+    'min_latitude', 'max_latitude', 'min_longitude', 'max_longitude',
+)
+
+EMPTY_EXTENT = {field: None for field in EXTENT_FIELDS}
+EMPTY_EXTENT['located_colleges'] = 0
+
+_deferred = threading.local()
+
+
+def _float(value):
+    return float(value) if value is not None else None
+
+
+def _roll_up(children):
+    """Extent of a region from the extents of its children"""
+    children = [child for child in children if child['located_colleges']]
+    if not children:
+        return dict(EMPTY_EXTENT)
+    total = sum(child['located_colleges'] for child in children)
+    return {
+        'located_colleges': total,
+        'centroid_latitude': sum(child['centroid_latitude'] * child['located_colleges'] for child in children) / total,
+        'centroid_longitude': sum(child['centroid_longitude'] * child['located_colleges'] for child in children) / total,
+        'min_latitude': min(child['min_latitude'] for child in children),
+        'max_latitude': max(child['max_latitude'] for child in children),
+        'min_longitude': min(child['min_longitude'] for child in children),
+        'max_longitude': max(child['max_longitude'] for child in children),
+    }
+
+
+def _save(model, extents):
+    objects = []
+    for pk, extent in extents.items():
+        obj = model(pk=pk)
+        for field, value in extent.items():
+            setattr(obj, field, value)
+        objects.append(obj)
+    # Extents are derived data, so rows keep their updated_at
+    model.objects.bulk_update(objects, EXTENT_FIELDS, batch_size=500)
+
+
+def recompute(district_ids=None, models=(College, District, State, Country)):
+    """
+    Recomputes the extents of ``district_ids`` (all districts when None) and
+    of the states and countries above them. ``models`` lets migrations pass
+    their historical models.
+    """
+    college_model, district_model, state_model, country_model = models
+    districts = district_model.objects.all()
+    if district_ids is not None:
+        districts = districts.filter(pk__in=set(district_ids))
+    district_states = dict(districts.values_list('id', 'state_id'))
+    if not district_states:
+        return
+
+    extents = {pk: dict(EMPTY_EXTENT) for pk in district_states}
+    colleges = college_model.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    if district_ids is not None:
+        colleges = colleges.filter(district_id__in=list(district_states))
+    located = (
+        colleges
+        .values('district_id')
+        .annotate(
+            located_colleges=Count('id'),
+            centroid_latitude=Avg('latitude'),
+            centroid_longitude=Avg('longitude'),
+            min_latitude=Min('latitude'),
+            max_latitude=Max('latitude'),
+            min_longitude=Min('longitude'),
+            max_longitude=Max('longitude'),
+        )
+    )
+    for row in located:
+        extents[row['district_id']] = {field: _float(row[field]) for field in EXTENT_FIELDS}
+        extents[row['district_id']]['located_colleges'] = row['located_colleges']
+    _save(district_model, extents)
+
+    state_ids = set(district_states.values())
+    children = defaultdict(list)
+    for state_id, *values in district_model.objects.filter(state_id__in=state_ids).values_list('state_id', *EXTENT_FIELDS):
+        children[state_id].append(dict(zip(EXTENT_FIELDS, values)))
+    _save(state_model, {pk: _roll_up(children[pk]) for pk in state_ids})
+
+    country_ids = set(state_model.objects.filter(pk__in=state_ids).values_list('country_id', flat=True))
+    children = defaultdict(list)
+    for country_id, *values in state_model.objects.filter(country_id__in=country_ids).values_list('country_id', *EXTENT_FIELDS):
+        children[country_id].append(dict(zip(EXTENT_FIELDS, values)))
+    _save(country_model, {pk: _roll_up(children[pk]) for pk in country_ids})
+
+
+def _apply(district_ids):
+    recompute(district_ids)
+    # The write that moved the colleges bumped the version already, but
+    # cached API responses may have been rebuilt before the extents were
+    bump_dataset_version()
+
+
+def update_extents(district_ids):
+    """Refreshes the extents above ``district_ids``, or queues them in deferred_extents"""
+    district_ids = {pk for pk in district_ids if pk is not None}
+    if not district_ids:
+        return
+    pending = getattr(_deferred, 'district_ids', None)
+    if pending is not None:
+        pending.update(district_ids)
+    else:
+        _apply(district_ids)
+
+
+@contextmanager
+def deferred_extents():
+    """Collects extent updates inside the block and applies them once at the end"""
+    if getattr(_deferred, 'district_ids', None) is not None:
+        # Nested: the outermost block applies them
+        yield
+        return
+    _deferred.district_ids = set()
+    try:
+        yield
+    finally:
+        district_ids, _deferred.district_ids = _deferred.district_ids, None
+    if district_ids:
+        _apply(district_ids)
+
+
+def serialize_extent(row):
+    """The extent part of a geography API entry, from a values() row"""
+    if not row['located_colleges']:
+        return {'located_colleges': 0, 'centroid': None, 'bbox': None}
+    return {
+        'located_colleges': row['located_colleges'],
+        'centroid': [row['centroid_latitude'], row['centroid_longitude']],
+        'bbox': [[row['min_latitude'], row['min_longitude']], [row['max_latitude'], row['max_longitude']]],
+    }
@@ -0,0 +1,310 @@
+"""
+Offline reverse geocoding of coordinates to districts.
+
+District boundaries come from a local GeoJSON file
+(settings.DISTRICT_BOUNDARIES_FILE) of Polygon or MultiPolygon features
+carrying district and state names. Points are first matched against the
+bounding boxes of the polygons through a uniform grid, then tested against
+the few candidate polygons by ray casting, vectorized with NumPy. Points in
+no polygon (just off the coast, or in a gap between features) go to the
+nearest district centroid within GEOCODER_MAX_FALLBACK_KM.
+
+The locator deals in names, not District rows, so it also works for
+districts an import has yet to create.
+
+``repair_districts`` applies it to existing College rows, in bulk.
+"""
+import json
+import math
+import os
+import threading
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .changes import feed_transaction
+from .extents import update_extents
+from .models import College, District
+from .versioning import bump_dataset_version
+
+# Grid cell size for the bounding box prefilter
+GRID_DEGREES = 0.25
+
+# Property names used for the district and state by common boundary files
+DISTRICT_KEYS = ('district', 'DISTRICT', 'dtname', 'district_name', 'NAME_2', 'name')
+STATE_KEYS = ('state', 'ST_NM', 'STATE', 'stname', 'state_name', 'NAME_1', 'st_nm')
+
+# Point x edge matrix entries per ray casting step, to bound memory
+CHUNK_ENTRIES = 2_000_000
+
+_cache = {'key': None, 'locator': None}
+_cache_lock = threading.Lock()
+
+
+def name_key(name):
+    """Comparable form of a district or state name"""
+    return ' '.join((name or '').replace('&', ' and ').lower().split())
+
+
+def _property(properties, keys):
+    for key in keys:
+        if properties.get(key):
+            return str(properties[key]).strip()
+    return ''
+
+
+def _polygons(geometry):
+    if not geometry:
+        return []
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return geometry['coordinates']
+    return []
+
+
+def _ring_area_centroid(ring):
+    """Signed area and centroid (x, y) of a closed ring by the shoelace formula"""
+    x, y = ring[:-1, 0], ring[:-1, 1]
+    x2, y2 = ring[1:, 0], ring[1:, 1]
+    cross = x * y2 - x2 * y
+    area = cross.sum() / 2
+    if abs(area) < 1e-12:
+        return 0.0, x.mean(), y.mean()
+    return area, ((x + x2) * cross).sum() / (6 * area), ((y + y2) * cross).sum() / (6 * area)
+
+
+def _inside(rings, x, y):
+    """Even-odd ray casting of points (x, y) against all rings of a polygon"""
+    inside = np.zeros(len(x), dtype=bool)
+    for ring in rings:
+        x1, y1 = ring[:-1, 0], ring[:-1, 1]
+        x2, y2 = ring[1:, 0], ring[1:, 1]
+        step = max(1, CHUNK_ENTRIES // max(len(x1), 1))
+        for start in range(0, len(x), step):
+            px = x[start:start + step, None]
+            py = y[start:start + step, None]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                crosses = ((y1 > py) != (y2 > py)) & (px < (x2 - x1) * (py - y1) / (y2 - y1) + x1)
+            inside[start:start + step] ^= (np.count_nonzero(crosses, axis=1) % 2).astype(bool)
+    return inside
+
+
+def _haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(np.minimum(1.0, a)))
+
+
+class DistrictLocator:
+    """Point to (state name, district name) lookups over boundary features"""
+
+    def __init__(self, features):
+        self.names = []
+        self.rings = []
+        self.owner = []
+        areas = defaultdict(float)
+        moments = defaultdict(lambda: [0.0, 0.0])
+        name_codes = {}
+
+        for feature in features:
+            properties = feature.get('properties') or {}
+            district = _property(properties, DISTRICT_KEYS)
+            state = _property(properties, STATE_KEYS)
+            if not district:
+                continue
+            key = (name_key(state), name_key(district))
+            if key not in name_codes:
+                name_codes[key] = len(self.names)
+                self.names.append((state, district))
+            code = name_codes[key]
+            for polygon in _polygons(feature.get('geometry')):
+                rings = [np.asarray(ring, dtype=np.float64)[:, :2] for ring in polygon if len(ring) >= 4]
+                if not rings:
+                    continue
+                self.rings.append(rings)
+                self.owner.append(code)
+                area, cx, cy = _ring_area_centroid(rings[0])
+                areas[code] += abs(area)
+                moments[code][0] += abs(area) * cx
+                moments[code][1] += abs(area) * cy
+
+        self.owner = np.array(self.owner, dtype=np.int32)
+        self.state_keys = np.array([name_key(state) for state, _ in self.names], dtype=object)
+        self.bboxes = np.array(
+            [[rings[0][:, 0].min(), rings[0][:, 1].min(), rings[0][:, 0].max(), rings[0][:, 1].max()]
+             for rings in self.rings],
+            dtype=np.float64,
+        ).reshape(-1, 4)
+
+        self.grid = defaultdict(list)
+        for polygon, (min_x, min_y, max_x, max_y) in enumerate(self.bboxes):
+            for cell_x in range(math.floor(min_x / GRID_DEGREES), math.floor(max_x / GRID_DEGREES) + 1):
+                for cell_y in range(math.floor(min_y / GRID_DEGREES), math.floor(max_y / GRID_DEGREES) + 1):
+                    self.grid[cell_x, cell_y].append(polygon)
+
+        codes = sorted(areas)
+        self.centroid_codes = np.array(codes, dtype=np.int32)
+        self.centroid_lngs = np.array([moments[code][0] / areas[code] if areas[code] else np.nan for code in codes])
+        self.centroid_lats = np.array([moments[code][1] / areas[code] if areas[code] else np.nan for code in codes])
+
+    def __len__(self):
+        return len(self.names)
+
+    def locate_many(self, latitudes, longitudes, states=None, max_fallback_km=None):
+        """
+        The (state name, district name) of each point, or None, and a bool
+        array telling which came from a polygon rather than the nearest
+        centroid. With ``states``, each point only matches districts of its
+        state (compared with name_key); a blank state matches any.
+        """
+        if max_fallback_km is None:
+            max_fallback_km = settings.GEOCODER_MAX_FALLBACK_KM
+        lat = np.array([np.nan if value is None else float(value) for value in latitudes], dtype=np.float64)
+        lng = np.array([np.nan if value is None else float(value) for value in longitudes], dtype=np.float64)
+        state_keys = np.array([name_key(state) for state in (states or [''] * len(lat))], dtype=object)
+        found = np.full(len(lat), -1, dtype=np.int64)
+        valid = np.isfinite(lat) & np.isfinite(lng)
+
+        # Points grouped by grid cell, each group tested against the cell's polygons
+        points = np.flatnonzero(valid)
+        cells = np.stack([np.floor(lng[points] / GRID_DEGREES), np.floor(lat[points] / GRID_DEGREES)], axis=1).astype(np.int64)
+        by_polygon = defaultdict(list)
+        if len(points):
+            unique_cells, inverse = np.unique(cells, axis=0, return_inverse=True)
+            order = np.argsort(inverse.ravel(), kind='stable')
+            bounds = np.searchsorted(inverse.ravel()[order], np.arange(len(unique_cells) + 1))
+            for number, (cell_x, cell_y) in enumerate(unique_cells):
+                for polygon in self.grid.get((int(cell_x), int(cell_y)), ()):
+                    by_polygon[polygon].append(points[order[bounds[number]:bounds[number + 1]]])
+
+        for polygon, groups in by_polygon.items():
+            candidates = np.concatenate(groups)
+            candidates = candidates[found[candidates] < 0]
+            min_x, min_y, max_x, max_y = self.bboxes[polygon]
+            code = self.owner[polygon]
+            keep = (
+                (lng[candidates] >= min_x) & (lng[candidates] <= max_x)
+                & (lat[candidates] >= min_y) & (lat[candidates] <= max_y)
+                & ((state_keys[candidates] == '') | (state_keys[candidates] == self.state_keys[code]))
+            )
+            candidates = candidates[keep]
+            if len(candidates):
+                hits = candidates[_inside(self.rings[polygon], lng[candidates], lat[candidates])]
+                found[hits] = code
+
+        exact = found >= 0
+        missing = np.flatnonzero(valid & ~exact)
+        if len(missing) and len(self.centroid_codes) and max_fallback_km > 0:
+            distances = _haversine_km(
+                lat[missing, None], lng[missing, None], self.centroid_lats[None, :], self.centroid_lngs[None, :],
+            )
+            centroid_states = self.state_keys[self.centroid_codes]
+            wrong_state = (state_keys[missing, None] != '') & (state_keys[missing, None] != centroid_states[None, :])
+            distances[wrong_state | np.isnan(distances)] = np.inf
+            nearest = np.argmin(distances, axis=1)
+            close = distances[np.arange(len(missing)), nearest] <= max_fallback_km
+            found[missing[close]] = self.centroid_codes[nearest[close]]
+
+        return [self.names[code] if code >= 0 else None for code in found], exact
+
+    def locate(self, latitude, longitude, state=''):
+        """(state name, district name) of one point, or None"""
+        names, _ = self.locate_many([latitude], [longitude], [state])
+        return names[0]
+
+
+def load_locator(path):
+    with open(path, encoding='utf-8') as f:
+        return DistrictLocator(json.load(f).get('features', []))
+
+
+def get_locator():
+    """
+    The locator for DISTRICT_BOUNDARIES_FILE, reloaded when the file
+    changes, or None when there is no boundary file
+    """
+    path = str(settings.DISTRICT_BOUNDARIES_FILE)
+    try:
+        key = (path, os.path.getmtime(path))
+    except OSError:
+        return None
+    with _cache_lock:
+        if _cache['key'] != key:
+            _cache['locator'] = load_locator(path)
+            _cache['key'] = key
+        return _cache['locator']
+
+
+def resolve_district(state, name):
+    """The District of ``state`` named ``name`` (case-insensitively), created if missing"""
+    district = District.objects.filter(state=state, name__iexact=name).first()
+    if district is None:
+        district = District.objects.create(state=state, name=name)
+    return district
+
+
+def repair_districts(locator, colleges, exact_only=False, dry_run=False):
+    """
+    Moves ``colleges`` (a queryset) with coordinates to the district their
+    coordinates fall in, within their current state. With ``exact_only``,
+    only polygon matches count, not the nearest centroid fallback.
+
+    Returns counts of the colleges checked, moved, left unlocated, and
+    skipped because the target district already has a college of that name.
+    """
+    rows = list(
+        colleges.filter(latitude__isnull=False, longitude__isnull=False)
+        .values_list('id', 'name', 'latitude', 'longitude', 'district_id', 'district__state_id', 'district__state__name')
+    )
+    names, exact = locator.locate_many(
+        [row[2] for row in rows], [row[3] for row in rows], [row[6] for row in rows],
+    )
+
+    districts = {
+        (state_id, name_key(name)): pk
+        for pk, name, state_id in District.objects.filter(
+            state_id__in={row[5] for row in rows},
+        ).values_list('id', 'name', 'state_id')
+    }
+    moves = {}
+    summary = {'checked': len(rows), 'moved': 0, 'unlocated': 0, 'conflicts': 0}
+    for (pk, name, _, _, district_id, state_id, _), located, is_exact in zip(rows, names, exact):
+        if located is None or (exact_only and not is_exact):
+            summary['unlocated'] += 1
+            continue
+        key = (state_id, name_key(located[1]))
+        if key not in districts:
+            if dry_run:
+                districts[key] = None
+            else:
+                districts[key] = District.objects.create(state_id=state_id, name=located[1]).pk
+        if districts[key] != district_id:
+            moves[pk] = (name, districts[key])
+
+    taken = set(
+        College.objects.filter(district_id__in={target for _, target in moves.values()})
+        .values_list('name', 'district_id')
+    )
+    updates = []
+    touched = set()
+    now = timezone.now()
+    previous = {row[0]: row[4] for row in rows}
+    for pk, (name, target) in moves.items():
+        if (name, target) in taken:
+            summary['conflicts'] += 1
+            continue
+        taken.add((name, target))
+        updates.append(College(pk=pk, district_id=target, updated_at=now))
+        touched.update((previous[pk], target))
+    summary['moved'] = len(updates)
+
+    if updates and not dry_run:
+        with feed_transaction():
+            # bulk_update sends no signals; the extent update and version bump below cover them
+            College.objects.bulk_update(updates, ['district', 'updated_at'], batch_size=500)
+        update_extents(touched)
+        bump_dataset_version()
+    return summary
@@ -0,0 +1,92 @@
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import College
+
+# Fixed derivative sizes (width, height); each is produced in every format
+IMAGE_VARIANTS = {
+    'popup': (320, 180),
+    'card': (640, 360),
+    'hero': (1600, 900),
+}
+
+IMAGE_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 6},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+DERIVATIVES_DIR = 'college_images/derivatives'
+
+def open_rgb(source):
+    """Opens an image file as an upright RGB image, flattening transparency"""
+    with Image.open(source) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode in ('RGB', 'L'):
+            return original.convert('RGB')
+        original = original.convert('RGBA')
+        background = Image.new('RGB', original.size, (255, 255, 255))
+        background.paste(original, mask=original.split()[-1])
+        return background
+
+
+def encode_variant(image, size, fmt):
+    """Crops and resizes an RGB image to ``size`` and encodes it as ``fmt``"""
+    resized = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    resized.save(buffer, **IMAGE_FORMATS[fmt])
+    return buffer.getvalue()
+
+
+def render_derivatives(source, digest):
+    """
+    Resizes an image file into every variant and format, storing each under a
+    content-hashed name. Returns the ``image_variants`` mapping for College.
+    """
+    original = open_rgb(source)
+    variants = {}
+    for variant, size in IMAGE_VARIANTS.items():
+        entry = {'width': size[0], 'height': size[1]}
+        for fmt in IMAGE_FORMATS:
+            name = f'{DERIVATIVES_DIR}/{digest}-{variant}.{fmt}'
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(encode_variant(original, size, fmt)))
+            entry[fmt] = name
+        variants[variant] = entry
+    return variants
+
+
+def generate_image_derivatives(college_id, force=False):
+    """
+    Builds thumbnails for a college's uploaded image. Identical uploads share
+    derivatives through the content hash, so re-runs are cheap.
+    """
+    college = College.objects.filter(pk=college_id).only('id', 'image', 'image_variants').first()
+    if college is None or not college.image:
+        return None
+    if college.image_variants and not force:
+        return college.image_variants
+
+    image_name = college.image.name
+    with college.image.open('rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    variants = render_derivatives(io.BytesIO(data), digest)
+
+    # Only store the result if the image was not replaced meanwhile; bumping
+    # updated_at refreshes cached cards so they pick up the srcset
+    College.objects.filter(pk=college_id, image=image_name).update(
+        image_variants=variants,
+        updated_at=timezone.now(),
+    )
+    return variants
+
+
+def schedule_image_derivatives(college_id):
+    """Queues derivative generation; repeated uploads collapse into one task"""
+    from .task_queue import enqueue
+    enqueue('images.generate_derivatives', college_id=college_id, dedupe_key=f'college-images:{college_id}')
@@ -0,0 +1,213 @@
+import os
+import re
+import json
+
+from django.conf import settings
+from .models import Country, State, District, College
+from .changes import feed_transaction
+from .extents import deferred_extents
+from .geocoder import get_locator, resolve_district
+from .universities import resolve_university
+
+
+def extract_pincode(address):
+    """Extract pincode from address string"""
+    # Look for 6-digit pincode pattern
+    match = re.search(r'\b\d{6}\b', address)
+    return match.group(0) if match else '000000'
+
+
+def clean_phone(phone):
+    """Clean phone number"""
+    if phone:
+        return phone.strip()
+    return None
+
+
+def clean_url(url):
+    """Clean URL"""
+    if url and url.strip():
+        return url.strip()
+    return None
+
+
+def extract_college_name(college_field):
+    """Extract college name from field (removing ID if present)"""
+    if not college_field:
+        return ''
+    # Remove the (Id: C-XXXXX) part
+    name = re.sub(r'\s*\(Id:\s*C-\d+\)\s*$', '', college_field)
+    return name.strip()
+
+
+def extract_university_name(university_field):
+    """Extract university name from field (removing ID if present)"""
+    if not university_field:
+        return None
+    # Remove the (Id: U-XXXX) part
+    name = re.sub(r'\s*\(Id:\s*U-\d+\)\s*$', '', university_field)
+    return name.strip() if name else None
+
+
+# Every saved college would otherwise re-aggregate its district
+@deferred_extents()
+def load_data_from_json(data_dir=None, log=print, progress=None):
+    """
+    Load college data from all JSON files in the data folder.
+
+    ``log`` receives human readable status lines and ``progress`` is called as
+    ``progress(done_files, total_files)`` so the import can run as a
+    background task as well as from ``add_data.py``.
+    """
+    data_dir = data_dir or settings.IMPORT_DATA_DIR
+
+    if not os.path.exists(data_dir):
+        log(f"Error: Data directory not found at {data_dir}")
+        return
+
+    # Get all JSON files
+    json_files = [f for f in os.listdir(data_dir) if f.endswith('_colleges_details.json')]
+
+    if not json_files:
+        log("No JSON files found in data directory")
+        return
+
+    log(f"Found {len(json_files)} JSON files to process")
+
+    # Create India country if it doesn't exist
+    country, created = Country.objects.get_or_create(name='India')
+    if created:
+        log("Created country: India")
+
+    total_colleges = 0
+    skipped_colleges = 0
+    located_colleges = 0
+
+    # Rows without a district get one from their coordinates when there is
+    # a district boundary file
+    locator = get_locator()
+    # University name -> University, so each name is looked up once
+    universities = {}
+
+    for index, json_file in enumerate(json_files):
+        file_path = os.path.join(data_dir, json_file)
+        log(f"\nProcessing: {json_file}")
+
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                colleges_data = json.load(f)
+
+            # One transaction per file, so that the progress reported between
+            # files is committed and visible while the import runs
+            with feed_transaction():
+                for college_data in colleges_data:
+                    try:
+                        # Get or create state
+                        state_name = college_data.get('state', '').strip()
+                        if not state_name:
+                            log(f"  Skipping college with no state: {college_data.get('college', 'Unknown')}")
+                            skipped_colleges += 1
+                            continue
+
+                        state, _ = State.objects.get_or_create(
+                            name=state_name,
+                            country=country
+                        )
+
+                        # Get coordinates
+                        latitude = college_data.get('latitude')
+                        longitude = college_data.get('longitude')
+
+                        # Convert to float/Decimal if present
+                        if latitude:
+                            try:
+                                latitude = float(latitude)
+                            except (ValueError, TypeError):
+                                latitude = None
+
+                        if longitude:
+                            try:
+                                longitude = float(longitude)
+                            except (ValueError, TypeError):
+                                longitude = None
+
+                        # Get or create district
+                        district_name = college_data.get('district', '').strip()
+                        located = None
+                        if not district_name and locator and latitude and longitude:
+                            located = locator.locate(latitude, longitude, state_name)
+
+                        if located:
+                            district = resolve_district(state, located[1])
+                            located_colleges += 1
+                        else:
+                            district, _ = District.objects.get_or_create(
+                                name=district_name or 'Unknown',
+                                state=state
+                            )
+
+                        # Extract college name
+                        college_name = extract_college_name(college_data.get('college', ''))
+                        if not college_name:
+                            log(f"  Skipping college with no name in {state_name}")
+                            skipped_colleges += 1
+                            continue
+
+                        # Extract university name
+                        university_name = extract_university_name(college_data.get('university'))
+                        if university_name not in universities:
+                            universities[university_name] = resolve_university(university_name)
+
+                        # Extract address and pincode
+                        address = college_data.get('address', '').strip()
+                        pincode = extract_pincode(address)
+
+                        # Create or update college
+                        college, created = College.objects.update_or_create(
+                            name=college_name,
+                            district=district,
+                            defaults={
+                                'university': universities[university_name],
+                                'college_type': 'other',  # Default type, can be updated manually
+                                'address_line': address if address else '',
+                                'pincode': pincode,
+                                'website': clean_url(college_data.get('website')),
+                                'phone_number': clean_phone(college_data.get('phone')),
+                                'latitude': latitude,
+                                'longitude': longitude,
+                                'image_url': clean_url(college_data.get('image_url')),
+                            }
+                        )
+
+                        if created:
+                            total_colleges += 1
+
+                    except Exception as e:
+                        log(f"  Error processing college {college_data.get('college', 'Unknown')}: {str(e)}")
+                        skipped_colleges += 1
+                        continue
+
+            log(f"  ✓ Completed {json_file}")
+
+        except json.JSONDecodeError as e:
+            log(f"  Error reading {json_file}: {str(e)}")
+            continue
+        except Exception as e:
+            log(f"  Unexpected error with {json_file}: {str(e)}")
+            # The file's transaction was rolled back with any universities it created
+            universities.clear()
+            continue
+        finally:
+            if progress:
+                progress(index + 1, len(json_files))
+
+    log(f"\n{'='*50}")
+    log("Data import completed!")
+    log(f"Total colleges added: {total_colleges}")
+    log(f"Skipped colleges: {skipped_colleges}")
+    log(f"Districts assigned from coordinates: {located_colleges}")
+    log(f"Total states: {State.objects.count()}")
+    log(f"Total districts: {District.objects.count()}")
+    log(f"{'='*50}")
+
+    return {'added': total_colleges, 'skipped': skipped_colleges, 'located': located_colleges}
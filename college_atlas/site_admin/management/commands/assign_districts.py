@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from site_admin.duplicates import PLACEHOLDER_DISTRICTS
+from site_admin.geocoder import get_locator, load_locator, repair_districts
+from site_admin.models import College
+
+
+class Command(BaseCommand):
+    help = 'Assigns districts to colleges from their coordinates using district boundary polygons'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--boundaries',
+            help='GeoJSON file with district boundaries (default: DISTRICT_BOUNDARIES_FILE)',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Check every college with coordinates, not only those in an "Unknown" district. '
+                 'Only moves colleges whose coordinates fall inside a boundary polygon',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without saving',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        locator = load_locator(options['boundaries']) if options['boundaries'] else get_locator()
+        if locator is None:
+            raise CommandError(f'No boundary file at {settings.DISTRICT_BOUNDARIES_FILE}')
+        self.stdout.write(f'Loaded {len(locator)} district boundaries')
+
+        colleges = College.objects.all()
+        if not options['all']:
+            placeholders = Q()
+            for name in PLACEHOLDER_DISTRICTS:
+                placeholders |= Q(district__name__iexact=name)
+            colleges = colleges.filter(placeholders)
+
+        summary = repair_districts(locator, colleges, exact_only=options['all'], dry_run=options['dry_run'])
+
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {summary['moved']} of {summary['checked']} colleges in {time.monotonic() - started:.1f}s; "
+            f"{summary['unlocated']} not located, {summary['conflicts']} already in their district "
+            f"under the same name (see find_duplicates)"
+        ))
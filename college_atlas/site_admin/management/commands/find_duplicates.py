@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from site_admin.duplicates import SCORE_THRESHOLD, find_duplicates, save_candidates
+
+
+class Command(BaseCommand):
+    help = 'Finds likely duplicate colleges and queues them for review in the admin'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=SCORE_THRESHOLD,
+            help=f'Minimum pair score between 0 and 1 (default {SCORE_THRESHOLD})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print the pairs instead of saving them for review',
+        )
+
+    def handle(self, *args, **options):
+        pairs = find_duplicates(
+            threshold=options['threshold'],
+            progress=lambda done, total: self.stdout.write(f'  Scored {done} of {total} candidate pairs'),
+        )
+
+        if options['dry_run']:
+            for pair in pairs:
+                self.stdout.write(f'{pair.score:.2f}  {pair.college_id} ~ {pair.other_id}  ({pair.reasons})')
+            self.stdout.write(self.style.SUCCESS(f'Found {len(pairs)} likely duplicate pairs'))
+            return
+
+        open_count = save_candidates(pairs)
+        self.stdout.write(self.style.SUCCESS(
+            f'Found {len(pairs)} likely duplicate pairs; {open_count} open for review'
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from site_admin.models import College
+from site_admin.images import generate_image_derivatives
+
+
+class Command(BaseCommand):
+    help = 'Generates thumbnail and WebP derivatives for uploaded college images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild derivatives even for colleges that already have them',
+        )
+
+    def handle(self, *args, **options):
+        colleges = College.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['force']:
+            colleges = colleges.filter(image_variants={})
+
+        college_ids = list(colleges.values_list('id', flat=True))
+        self.stdout.write(f'Generating derivatives for {len(college_ids)} colleges...')
+
+        failed = 0
+        for college_id in college_ids:
+            try:
+                generate_image_derivatives(college_id, force=options['force'])
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'  College {college_id}: {str(e)}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {len(college_ids) - failed} processed, {failed} failed'
+        ))
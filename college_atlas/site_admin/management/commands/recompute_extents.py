@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from site_admin.extents import recompute
+from site_admin.models import Country, District, State
+from site_admin.versioning import bump_dataset_version
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored centroids and bounding boxes of every district, state and country'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        recompute()
+        bump_dataset_version()
+        located = District.objects.filter(located_colleges__gt=0).count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed {District.objects.count()} districts ({located} with located colleges), '
+            f'{State.objects.count()} states and {Country.objects.count()} countries '
+            f'in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,73 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from site_admin.task_queue import discover_tasks, requeue_stale_tasks, run_pending, worker_id
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background tasks (thumbnails, imports, cache warming)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queues',
+            help='Comma separated queues to take tasks from (default: all)',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=1,
+            help='Number of tasks to run in parallel in this process',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once no tasks are runnable instead of polling',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.TASK_POLL_INTERVAL,
+            help='Seconds to sleep between polls when the queue is empty',
+        )
+
+    def handle(self, *args, **options):
+        queues = [queue.strip() for queue in options['queues'].split(',')] if options['queues'] else None
+        registry = discover_tasks()
+        self.stdout.write(f"Worker {worker_id()} running {len(registry)} task types on {', '.join(queues or ['all queues'])}")
+
+        self.stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *args: self.stopping.set())
+
+        threads = [
+            threading.Thread(target=self.work, args=(f'{worker_id()}:{index}', queues, options), daemon=True)
+            for index in range(max(options['threads'], 1))
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stopping.set()
+            self.stdout.write('Stopping after running tasks finish...')
+            for thread in threads:
+                thread.join()
+
+    def work(self, worker, queues, options):
+        while not self.stopping.is_set():
+            try:
+                requeue_stale_tasks()
+                processed = run_pending(worker, queues, limit=1)
+            except Exception as e:
+                self.stderr.write(f'Worker error: {str(e)}')
+                processed = 0
+            finally:
+                close_old_connections()
+            if not processed:
+                if options['once']:
+                    return
+                self.stopping.wait(options['poll_interval'])
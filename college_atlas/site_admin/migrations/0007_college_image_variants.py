@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_admin', '0006_alter_college_image_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='college',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized derivatives of the uploaded image, by variant and format'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:32
+
+from django.db import migrations, models
+
+# Older and local names of places that show up in searches
+ALIASES = (
+    ('Trichy', 'Tiruchirappalli'),
+    ('Tiruchy', 'Tiruchirappalli'),
+    ('Kovai', 'Coimbatore'),
+    ('Madras', 'Chennai'),
+    ('Tanjore', 'Thanjavur'),
+    ('Tuticorin', 'Thoothukudi'),
+    ('Nellai', 'Tirunelveli'),
+    ('Pondicherry', 'Puducherry'),
+    ('Pondy', 'Puducherry'),
+    ('Bombay', 'Mumbai'),
+    ('Calcutta', 'Kolkata'),
+    ('Bangalore', 'Bengaluru'),
+    ('Mysore', 'Mysuru'),
+    ('Mangalore', 'Mangaluru'),
+    ('Cochin', 'Kochi'),
+    ('Calicut', 'Kozhikode'),
+    ('Trivandrum', 'Thiruvananthapuram'),
+    ('Vizag', 'Visakhapatnam'),
+    ('Poona', 'Pune'),
+    ('Baroda', 'Vadodara'),
+    ('Gurgaon', 'Gurugram'),
+    ('Benares', 'Varanasi'),
+    ('Orissa', 'Odisha'),
+)
+
+
+def seed_aliases(apps, schema_editor):
+    SearchAlias = apps.get_model('site_admin', 'SearchAlias')
+    SearchAlias.objects.bulk_create(
+        [SearchAlias(alias=alias, canonical=canonical) for alias, canonical in ALIASES],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_admin', '0009_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('alias', models.CharField(help_text='e.g. Trichy', max_length=100, unique=True)),
+                ('canonical', models.CharField(help_text='Name as used in the data, e.g. Tiruchirappalli', max_length=100)),
+            ],
+            options={
+                'verbose_name_plural': 'Search aliases',
+                'ordering': ['alias'],
+            },
+        ),
+        migrations.RunPython(seed_aliases, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:32
+
+from django.db import migrations
+
+# GIN trigram indexes behind the fuzzy search; other databases use the
+# in-process trigram index in public/search.py instead
+TRIGRAM_INDEXES = (
+    ('site_admin_college_name_trgm', 'site_admin_college'),
+    ('site_admin_district_name_trgm', 'site_admin_district'),
+    ('site_admin_state_name_trgm', 'site_admin_state'),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (name gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_admin', '0010_searchalias'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
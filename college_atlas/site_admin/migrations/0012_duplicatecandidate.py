@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_admin', '0011_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('score', models.FloatField()),
+                ('name_similarity', models.FloatField()),
+                ('distance_km', models.FloatField(blank=True, null=True)),
+                ('reasons', models.CharField(blank=True, help_text='What the pair had in common, e.g. geohash, pincode', max_length=100)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('dismissed', 'Not a duplicate')], default='open', max_length=10)),
+                ('college', models.ForeignKey(help_text="The pair's lower id", on_delete=django.db.models.deletion.CASCADE, related_name='+', to='site_admin.college')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='site_admin.college')),
+            ],
+            options={
+                'ordering': ['-score', 'id'],
+                'unique_together': {('college', 'other')},
+            },
+        ),
+    ]
@@ -0,0 +1,130 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:45
+
+from django.db import migrations, models
+
+
+def populate_extents(apps, schema_editor):
+    from site_admin.extents import recompute
+
+    recompute(models=(
+        apps.get_model('site_admin', 'College'),
+        apps.get_model('site_admin', 'District'),
+        apps.get_model('site_admin', 'State'),
+        apps.get_model('site_admin', 'Country'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_admin', '0012_duplicatecandidate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='country',
+            name='centroid_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='centroid_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='located_colleges',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Colleges with coordinates'),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='max_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='max_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='min_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='min_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='district',
+            name='centroid_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='district',
+            name='centroid_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='district',
+            name='located_colleges',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Colleges with coordinates'),
+        ),
+        migrations.AddField(
+            model_name='district',
+            name='max_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='district',
+            name='max_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='district',
+            name='min_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='district',
+            name='min_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='centroid_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='centroid_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='located_colleges',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Colleges with coordinates'),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='max_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='max_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='min_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='min_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_extents, migrations.RunPython.noop),
+    ]
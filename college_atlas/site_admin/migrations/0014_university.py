@@ -0,0 +1,143 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+# Universities created and colleges relinked per step
+BATCH_SIZE = 500
+
+# Frozen copies of site_admin.duplicates' normalization, as it stood when this
+# migration was written, so later changes there cannot change what it does
+ABBREVIATIONS = {
+    'govt': 'government',
+    'gov': 'government',
+    'engg': 'engineering',
+    'inst': 'institute',
+    'instt': 'institute',
+    'tech': 'technology',
+    'coll': 'college',
+    'clg': 'college',
+    'univ': 'university',
+    'sci': 'science',
+    'mgmt': 'management',
+    'mgt': 'management',
+    'poly': 'polytechnic',
+    'pharm': 'pharmacy',
+    'edu': 'education',
+    'natl': 'national',
+    'st': 'saint',
+    'shri': 'sri',
+    'shree': 'sri',
+}
+STOPWORDS = {'of', 'and', 'the', 'for', 'in', 'at'}
+
+
+def normalize_name(name):
+    text = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode().lower()
+    text = text.replace('&', ' and ')
+    tokens = []
+    initials = ''
+    for word in re.findall(r'[a-z0-9]+', text):
+        if len(word) == 1 and word.isalpha():
+            initials += word
+            continue
+        if initials:
+            tokens.append(initials)
+            initials = ''
+        word = ABBREVIATIONS.get(word, word)
+        if word not in STOPWORDS:
+            tokens.append(word)
+    if initials:
+        tokens.append(initials)
+    return ' '.join(tokens)
+
+
+def university_key(name):
+    key = normalize_name(name)
+    if not key:
+        key = ' '.join((name or '').casefold().split())
+    return key[:500]
+
+
+def link_universities(apps, schema_editor):
+    """
+    One University per normalized name, named after its most common
+    spelling, and every college pointed at its university's row
+    """
+    College = apps.get_model('site_admin', 'College')
+    University = apps.get_model('site_admin', 'University')
+
+    variants = defaultdict(Counter)
+    names = (
+        College.objects.exclude(university__isnull=True).exclude(university='')
+        .values('university').annotate(colleges=Count('id')).order_by()
+    )
+    for row in names.iterator(chunk_size=2000):
+        key = university_key(' '.join(row['university'].split()))
+        if key:
+            variants[key][row['university']] += row['colleges']
+
+    keys = sorted(variants)
+    for start in range(0, len(keys), BATCH_SIZE):
+        batch = keys[start:start + BATCH_SIZE]
+        University.objects.bulk_create([
+            University(key=key, name=' '.join(variants[key].most_common(1)[0][0].split()))
+            for key in batch
+        ])
+        ids = dict(University.objects.filter(key__in=batch).values_list('key', 'id'))
+        for key in batch:
+            College.objects.filter(university__in=list(variants[key])).update(university_ref_id=ids[key])
+
+
+def unlink_universities(apps, schema_editor):
+    College = apps.get_model('site_admin', 'College')
+    University = apps.get_model('site_admin', 'University')
+    for pk, name in University.objects.values_list('id', 'name').iterator(chunk_size=BATCH_SIZE):
+        College.objects.filter(university_ref_id=pk).update(university=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_admin', '0013_geo_extents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='University',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('name', models.CharField(max_length=500)),
+                ('key', models.CharField(editable=False, help_text='Normalized name that spelling variants share, see site_admin.universities', max_length=500, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Universities',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='college',
+            name='university_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='site_admin.university'),
+        ),
+        migrations.RunPython(link_universities, unlink_universities),
+        migrations.RemoveField(
+            model_name='college',
+            name='university',
+        ),
+        migrations.RenameField(
+            model_name='college',
+            old_name='university_ref',
+            new_name='university',
+        ),
+        migrations.AlterField(
+            model_name='college',
+            name='university',
+            field=models.ForeignKey(blank=True, help_text='Affiliated university', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='colleges', to='site_admin.university'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:07
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def drop_duplicate_queued_tasks(apps, schema_editor):
+    """Keeps the oldest queued task per dedupe key; the others repeat its work"""
+    Task = apps.get_model('site_admin', 'Task')
+    duplicated = (
+        Task.objects.filter(status='queued').exclude(dedupe_key=None)
+        .values('dedupe_key').annotate(total=Count('id'), first=Min('id')).filter(total__gt=1)
+    )
+    for row in duplicated:
+        Task.objects.filter(status='queued', dedupe_key=row['dedupe_key']).exclude(pk=row['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_admin', '0014_university'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_queued_tasks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'queued')), fields=('dedupe_key',), name='task_queued_dedupe_key'),
+        ),
+    ]
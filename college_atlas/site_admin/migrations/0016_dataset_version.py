@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:09
+
+from django.core.cache import cache
+from django.db import migrations, models
+
+
+def seed_version(apps, schema_editor):
+    """
+    Continues from the counter previously kept in the cache, so that cached
+    entries built under earlier versions are not mistaken for current ones
+    """
+    DatasetVersion = apps.get_model('site_admin', 'DatasetVersion')
+    try:
+        previous = int(cache.get('atlas:dataset-version') or 0)
+    except Exception:
+        previous = 0
+    DatasetVersion.objects.create(pk=1, version=previous + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_admin', '0015_task_queued_dedupe_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(seed_version, migrations.RunPython.noop),
+    ]
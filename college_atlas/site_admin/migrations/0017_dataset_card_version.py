@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('site_admin', '0016_dataset_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasetversion',
+            name='card_version',
+            field=models.PositiveBigIntegerField(default=1, help_text='Bumped when degree, district or state names or degree assignments change'),
+        ),
+    ]
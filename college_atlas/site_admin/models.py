@@ -1,15 +1,42 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 
 
 class TimeStampedModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    # Indexed for the /api/changes/ feed, which pages through rows by it
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        abstract = True
+
+class GeoExtent(models.Model):
+    """
+    Centroid and bounding box of the colleges with coordinates in a region.
+    Kept up to date by site_admin.extents, so that zooming a map to a region
+    is a row lookup rather than an aggregate over its colleges.
+    """
+    located_colleges = models.PositiveIntegerField(default=0, editable=False, help_text="Colleges with coordinates")
+    centroid_latitude = models.FloatField(blank=True, null=True, editable=False)
+    centroid_longitude = models.FloatField(blank=True, null=True, editable=False)
+    min_latitude = models.FloatField(blank=True, null=True, editable=False)
+    max_latitude = models.FloatField(blank=True, null=True, editable=False)
+    min_longitude = models.FloatField(blank=True, null=True, editable=False)
+    max_longitude = models.FloatField(blank=True, null=True, editable=False)
 
     class Meta:
         abstract = True
 
-class Country(TimeStampedModel):
+    @property
+    def bbox(self):
+        """``[[south, west], [north, east]]`` as Leaflet takes it, or None"""
+        if not self.located_colleges:
+            return None
+        return [[self.min_latitude, self.min_longitude], [self.max_latitude, self.max_longitude]]
+
+class Country(TimeStampedModel, GeoExtent):
     name = models.CharField(max_length=100, unique=True) 
 
     class Meta:
@@ -19,7 +46,7 @@ class Country(TimeStampedModel):
     def __str__(self):
         return self.name
 
-class State(TimeStampedModel):
+class State(TimeStampedModel, GeoExtent):
     name = models.CharField(max_length=100)
     country = models.ForeignKey(Country, on_delete=models.PROTECT, related_name='states')
 
@@ -30,7 +57,7 @@ class State(TimeStampedModel):
     def __str__(self):
         return f"{self.name}"
 
-class District(TimeStampedModel):
+class District(TimeStampedModel, GeoExtent):
     name = models.CharField(max_length=100)
     state = models.ForeignKey(State, on_delete=models.PROTECT, related_name='districts')
 
@@ -52,6 +79,32 @@ class Degree(TimeStampedModel):
     def __str__(self):
         return self.name
 
+class University(TimeStampedModel):
+    """A university colleges are affiliated to, one row per distinct name"""
+    name = models.CharField(max_length=500)
+    key = models.CharField(
+        max_length=500, unique=True, editable=False,
+        help_text="Normalized name that spelling variants share, see site_admin.universities",
+    )
+
+    class Meta:
+        verbose_name_plural = "Universities"
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        from .universities import university_key
+        if University.objects.filter(key=university_key(self.name)).exclude(pk=self.pk).exists():
+            raise ValidationError({'name': 'Another university already has this name, spelled differently'})
+
+    def save(self, *args, **kwargs):
+        # Imported here: universities.py imports this module
+        from .universities import university_key
+        self.key = university_key(self.name)
+        super().save(*args, **kwargs)
+
 class College(TimeStampedModel):
     COLLEGE_TYPES = (
         ('eng', 'Engineering'),
@@ -61,7 +114,10 @@ class College(TimeStampedModel):
     )
 
     name = models.CharField(max_length=500)
-    university = models.CharField(max_length=500, blank=True, null=True, help_text="Name of affiliated university")
+    university = models.ForeignKey(
+        University, on_delete=models.SET_NULL, blank=True, null=True, related_name='colleges',
+        help_text="Affiliated university",
+    )
     college_type = models.CharField(max_length=10, choices=COLLEGE_TYPES, default=COLLEGE_TYPES[0][0])
     
     district = models.ForeignKey(District, on_delete=models.PROTECT, related_name='colleges')
@@ -91,6 +147,7 @@ class College(TimeStampedModel):
 
     image = models.ImageField(upload_to='college_images', blank=True, null=True)
     image_url = models.URLField(max_length=500, blank=True, null=True, help_text="External image URL (used if image is not uploaded)")
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized derivatives of the uploaded image, by variant and format")
 
     class Meta:
         verbose_name_plural = "Colleges"
@@ -98,4 +155,147 @@ class College(TimeStampedModel):
         unique_together = ('name', 'district') 
 
     def __str__(self):
-        return f"{self.name} ({self.district.name})"
\ No newline at end of file
+        return f"{self.name} ({self.district.name})"
+
+    def get_image_variant_url(self, variant, fmt='jpeg'):
+        """URL of a generated derivative, or None until it has been built"""
+        name = (self.image_variants or {}).get(variant, {}).get(fmt)
+        if not name:
+            return None
+        return self.image.storage.url(name)
+
+    def get_image_srcset(self, fmt='jpeg'):
+        """srcset attribute value covering every derivative width"""
+        entries = sorted((self.image_variants or {}).values(), key=lambda entry: entry['width'])
+        return ', '.join(
+            f"{self.image.storage.url(entry[fmt])} {entry['width']}w"
+            for entry in entries if entry.get(fmt)
+        )
+
+
+class SearchAlias(TimeStampedModel):
+    """
+    Another name for a place or college that public search should treat as
+    a synonym, e.g. Trichy for Tiruchirappalli. Works in both directions.
+    """
+    alias = models.CharField(max_length=100, unique=True, help_text="e.g. Trichy")
+    canonical = models.CharField(max_length=100, help_text="Name as used in the data, e.g. Tiruchirappalli")
+
+    class Meta:
+        verbose_name_plural = "Search aliases"
+        ordering = ['alias']
+
+    def __str__(self):
+        return f"{self.alias} → {self.canonical}"
+
+
+class DuplicateCandidate(TimeStampedModel):
+    """
+    Two colleges that ``find_duplicates`` scored as probably the same one,
+    waiting for an admin to merge them or dismiss the pair
+    """
+    STATUS_OPEN = 'open'
+    STATUS_DISMISSED = 'dismissed'
+    STATUSES = (
+        (STATUS_OPEN, 'Open'),
+        (STATUS_DISMISSED, 'Not a duplicate'),
+    )
+
+    college = models.ForeignKey(College, on_delete=models.CASCADE, related_name='+', help_text="The pair's lower id")
+    other = models.ForeignKey(College, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    name_similarity = models.FloatField()
+    distance_km = models.FloatField(blank=True, null=True)
+    reasons = models.CharField(max_length=100, blank=True, help_text="What the pair had in common, e.g. geohash, pincode")
+    status = models.CharField(max_length=10, choices=STATUSES, default=STATUS_OPEN)
+
+    class Meta:
+        ordering = ['-score', 'id']
+        unique_together = ('college', 'other')
+
+    def __str__(self):
+        return f"{self.college_id} ~ {self.other_id} ({self.score:.2f})"
+
+
+class DatasetVersion(models.Model):
+    """
+    The single row holding the dataset and card versions (see
+    site_admin.versioning). It lives in the database so that every process
+    sees the same counters, whatever the cache backend.
+    """
+    version = models.PositiveBigIntegerField(default=1)
+    card_version = models.PositiveBigIntegerField(
+        default=1, help_text="Bumped when degree, district or state names or degree assignments change",
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Dataset version {self.version}"
+
+
+class Tombstone(models.Model):
+    """Records a deleted row so that the change feed can report the deletion"""
+    model = models.CharField(max_length=20, help_text="Change feed type, e.g. college")
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['deleted_at', 'id']
+
+    def __str__(self):
+        return f"{self.model} #{self.object_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
+
+
+class Task(TimeStampedModel):
+    """A unit of background work, run by the ``run_worker`` command"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUSES = (
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    name = models.CharField(max_length=100, help_text="Registered task name, e.g. images.generate_derivatives")
+    queue = models.CharField(max_length=50, default='default')
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=STATUS_QUEUED)
+    priority = models.SmallIntegerField(default=0, help_text="Higher runs first")
+    dedupe_key = models.CharField(max_length=200, blank=True, null=True, help_text="Only one queued task per key")
+
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, null=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    progress = models.PositiveIntegerField(default=0)
+    progress_total = models.PositiveIntegerField(default=0)
+    message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'queue', '-priority', 'run_after'], name='task_claim_idx'),
+            models.Index(fields=['dedupe_key', 'status'], name='task_dedupe_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedupe_key'], condition=models.Q(status='queued'), name='task_queued_dedupe_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    @property
+    def progress_percent(self):
+        if not self.progress_total:
+            return 100 if self.status == self.STATUS_DONE else 0
+        return min(100, int(self.progress * 100 / self.progress_total))
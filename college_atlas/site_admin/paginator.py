@@ -0,0 +1,109 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Paginator
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+
+from .versioning import get_dataset_version
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that avoids an exact COUNT(*) over large filtered querysets.
+
+    Result sets with at most ``exact_threshold`` rows are counted exactly with
+    a bounded LIMIT probe. Larger ones use the Postgres planner estimate
+    (``reltuples`` for unfiltered tables, ``EXPLAIN`` rows otherwise) or, on
+    other backends, an exact count cached per query and dataset version.
+    ``is_estimated`` tells templates to render "about N results".
+    """
+
+    def __init__(self, object_list, per_page, exact_threshold=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if exact_threshold is None:
+            exact_threshold = settings.PAGINATOR_EXACT_COUNT_THRESHOLD
+        self.exact_threshold = exact_threshold
+        self.is_estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+
+        probe = queryset.order_by().values_list('pk', flat=True)[:self.exact_threshold + 1]
+        probed = len(probe)
+        if probed <= self.exact_threshold:
+            return probed
+
+        estimate = None
+        if connections[queryset.db].vendor == 'postgresql':
+            estimate = self._planner_estimate(queryset)
+        if estimate is None:
+            estimate = self._cached_count(queryset)
+        else:
+            self.is_estimated = True
+        return max(estimate, probed)
+
+    def get_page(self, number):
+        try:
+            return super().get_page(number)
+        except EmptyPage:
+            # Raised by page() once the estimate turned out too high
+            return self.page(self.num_pages)
+
+    def page(self, number):
+        page = super().page(number)
+        if not self.is_estimated:
+            return page
+        rows = len(page.object_list)
+        if not rows and page.number > 1:
+            # An overestimate: the page is past the real end, which only an
+            # exact count can place.
+            self._settle_count(self._cached_count(self.object_list))
+            raise EmptyPage(self.error_messages['no_results'])
+        if rows < self.per_page:
+            # A short page pins down the real total, so the last page never
+            # links to pages that only exist in the estimate.
+            self._settle_count((page.number - 1) * self.per_page + rows)
+        return page
+
+    def _settle_count(self, count):
+        self.__dict__['count'] = count
+        self.__dict__.pop('num_pages', None)
+        self.is_estimated = False
+
+    def _planner_estimate(self, queryset):
+        connection = connections[queryset.db]
+        try:
+            if not queryset.query.where:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                        [queryset.model._meta.db_table],
+                    )
+                    row = cursor.fetchone()
+                if row and row[0] > 0:
+                    return int(row[0])
+            plan = json.loads(queryset.order_by().explain(format='json'))
+            return int(plan[0]['Plan']['Plan Rows'])
+        except (EmptyResultSet, ValueError, KeyError, IndexError, TypeError):
+            return None
+
+    def _cached_count(self, queryset):
+        try:
+            sql = str(queryset.order_by().query)
+        except EmptyResultSet:
+            return 0
+        digest = hashlib.md5(sql.encode('utf-8')).hexdigest()
+        key = f'paginator-count:{get_dataset_version()}:{digest}'
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.PAGINATOR_COUNT_CACHE_TIMEOUT)
+        return count
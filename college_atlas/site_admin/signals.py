@@ -0,0 +1,124 @@
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from .changes import FEED_TYPE_BY_MODEL
+from .extents import recompute, update_extents
+from .models import College, Degree, State, District, Country, SearchAlias, Tombstone, University
+from .versioning import bump_dataset_version
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_save, sender=State)
+@receiver(post_save, sender=District)
+@receiver(post_save, sender=Degree)
+@receiver(post_save, sender=University)
+@receiver(post_save, sender=College)
+@receiver(post_save, sender=SearchAlias)
+@receiver(post_delete, sender=Country)
+@receiver(post_delete, sender=State)
+@receiver(post_delete, sender=District)
+@receiver(post_delete, sender=Degree)
+@receiver(post_delete, sender=University)
+@receiver(post_delete, sender=College)
+@receiver(post_delete, sender=SearchAlias)
+def dataset_changed(sender, **kwargs):
+    """Invalidate cached counts and other derived data on any write"""
+    bump_dataset_version()
+
+
+@receiver(post_delete, sender=Country)
+@receiver(post_delete, sender=State)
+@receiver(post_delete, sender=District)
+@receiver(post_delete, sender=Degree)
+@receiver(post_delete, sender=University)
+@receiver(post_delete, sender=College)
+def record_tombstone(sender, instance, **kwargs):
+    """Deleted rows have no updated_at left; the change feed reads these instead"""
+    Tombstone.objects.create(model=FEED_TYPE_BY_MODEL[sender], object_id=instance.pk)
+
+
+@receiver(m2m_changed, sender=College.degrees.through)
+def college_degrees_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Degree assignments change result sets for degree filters, and are part
+    of the college in the change feed, so they touch College.updated_at
+    """
+    if action == 'pre_clear' and reverse:
+        # The cleared colleges are gone by post_clear
+        instance._cleared_college_ids = list(instance.colleges.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        college_ids = [instance.pk]
+    elif action == 'post_clear':
+        college_ids = getattr(instance, '_cleared_college_ids', [])
+    else:
+        college_ids = pk_set or []
+    College.objects.filter(pk__in=college_ids).update(updated_at=timezone.now())
+    bump_dataset_version()
+
+
+@receiver(pre_delete, sender=Degree)
+def degree_deleting(sender, instance, **kwargs):
+    """Deleting a degree silently removes it from colleges; report them as changed"""
+    College.objects.filter(degrees=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=University)
+def university_renamed(sender, instance, created, **kwargs):
+    """Cached cards and the change feed show the name on the college"""
+    if not created:
+        College.objects.filter(university=instance).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=University)
+def university_deleting(sender, instance, **kwargs):
+    """Deleting a university unlinks its colleges; report them as changed"""
+    College.objects.filter(university=instance).update(updated_at=timezone.now())
+
+
+def _located(district_id, latitude, longitude):
+    return (district_id, latitude is not None and longitude is not None and (latitude, longitude))
+
+
+@receiver(pre_save, sender=College)
+def college_saving(sender, instance, **kwargs):
+    """Remember where the college was, so that post_save knows which extents moved"""
+    instance._previous_location = None
+    if instance.pk:
+        previous = College.objects.filter(pk=instance.pk).values_list('district_id', 'latitude', 'longitude').first()
+        if previous:
+            instance._previous_location = _located(*previous)
+
+
+@receiver(post_save, sender=College)
+def college_extents_changed(sender, instance, created, **kwargs):
+    """Refresh the extents of the districts a college left or joined"""
+    previous = getattr(instance, '_previous_location', None)
+    current = _located(instance.district_id, instance.latitude, instance.longitude)
+    if created or previous != current:
+        update_extents([instance.district_id, previous and previous[0]])
+
+
+@receiver(post_delete, sender=College)
+def college_extents_deleted(sender, instance, **kwargs):
+    update_extents([instance.district_id])
+
+
+@receiver(pre_save, sender=State)
+@receiver(pre_save, sender=District)
+def region_saving(sender, instance, **kwargs):
+    """Moving a district to another state (or state to another country) moves its colleges"""
+    parent = 'state_id' if sender is District else 'country_id'
+    instance._parent_changed = bool(instance.pk) and sender.objects.filter(pk=instance.pk).exclude(
+        **{parent: getattr(instance, parent)}
+    ).exists()
+
+
+@receiver(post_save, sender=State)
+@receiver(post_save, sender=District)
+def region_extents_changed(sender, instance, **kwargs):
+    if getattr(instance, '_parent_changed', False):
+        # Rare enough that a full recompute, one aggregate query, is fine
+        recompute()
+        bump_dataset_version()
@@ -0,0 +1,216 @@
+/*
+ * Searchable select backed by a paginated JSON endpoint.
+ *
+ * Enhances any <select data-autocomplete-url="..."> on the page. The select
+ * stays in the form as the submitted field and only ever holds the chosen
+ * options; matches are fetched on demand as { results: [{id, text, group}],
+ * has_more } so pages no longer render every district or degree up front.
+ */
+(function () {
+    const DEBOUNCE_MS = 250;
+
+    function AutocompleteSelect(select) {
+        this.select = select;
+        this.url = select.dataset.autocompleteUrl;
+        this.multiple = select.multiple;
+        this.required = select.required;
+        this.query = '';
+        this.page = 1;
+        this.hasMore = false;
+        this.requestId = 0;
+        this.build();
+        this.renderSelection();
+    }
+
+    AutocompleteSelect.prototype.build = function () {
+        const select = this.select;
+        select.required = false;
+        select.style.display = 'none';
+
+        this.wrapper = document.createElement('div');
+        this.wrapper.className = 'relative';
+        select.parentNode.insertBefore(this.wrapper, select.nextSibling);
+
+        this.chips = document.createElement('div');
+        this.chips.className = 'flex flex-wrap gap-1.5 mb-1.5';
+        if (this.multiple) {
+            this.wrapper.appendChild(this.chips);
+        }
+
+        this.input = document.createElement('input');
+        this.input.type = 'text';
+        this.input.autocomplete = 'off';
+        this.input.className = select.className;
+        this.input.placeholder = select.dataset.placeholder || 'Type to search...';
+        this.wrapper.appendChild(this.input);
+
+        this.list = document.createElement('ul');
+        this.list.className = 'absolute z-40 mt-1 w-full max-h-64 overflow-y-auto bg-white border border-slate-200 rounded-lg shadow-lg text-sm hidden';
+        this.wrapper.appendChild(this.list);
+
+        let timer;
+        this.input.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => this.search(this.input.value.trim()), DEBOUNCE_MS);
+        });
+        this.input.addEventListener('focus', () => {
+            if (!this.multiple) {
+                this.input.select();
+            }
+            this.search(this.multiple ? this.input.value.trim() : '');
+        });
+        this.input.addEventListener('keydown', (event) => {
+            if (event.key === 'Escape') {
+                this.close();
+            } else if (event.key === 'Enter') {
+                // Keep Enter from submitting the surrounding form mid-search
+                event.preventDefault();
+                const first = this.list.querySelector('li[data-id]');
+                if (first) {
+                    first.click();
+                }
+            }
+        });
+        this.list.addEventListener('scroll', () => {
+            const nearBottom = this.list.scrollTop + this.list.clientHeight >= this.list.scrollHeight - 24;
+            if (nearBottom && this.hasMore) {
+                this.fetchPage(this.page + 1);
+            }
+        });
+        document.addEventListener('click', (event) => {
+            if (!this.wrapper.contains(event.target)) {
+                this.close();
+                this.renderSelection();
+            }
+        });
+    };
+
+    AutocompleteSelect.prototype.search = function (query) {
+        this.query = query;
+        this.list.innerHTML = '';
+        this.fetchPage(1);
+    };
+
+    AutocompleteSelect.prototype.fetchPage = function (page) {
+        const params = new URLSearchParams({ q: this.query, page: page });
+        const requestId = ++this.requestId;
+        this.hasMore = false;
+
+        fetch(`${this.url}?${params.toString()}`, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+            .then(response => response.json())
+            .then(data => {
+                if (requestId !== this.requestId) {
+                    return; // A newer search superseded this one
+                }
+                this.page = page;
+                this.hasMore = data.has_more;
+                this.renderResults(data.results, page === 1);
+            })
+            .catch(error => console.error('Error loading options:', error));
+    };
+
+    AutocompleteSelect.prototype.renderResults = function (results, reset) {
+        if (reset) {
+            this.list.innerHTML = '';
+            this.lastGroup = null;
+        }
+        if (reset && this.select.dataset.emptyLabel && !this.query) {
+            const clear = document.createElement('li');
+            clear.textContent = this.select.dataset.emptyLabel;
+            clear.className = 'px-3 py-2 cursor-pointer text-slate-500 hover:bg-slate-100';
+            clear.addEventListener('click', () => this.clear());
+            this.list.appendChild(clear);
+        }
+        if (reset && results.length === 0) {
+            this.list.insertAdjacentHTML('beforeend', '<li class="px-3 py-2 text-slate-400">No matches found</li>');
+        }
+        results.forEach(result => {
+            if (result.group && result.group !== this.lastGroup) {
+                const header = document.createElement('li');
+                header.className = 'px-3 pt-2 pb-1 text-[10px] font-bold uppercase tracking-wider text-slate-400';
+                header.textContent = result.group;
+                this.list.appendChild(header);
+                this.lastGroup = result.group;
+            }
+            const item = document.createElement('li');
+            item.dataset.id = result.id;
+            item.textContent = result.text;
+            item.className = 'px-3 py-2 cursor-pointer hover:bg-slate-100';
+            if (this.isSelected(result.id)) {
+                item.className += ' font-semibold text-primary';
+            }
+            item.addEventListener('click', () => this.choose(result));
+            this.list.appendChild(item);
+        });
+        this.list.classList.remove('hidden');
+    };
+
+    AutocompleteSelect.prototype.isSelected = function (id) {
+        return Array.from(this.select.selectedOptions).some(option => option.value === String(id));
+    };
+
+    AutocompleteSelect.prototype.choose = function (result) {
+        const label = result.group ? `${result.text}, ${result.group}` : result.text;
+        if (!this.multiple) {
+            this.select.innerHTML = '';
+        }
+        if (!this.isSelected(result.id)) {
+            this.select.appendChild(new Option(label, result.id, true, true));
+        }
+        this.close();
+        this.input.value = '';
+        this.renderSelection();
+        this.select.dispatchEvent(new Event('change', { bubbles: true }));
+    };
+
+    AutocompleteSelect.prototype.clear = function () {
+        this.select.innerHTML = '';
+        this.select.appendChild(new Option('', '', true, true));
+        this.close();
+        this.renderSelection();
+        this.select.dispatchEvent(new Event('change', { bubbles: true }));
+    };
+
+    AutocompleteSelect.prototype.remove = function (value) {
+        Array.from(this.select.options)
+            .filter(option => option.value === value)
+            .forEach(option => option.remove());
+        this.renderSelection();
+        this.select.dispatchEvent(new Event('change', { bubbles: true }));
+    };
+
+    AutocompleteSelect.prototype.renderSelection = function () {
+        const selected = Array.from(this.select.selectedOptions).filter(option => option.value);
+        this.input.required = this.required && selected.length === 0;
+
+        if (!this.multiple) {
+            this.input.value = selected.length ? selected[0].textContent.trim() : '';
+            this.input.placeholder = this.select.dataset.emptyLabel || this.input.placeholder;
+            return;
+        }
+
+        this.chips.innerHTML = '';
+        selected.forEach(option => {
+            const chip = document.createElement('span');
+            chip.className = 'inline-flex items-center gap-1 pl-2.5 pr-1 py-0.5 rounded-full bg-blue-50 text-blue-700 text-xs font-semibold';
+            chip.textContent = option.textContent.trim();
+            const button = document.createElement('button');
+            button.type = 'button';
+            button.className = 'material-symbols-outlined text-[14px] hover:text-red-600';
+            button.textContent = 'close';
+            button.addEventListener('click', () => this.remove(option.value));
+            chip.appendChild(button);
+            this.chips.appendChild(chip);
+        });
+    };
+
+    AutocompleteSelect.prototype.close = function () {
+        this.list.classList.add('hidden');
+    };
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-autocomplete-url]').forEach(select => {
+            new AutocompleteSelect(select);
+        });
+    });
+})();
@@ -0,0 +1,183 @@
+/*
+ * Row selection, bulk action bar and grid editing for the college dashboard.
+ *
+ * Grid cells remember their original value in data-original; only cells
+ * that differ are sent to the server as { changes: { id: { field: value } } },
+ * so saving a page of edits is one request and one bulk_update per field set.
+ */
+(function () {
+    function csrfToken() {
+        const input = document.querySelector('input[name=csrfmiddlewaretoken]');
+        return input ? input.value : '';
+    }
+
+    function setupSelection() {
+        const bar = document.getElementById('bulkActionBar');
+        if (!bar) {
+            return;
+        }
+        const rows = Array.from(document.querySelectorAll('.row-select'));
+        const selectPage = document.getElementById('selectPage');
+        const selectAll = document.getElementById('bulkSelectAll');
+        const count = document.getElementById('bulkCount');
+        const idsContainer = document.getElementById('bulkSelectedIds');
+        const scope = bar.querySelector('input[name=scope]');
+        const action = document.getElementById('bulkAction');
+        const total = bar.dataset.total;
+
+        function update() {
+            const selected = rows.filter(row => row.checked);
+            if (scope.value === 'filtered' && selected.length < rows.length) {
+                scope.value = 'selected';
+            }
+            idsContainer.innerHTML = '';
+            selected.forEach(row => {
+                const input = document.createElement('input');
+                input.type = 'hidden';
+                input.name = 'ids';
+                input.value = row.value;
+                idsContainer.appendChild(input);
+            });
+            count.textContent = scope.value === 'filtered' ? total : selected.length;
+            selectPage.checked = rows.length > 0 && selected.length === rows.length;
+            selectAll.classList.toggle('hidden', !selectPage.checked || scope.value === 'filtered' || Number(total) <= rows.length);
+            bar.classList.toggle('hidden', selected.length === 0);
+        }
+
+        function showValueInput() {
+            bar.querySelectorAll('[data-action-value]').forEach(container => {
+                const active = container.dataset.actionValue.split(' ').includes(action.value);
+                container.classList.toggle('hidden', !active);
+                container.querySelectorAll('select').forEach(select => {
+                    select.disabled = !active;
+                });
+            });
+        }
+
+        rows.forEach(row => row.addEventListener('change', update));
+        selectPage.addEventListener('change', () => {
+            rows.forEach(row => {
+                row.checked = selectPage.checked;
+            });
+            update();
+        });
+        selectAll.addEventListener('click', () => {
+            scope.value = 'filtered';
+            update();
+        });
+        document.getElementById('bulkClear').addEventListener('click', () => {
+            rows.forEach(row => {
+                row.checked = false;
+            });
+            scope.value = 'selected';
+            update();
+        });
+        action.addEventListener('change', showValueInput);
+        bar.addEventListener('submit', event => {
+            const label = action.options[action.selectedIndex].text;
+            if (!confirm(`${label} for ${count.textContent} college(s)?`)) {
+                event.preventDefault();
+            }
+        });
+
+        showValueInput();
+        update();
+    }
+
+    function setupGrid() {
+        const saveBar = document.getElementById('gridSaveBar');
+        if (!saveBar) {
+            return;
+        }
+        const cells = Array.from(document.querySelectorAll('.grid-cell'));
+        const changeCount = document.getElementById('gridChangeCount');
+        const errorText = document.getElementById('gridError');
+
+        function changedCells() {
+            return cells.filter(cell => cell.value.trim() !== cell.dataset.original);
+        }
+
+        function update() {
+            const changed = changedCells();
+            cells.forEach(cell => cell.classList.toggle('bg-amber-50', changed.includes(cell)));
+            changeCount.textContent = changed.length;
+            saveBar.classList.toggle('hidden', changed.length === 0);
+        }
+
+        function clearErrors() {
+            errorText.textContent = '';
+            cells.forEach(cell => {
+                cell.classList.remove('border-red-400', 'bg-red-50');
+                cell.removeAttribute('title');
+            });
+        }
+
+        cells.forEach(cell => cell.addEventListener('input', update));
+        cells.forEach(cell => cell.addEventListener('change', update));
+
+        document.getElementById('gridDiscard').addEventListener('click', () => {
+            cells.forEach(cell => {
+                cell.value = cell.dataset.original;
+            });
+            clearErrors();
+            update();
+        });
+
+        document.getElementById('gridSave').addEventListener('click', () => {
+            const changes = {};
+            changedCells().forEach(cell => {
+                const id = cell.closest('tr').dataset.collegeId;
+                changes[id] = changes[id] || {};
+                changes[id][cell.dataset.field] = cell.value.trim();
+            });
+            clearErrors();
+
+            fetch(saveBar.dataset.saveUrl, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json', 'X-CSRFToken': csrfToken() },
+                body: JSON.stringify({ changes: changes }),
+            })
+                .then(response => response.json())
+                .then(data => {
+                    if (data.error) {
+                        errorText.textContent = data.error;
+                        return;
+                    }
+                    const errors = Object.entries(data.errors || {});
+                    if (errors.length) {
+                        errors.forEach(([id, fields]) => {
+                            Object.entries(fields).forEach(([field, message]) => {
+                                const cell = document.querySelector(`tr[data-college-id="${id}"] [data-field="${field}"]`);
+                                if (cell) {
+                                    cell.classList.add('border-red-400', 'bg-red-50');
+                                    cell.title = message;
+                                }
+                            });
+                        });
+                        errorText.textContent = 'Fix the highlighted cells; nothing was saved';
+                        return;
+                    }
+                    cells.forEach(cell => {
+                        cell.value = cell.value.trim();
+                        cell.dataset.original = cell.value;
+                    });
+                    update();
+                })
+                .catch(() => {
+                    errorText.textContent = 'Could not save changes';
+                });
+        });
+
+        window.addEventListener('beforeunload', event => {
+            if (changedCells().length) {
+                event.preventDefault();
+                event.returnValue = '';
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        setupSelection();
+        setupGrid();
+    });
+})();
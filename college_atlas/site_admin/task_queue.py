@@ -0,0 +1,324 @@
+"""
+Lightweight background task queue stored in the application database.
+
+Tasks are plain functions registered with ``@task`` and enqueued as ``Task``
+rows; ``manage.py run_worker`` claims and runs them. Claiming is a
+compare-and-set UPDATE on the row, so any number of workers can share the
+queue on both SQLite and Postgres without extra infrastructure.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+_embedded_lock = threading.Lock()
+_embedded_thread = None
+_embedded_wakeup = threading.Event()
+
+
+class TaskContext:
+    """Handle passed to running tasks for reporting progress"""
+
+    def __init__(self, task):
+        self.task = task
+
+    def set_progress(self, done, total=None, message=None):
+        """Records progress; also the heartbeat that keeps the task from counting as stale"""
+        now = timezone.now()
+        fields = {'progress': done, 'updated_at': now, 'locked_at': now}
+        if total is not None:
+            fields['progress_total'] = total
+        if message is not None:
+            fields['message'] = message[:255]
+        Task.objects.filter(pk=self.task.pk).update(**fields)
+
+
+def task(name, queue='default', priority=0, max_attempts=3):
+    """
+    Registers a function as a background task. The function is called with a
+    TaskContext followed by the JSON kwargs it was enqueued with, and may
+    return a JSON-serializable result.
+    """
+    def decorator(func):
+        _registry[name] = {
+            'func': func,
+            'queue': queue,
+            'priority': priority,
+            'max_attempts': max_attempts,
+        }
+        func.task_name = name
+        return func
+    return decorator
+
+
+def discover_tasks():
+    """Imports every installed app's ``tasks`` module to fill the registry"""
+    autodiscover_modules('tasks')
+    return _registry
+
+
+def enqueue(name, priority=None, delay=None, dedupe_key=None, max_delay=None, **kwargs):
+    """
+    Queues a registered task. With ``dedupe_key`` an already queued task with
+    the same key is reused (and pushed back by ``delay``), which debounces
+    bursts of identical work such as cache rebuilds after bulk edits.
+    ``max_delay`` caps how far past its first enqueue a task is pushed back,
+    so that a steady stream of edits cannot postpone it forever.
+    """
+    discover_tasks()
+    options = _registry[name]
+    run_after = timezone.now() + (delay or timedelta(0))
+
+    if dedupe_key:
+        existing = Task.objects.filter(dedupe_key=dedupe_key, status=Task.STATUS_QUEUED).first()
+        if existing:
+            if delay:
+                if max_delay is not None:
+                    run_after = min(run_after, existing.created_at + max_delay)
+                Task.objects.filter(pk=existing.pk, run_after__lt=run_after).update(run_after=run_after)
+            return existing
+
+    try:
+        # A savepoint, so that losing a race on the dedupe constraint leaves
+        # the caller's transaction usable
+        with transaction.atomic():
+            task_obj = Task.objects.create(
+                name=name,
+                queue=options['queue'],
+                kwargs=kwargs,
+                priority=options['priority'] if priority is None else priority,
+                max_attempts=options['max_attempts'],
+                run_after=run_after,
+                dedupe_key=dedupe_key,
+            )
+    except IntegrityError:
+        existing = Task.objects.filter(dedupe_key=dedupe_key, status=Task.STATUS_QUEUED).first() if dedupe_key else None
+        if existing is None:
+            raise
+        return existing
+    if settings.TASK_QUEUE_EMBEDDED_WORKER:
+        # Delayed tasks too: the worker re-arms its timer for the new run_after
+        transaction.on_commit(_kick_embedded_worker)
+    return task_obj
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _requeue(task_id, **fields):
+    """
+    Puts a claimed task back in the queue. When an identical task (same
+    dedupe key) was queued meanwhile, that one does the work and this one is
+    marked failed instead. Returns whether the task was requeued.
+    """
+    try:
+        with transaction.atomic():
+            Task.objects.filter(pk=task_id).update(
+                status=Task.STATUS_QUEUED,
+                locked_by=None,
+                locked_at=None,
+                updated_at=timezone.now(),
+                **fields,
+            )
+        return True
+    except IntegrityError:
+        error = fields.get('error', '')
+        Task.objects.filter(pk=task_id).update(
+            status=Task.STATUS_FAILED,
+            finished_at=timezone.now(),
+            error=f"{error}\n\nSuperseded by a queued task with the same dedupe key".strip(),
+            updated_at=timezone.now(),
+        )
+        return False
+
+
+def requeue_stale_tasks():
+    """
+    Returns tasks whose worker died mid-run to the queue: running tasks that
+    have not reported progress (see TaskContext.set_progress) for
+    TASK_LOCK_TIMEOUT. Those that used up their attempts fail instead.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.TASK_LOCK_TIMEOUT)
+    stale = Task.objects.filter(status=Task.STATUS_RUNNING, locked_at__lt=cutoff)
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.STATUS_FAILED,
+        finished_at=timezone.now(),
+        error=f"Worker stopped reporting progress for {settings.TASK_LOCK_TIMEOUT} seconds",
+        updated_at=timezone.now(),
+    )
+    return sum(_requeue(task_id) for task_id in list(stale.values_list('id', flat=True)))
+
+
+def _queues_with_capacity(queues):
+    """Queues that are below their configured concurrency limit"""
+    limits = settings.TASK_QUEUE_CONCURRENCY
+    running = dict(
+        Task.objects.filter(status=Task.STATUS_RUNNING)
+        .values_list('queue')
+        .annotate(total=Count('id'))
+    )
+    candidates = queues or list(set(limits) | set(
+        Task.objects.filter(status=Task.STATUS_QUEUED).values_list('queue', flat=True).distinct()
+    ))
+    return [
+        queue for queue in candidates
+        if running.get(queue, 0) < limits.get(queue, limits.get('default', 1))
+    ]
+
+
+def claim_next(worker, queues=None):
+    """
+    Atomically claims the highest priority runnable task, or returns None.
+    Concurrency limits are checked before claiming, so they hold across all
+    workers up to the small window between the check and the claim.
+    """
+    available = _queues_with_capacity(queues)
+    if not available:
+        return None
+
+    candidates = (
+        Task.objects.filter(
+            status=Task.STATUS_QUEUED, run_after__lte=timezone.now(), queue__in=available,
+            attempts__lt=F('max_attempts'),
+        )
+        .order_by('-priority', 'run_after', 'id')
+        .values_list('id', flat=True)[:10]
+    )
+    for task_id in candidates:
+        claimed = Task.objects.filter(pk=task_id, status=Task.STATUS_QUEUED, attempts__lt=F('max_attempts')).update(
+            status=Task.STATUS_RUNNING,
+            locked_by=worker,
+            locked_at=timezone.now(),
+            attempts=F('attempts') + 1,
+            updated_at=timezone.now(),
+        )
+        if claimed:
+            return Task.objects.get(pk=task_id)
+    return None
+
+
+def run_task(task_obj):
+    """Runs a claimed task and records its outcome, scheduling retries"""
+    options = _registry.get(task_obj.name)
+    try:
+        if options is None:
+            raise LookupError(f"Unknown task '{task_obj.name}'")
+        result = options['func'](TaskContext(task_obj), **task_obj.kwargs)
+    except Exception as e:
+        logger.exception('Task %s failed', task_obj)
+        error = f"{e}\n\n{traceback.format_exc()}"
+        if task_obj.attempts < task_obj.max_attempts:
+            backoff = settings.TASK_RETRY_BACKOFF * (2 ** (task_obj.attempts - 1))
+            _requeue(task_obj.pk, error=error, run_after=timezone.now() + timedelta(seconds=backoff))
+        else:
+            Task.objects.filter(pk=task_obj.pk).update(
+                status=Task.STATUS_FAILED,
+                finished_at=timezone.now(),
+                error=error,
+                updated_at=timezone.now(),
+            )
+        return False
+
+    Task.objects.filter(pk=task_obj.pk).update(
+        status=Task.STATUS_DONE,
+        finished_at=timezone.now(),
+        result=result,
+        error='',
+        updated_at=timezone.now(),
+    )
+    return True
+
+
+def run_pending(worker=None, queues=None, limit=None):
+    """Runs queued tasks in this thread until none are runnable"""
+    discover_tasks()
+    worker = worker or worker_id()
+    processed = 0
+    while limit is None or processed < limit:
+        task_obj = claim_next(worker, queues)
+        if task_obj is None:
+            break
+        try:
+            run_task(task_obj)
+        finally:
+            close_old_connections()
+        processed += 1
+    return processed
+
+
+def seconds_until_next_task(now=None):
+    """
+    How long the embedded worker may sleep: until the earliest queued task
+    is due, at most TASK_EMBEDDED_MAX_SLEEP so that tasks queued by other
+    processes and stale locks are still noticed. Due tasks that could not be
+    claimed are waiting for queue capacity, so those are polled.
+    """
+    now = now or timezone.now()
+    next_run = (
+        Task.objects.filter(status=Task.STATUS_QUEUED)
+        .order_by('run_after').values_list('run_after', flat=True).first()
+    )
+    if next_run is None:
+        return settings.TASK_EMBEDDED_MAX_SLEEP
+    if next_run <= now:
+        return settings.TASK_POLL_INTERVAL
+    return min((next_run - now).total_seconds(), settings.TASK_EMBEDDED_MAX_SLEEP)
+
+
+def _run_embedded():
+    requeued_at = None
+    while True:
+        _embedded_wakeup.clear()
+        try:
+            # On start, then periodically: a restart mid-task leaves its row
+            # running, holding a slot of the queue's concurrency limit
+            if requeued_at is None or time.monotonic() - requeued_at >= settings.TASK_EMBEDDED_MAX_SLEEP:
+                requeue_stale_tasks()
+                requeued_at = time.monotonic()
+            run_pending()
+            timeout = seconds_until_next_task()
+        except Exception:
+            logger.exception('Embedded task worker failed')
+            timeout = settings.TASK_POLL_INTERVAL
+        finally:
+            close_old_connections()
+        _embedded_wakeup.wait(timeout)
+
+
+def _kick_embedded_worker(**kwargs):
+    """
+    Drains the queue on a thread inside the web process, for development and
+    single-process deployments that do not run ``manage.py run_worker``.
+    The thread lives as long as the process and sleeps until the next queued
+    task is due; kicking it wakes it up to look again.
+    """
+    global _embedded_thread
+    if not settings.TASK_QUEUE_EMBEDDED_WORKER:
+        return
+    with _embedded_lock:
+        if _embedded_thread is None or not _embedded_thread.is_alive():
+            _embedded_thread = threading.Thread(target=_run_embedded, name='task-queue', daemon=True)
+            _embedded_thread.start()
+    _embedded_wakeup.set()
+
+
+def start_embedded_worker(**kwargs):
+    """request_started receiver: starts the embedded worker with the web process"""
+    if settings.TASK_QUEUE_EMBEDDED_WORKER and (_embedded_thread is None or not _embedded_thread.is_alive()):
+        _kick_embedded_worker()
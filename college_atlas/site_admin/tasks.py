@@ -0,0 +1,79 @@
+import os
+
+from .task_queue import task
+from .bulk_import import estimate_rows, import_colleges, upload_storage
+from .importer import load_data_from_json
+from .images import generate_image_derivatives
+from .duplicates import find_duplicates as find_duplicate_pairs, save_candidates
+from .models import College
+from .versioning import bump_dataset_version
+
+
+@task('images.generate_derivatives', queue='images')
+def generate_derivatives(ctx, college_id, force=False):
+    variants = generate_image_derivatives(college_id, force=force)
+    return {'variants': len(variants or {})}
+
+
+@task('images.rebuild_all', queue='images', max_attempts=1)
+def rebuild_all_derivatives(ctx, force=False):
+    """Backfills derivatives for every uploaded image, like the management command"""
+    colleges = College.objects.exclude(image='').exclude(image__isnull=True)
+    if not force:
+        colleges = colleges.filter(image_variants={})
+    college_ids = list(colleges.values_list('id', flat=True))
+
+    failed = 0
+    for index, college_id in enumerate(college_ids, start=1):
+        try:
+            generate_image_derivatives(college_id, force=force)
+        except Exception:
+            failed += 1
+        if index % 10 == 0 or index == len(college_ids):
+            ctx.set_progress(index, len(college_ids), f'{failed} failed')
+    return {'processed': len(college_ids) - failed, 'failed': failed}
+
+
+@task('data.import_json', queue='imports', max_attempts=1)
+def import_json(ctx, data_dir=None):
+    lines = []
+    result = load_data_from_json(
+        data_dir,
+        log=lines.append,
+        progress=lambda done, total: ctx.set_progress(done, total, f'{done} of {total} files'),
+    )
+    # The import runs in one transaction per file with signals per row; one
+    # bump after it is what readers need
+    bump_dataset_version()
+    return {**(result or {}), 'log': '\n'.join(lines)[-4000:]}
+
+
+@task('colleges.bulk_import', queue='imports', max_attempts=1)
+def bulk_import_colleges(ctx, path, filename):
+    storage = upload_storage()
+    try:
+        with storage.open(path, 'rb') as fileobj:
+            total = estimate_rows(fileobj, filename)
+        ctx.set_progress(0, total, 'Reading file')
+        with storage.open(path, 'rb') as fileobj:
+            summary = import_colleges(
+                fileobj,
+                filename,
+                progress=lambda done: ctx.set_progress(done, max(done, total), f'{done} rows processed'),
+            )
+        ctx.set_progress(summary['rows'], summary['rows'], f"{summary['rows']} rows processed")
+        return summary
+    finally:
+        storage.delete(path)
+        try:
+            os.rmdir(os.path.dirname(storage.path(path)))
+        except OSError:
+            pass
+
+
+@task('colleges.find_duplicates', queue='imports', max_attempts=1)
+def find_duplicates(ctx):
+    pairs = find_duplicate_pairs(
+        progress=lambda done, total: ctx.set_progress(done, total, f'{done} of {total} pairs scored'),
+    )
+    return {'pairs': len(pairs), 'open': save_candidates(pairs)}
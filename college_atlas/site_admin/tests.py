@@ -1,3 +1,650 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import connection, connections, router
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from college_atlas.db_router import reset_replica, use_replica
+from college_atlas.middleware import PRIMARY_PIN_COOKIE
+
+from . import duplicates, geocoder, task_queue
+from .changes import changes_since, decode_cursor, feed_transaction
+from .duplicates import candidate_pairs, find_duplicates, geohash, normalize_name, save_candidates
+from .geocoder import get_locator, load_locator, repair_districts
+from .importer import load_data_from_json
+from .models import College, Country, DatasetVersion, District, DuplicateCandidate, State, Task
+from .paginator import EstimatedCountPaginator
+from .versioning import VERSION_ROW
+
+
+def create_colleges(count, district=None, **fields):
+    """``count`` colleges in one district, named College 0, College 1, ..."""
+    if district is None:
+        country, _ = Country.objects.get_or_create(name='India')
+        state, _ = State.objects.get_or_create(name='Tamil Nadu', country=country)
+        district, _ = District.objects.get_or_create(name='Chennai', state=state)
+    return [
+        College.objects.create(
+            name=f'College {number}', district=district, address_line='1 Main Road', pincode='600001', **fields,
+        )
+        for number in range(count)
+    ]
+
+
+@override_settings(TASK_QUEUE_EMBEDDED_WORKER=False)
+class EstimatedCountPaginatorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_colleges(25)
+
+    def paginator(self, estimate):
+        paginator = EstimatedCountPaginator(College.objects.order_by('pk'), 10, exact_threshold=5)
+        with mock.patch.object(connections['default'], 'vendor', 'postgresql'), \
+                mock.patch.object(paginator, '_planner_estimate', return_value=estimate):
+            paginator.count
+        return paginator
+
+    def test_short_page_settles_the_count(self):
+        paginator = self.paginator(estimate=100)
+        self.assertTrue(paginator.is_estimated)
+        page = paginator.get_page(3)
+        self.assertEqual(len(page.object_list), 5)
+        self.assertEqual(paginator.count, 25)
+        self.assertFalse(paginator.is_estimated)
+        self.assertFalse(page.has_next())
+
+    def test_empty_page_past_the_real_end_falls_back_to_the_last_page(self):
+        paginator = self.paginator(estimate=100)
+        page = paginator.get_page(7)
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(page.object_list), 5)
+        self.assertEqual(paginator.count, 25)
+        self.assertEqual(paginator.num_pages, 3)
+        self.assertFalse(paginator.is_estimated)
+
+    def test_full_page_keeps_the_estimate(self):
+        paginator = self.paginator(estimate=100)
+        paginator.get_page(2)
+        self.assertTrue(paginator.is_estimated)
+        self.assertEqual(paginator.count, 100)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], TASK_QUEUE_EMBEDDED_WORKER=False)
+class ReplicaRoutingTests(TestCase):
+    """
+    The primary is the test database, the replica a second SQLite file
+    holding other rows. The replica is not in settings, so the test runner
+    neither creates nor migrates it; the class adds it for its own tests.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = connections.configure_settings({
+            'default': {},
+            'replica': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(cls.replica_dir.name, 'replica.sqlite3'),
+            },
+        })['replica']
+        with connections['replica'].schema_editor() as editor:
+            for model in apps.get_app_config('site_admin').get_models():
+                editor.create_model(model)
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.replica_dir.cleanup()
+
+    @classmethod
+    def setUpTestData(cls):
+        create_colleges(1)
+        country = Country.objects.using('replica').create(name='Replica only')
+        state = State.objects.using('replica').create(name='Kerala', country=country)
+        district = District.objects.using('replica').create(name='Kochi', state=state)
+        cls.replica_college = College.objects.using('replica').create(
+            id=1000, name='Replica College', district=district, address_line='1 Beach Road', pincode='682001',
+        )
+
+    def test_reads_use_the_replica_only_when_enabled(self):
+        self.assertFalse(Country.objects.filter(name='Replica only').exists())
+        token = use_replica(True)
+        try:
+            self.assertTrue(Country.objects.filter(name='Replica only').exists())
+            self.assertEqual(router.db_for_read(User), 'default')
+        finally:
+            reset_replica(token)
+
+    def test_writes_go_to_the_primary(self):
+        token = use_replica(True)
+        try:
+            Country.objects.create(name='Written')
+        finally:
+            reset_replica(token)
+        self.assertTrue(Country.objects.using('default').filter(name='Written').exists())
+        self.assertFalse(Country.objects.using('replica').filter(name='Written').exists())
+
+    def test_public_pages_read_from_the_replica(self):
+        url = f'/college/{self.replica_college.pk}/'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        url = f'/college/{self.replica_college.pk}/'
+        response = self.client.post('/site-admin/login/')
+        self.assertIn(PRIMARY_PIN_COOKIE, response.cookies)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+calls = []
+
+
+@task_queue.task('tests.record')
+def record(context, value):
+    calls.append(value)
+    return value
+
+
+@task_queue.task('tests.flaky', max_attempts=2)
+def flaky(context):
+    calls.append('flaky')
+    raise RuntimeError('Temporarily unavailable')
+
+
+@override_settings(TASK_QUEUE_EMBEDDED_WORKER=False, TASK_RETRY_BACKOFF=30, TASK_EMBEDDED_MAX_SLEEP=60)
+class TaskQueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def at(self, seconds):
+        """Patches the queue's clock to ``seconds`` from now"""
+        return mock.patch.object(task_queue.timezone, 'now', return_value=timezone.now() + timedelta(seconds=seconds))
+
+    def test_delayed_task_runs_once_due(self):
+        task_obj = task_queue.enqueue('tests.record', delay=timedelta(seconds=20), value=1)
+        self.assertEqual(task_queue.run_pending(), 0)
+        self.assertAlmostEqual(task_queue.seconds_until_next_task(), 20, delta=1)
+        with self.at(21):
+            self.assertEqual(task_queue.run_pending(), 1)
+        task_obj.refresh_from_db()
+        self.assertEqual(task_obj.status, Task.STATUS_DONE)
+        self.assertEqual(task_obj.result, 1)
+        self.assertEqual(calls, [1])
+
+    def test_embedded_worker_sleeps_at_most_max_sleep(self):
+        self.assertEqual(task_queue.seconds_until_next_task(), 60)
+        task_queue.enqueue('tests.record', delay=timedelta(hours=1), value=1)
+        self.assertEqual(task_queue.seconds_until_next_task(), 60)
+
+    def test_failed_task_is_retried_after_a_backoff(self):
+        task_obj = task_queue.enqueue('tests.flaky')
+        with self.assertLogs('site_admin.task_queue', 'ERROR'):
+            task_queue.run_pending()
+        task_obj.refresh_from_db()
+        self.assertEqual((task_obj.status, task_obj.attempts), (Task.STATUS_QUEUED, 1))
+        self.assertIn('Temporarily unavailable', task_obj.error)
+        self.assertAlmostEqual((task_obj.run_after - timezone.now()).total_seconds(), 30, delta=1)
+
+        self.assertEqual(task_queue.run_pending(), 0)
+        with self.at(31), self.assertLogs('site_admin.task_queue', 'ERROR'):
+            self.assertEqual(task_queue.run_pending(), 1)
+        task_obj.refresh_from_db()
+        self.assertEqual((task_obj.status, task_obj.attempts), (Task.STATUS_FAILED, 2))
+        self.assertEqual(calls, ['flaky', 'flaky'])
+
+    def test_dedupe_pushes_the_task_back_up_to_max_delay(self):
+        options = {'delay': timedelta(seconds=10), 'dedupe_key': 'rebuild', 'max_delay': timedelta(seconds=25)}
+        first = task_queue.enqueue('tests.record', value=1, **options)
+        for seconds in (5, 10, 20):
+            with self.at(seconds):
+                self.assertEqual(task_queue.enqueue('tests.record', value=1, **options), first)
+        first.refresh_from_db()
+        self.assertEqual(first.run_after, first.created_at + timedelta(seconds=25))
+        self.assertEqual(Task.objects.count(), 1)
+
+    @override_settings(TASK_LOCK_TIMEOUT=60)
+    def test_stale_running_tasks_are_requeued(self):
+        task_obj = task_queue.enqueue('tests.record', value=1)
+        Task.objects.filter(pk=task_obj.pk).update(
+            status=Task.STATUS_RUNNING, locked_by='gone:1', locked_at=timezone.now() - timedelta(minutes=5),
+        )
+        self.assertEqual(task_queue.requeue_stale_tasks(), 1)
+        self.assertEqual(task_queue.run_pending(), 1)
+        self.assertEqual(calls, [1])
+
+    @override_settings(TASK_LOCK_TIMEOUT=60)
+    def test_progress_keeps_a_long_task_from_counting_as_stale(self):
+        task_obj = task_queue.enqueue('tests.record', value=1)
+        task_queue.claim_next('worker:1')
+        with self.at(-300):
+            Task.objects.filter(pk=task_obj.pk).update(locked_at=timezone.now())
+        task_obj.refresh_from_db()
+        task_queue.TaskContext(task_obj).set_progress(10, 100)
+        self.assertEqual(task_queue.requeue_stale_tasks(), 0)
+        task_obj.refresh_from_db()
+        self.assertEqual((task_obj.status, task_obj.locked_by), (Task.STATUS_RUNNING, 'worker:1'))
+
+    @override_settings(TASK_LOCK_TIMEOUT=60)
+    def test_stale_tasks_out_of_attempts_fail_instead_of_rerunning(self):
+        task_obj = task_queue.enqueue('tests.record', value=1)
+        Task.objects.filter(pk=task_obj.pk).update(
+            status=Task.STATUS_RUNNING, attempts=3, locked_by='gone:1',
+            locked_at=timezone.now() - timedelta(minutes=5),
+        )
+        self.assertEqual(task_queue.requeue_stale_tasks(), 0)
+        self.assertEqual(task_queue.run_pending(), 0)
+        task_obj.refresh_from_db()
+        self.assertEqual(task_obj.status, Task.STATUS_FAILED)
+        self.assertEqual(calls, [])
+
+    def test_tasks_out_of_attempts_are_not_claimed(self):
+        task_obj = task_queue.enqueue('tests.record', value=1)
+        Task.objects.filter(pk=task_obj.pk).update(attempts=3)
+        self.assertIsNone(task_queue.claim_next('worker:1'))
+        self.assertEqual(calls, [])
+
+
+@override_settings(TASK_QUEUE_EMBEDDED_WORKER=False)
+class JsonImportTests(TransactionTestCase):
+    """Not wrapped in a transaction, so that commits during the import are observable"""
+
+    def write_files(self, directory, count):
+        for number in range(count):
+            rows = [{
+                'state': 'Tamil Nadu', 'district': 'Madurai', 'college': f'College {number} (Id: C-{number})',
+                'university': 'Madurai Kamaraj University (Id: U-0001)', 'address': 'Main Road, Madurai 625001',
+            }]
+            with open(os.path.join(directory, f'file{number}_colleges_details.json'), 'w', encoding='utf-8') as output:
+                json.dump(rows, output)
+
+    def test_progress_is_reported_between_committed_files(self):
+        seen = []
+
+        def progress(done, total):
+            # What another connection, e.g. the dashboard, would see by now
+            seen.append((done, total, connection.in_atomic_block, College.objects.count()))
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_files(directory, 3)
+            result = load_data_from_json(directory, log=lambda line: None, progress=progress)
+        self.assertEqual(result['added'], 3)
+        self.assertEqual(seen, [(1, 3, False, 1), (2, 3, False, 2), (3, 3, False, 3)])
+
+
+@override_settings(TASK_QUEUE_EMBEDDED_WORKER=False)
+class DuplicateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(name='Tamil Nadu', country=Country.objects.create(name='India'))
+        chennai, madurai, unknown = (
+            District.objects.create(name=name, state=state) for name in ('Chennai', 'Madurai', 'Unknown')
+        )
+
+        def college(name, district, pincode, point=None):
+            latitude, longitude = point or (None, None)
+            return College.objects.create(
+                name=name, district=district, address_line='1 Main Road', pincode=pincode,
+                latitude=latitude, longitude=longitude,
+            ).pk
+
+        cls.ids = {
+            # Same district and pincode, no coordinates
+            'guindy': college('Govt. Engg. College, Guindy', chennai, '600025'),
+            'guindy_again': college('Government Engineering College Guindy', chennai, '600 025'),
+            'madurai': college('Government Engineering College Madurai', madurai, '625001'),
+            # A few hundred metres apart, one under the importer's placeholder district
+            'sri_ram': college('Sri Ram Institute of Technology', chennai, '600001', (13.0827, 80.2707)),
+            'sri_ram_again': college('Shree Ram Inst. of Tech.', unknown, '', (13.0840, 80.2712)),
+            # The same name far away
+            'sri_ram_madurai': college('Sri Ram Institute of Technology', madurai, '625002', (9.9252, 78.1198)),
+            'loyola': college('Loyola College', chennai, '600034'),
+        }
+
+    def pairs(self):
+        return {(pair.college_id, pair.other_id): pair for pair in find_duplicates()}
+
+    def pair(self, first, second):
+        return tuple(sorted((self.ids[first], self.ids[second])))
+
+    def test_normalize_name(self):
+        self.assertEqual(normalize_name('Govt. Engg. College, Guindy'), 'government engineering college guindy')
+        self.assertEqual(normalize_name('A.B.C. Arts & Science Coll.'), 'abc arts science college')
+        self.assertEqual(normalize_name('St. Joseph\'s College'), 'saint joseph s college')
+
+    def test_near_duplicates_in_the_same_place_pair_up(self):
+        pairs = self.pairs()
+        self.assertEqual(set(pairs), {self.pair('guindy', 'guindy_again'), self.pair('sri_ram', 'sri_ram_again')})
+        guindy = pairs[self.pair('guindy', 'guindy_again')]
+        self.assertEqual((guindy.name_similarity, guindy.distance_km), (1.0, None))
+        self.assertEqual(guindy.reasons, 'name, pincode')
+        sri_ram = pairs[self.pair('sri_ram', 'sri_ram_again')]
+        self.assertAlmostEqual(sri_ram.distance_km, 0.15, places=2)
+        self.assertIn('geohash', sri_ram.reasons)
+
+    def test_similar_names_in_other_places_are_compared_but_not_paired(self):
+        candidates = candidate_pairs(duplicates._load())
+        for first, second in (('guindy_again', 'madurai'), ('sri_ram', 'sri_ram_madurai')):
+            with self.subTest(pair=(first, second)):
+                self.assertEqual(candidates[self.pair(first, second)], duplicates.NAME)
+                self.assertNotIn(self.pair(first, second), self.pairs())
+
+    def test_colleges_with_nothing_in_common_are_not_compared(self):
+        candidates = candidate_pairs(duplicates._load())
+        self.assertNotIn(self.pair('loyola', 'sri_ram_madurai'), candidates)
+
+    def test_oversized_blocks_are_skipped(self):
+        with mock.patch.object(duplicates, 'MAX_NAME_BLOCK_SIZE', 3):
+            candidates = candidate_pairs(duplicates._load())
+        # "college" is shared by four colleges, "guindy" by two
+        self.assertNotIn(self.pair('loyola', 'guindy'), candidates)
+        self.assertIn(self.pair('guindy', 'guindy_again'), candidates)
+
+    def test_pairs_straddling_a_geohash_cell_boundary_are_compared(self):
+        width = 360.0 / 2 ** 15
+        boundary = -180.0 + round((80.2707 + 180.0) / width) * width
+        colleges = {
+            1: {'normalized': 'a', 'point': (13.0827, boundary - 0.0001), 'pincode': ''},
+            2: {'normalized': 'b', 'point': (13.0827, boundary + 0.0001), 'pincode': ''},
+        }
+        self.assertNotEqual(geohash(*colleges[1]['point']), geohash(*colleges[2]['point']))
+        self.assertEqual(candidate_pairs(colleges), {(1, 2): duplicates.GEOHASH})
+
+    def test_saving_keeps_dismissed_pairs_dismissed(self):
+        self.assertEqual(save_candidates(find_duplicates()), 2)
+        DuplicateCandidate.objects.filter(college_id=self.pair('guindy', 'guindy_again')[0]).update(
+            status=DuplicateCandidate.STATUS_DISMISSED,
+        )
+        self.assertEqual(save_candidates(find_duplicates()), 1)
+        self.assertEqual(
+            list(DuplicateCandidate.objects.values_list('college_id', 'other_id', 'status')),
+            [
+                (*self.pair('guindy', 'guindy_again'), DuplicateCandidate.STATUS_DISMISSED),
+                (*self.pair('sri_ram', 'sri_ram_again'), DuplicateCandidate.STATUS_OPEN),
+            ],
+        )
+
+
+def square(min_lng, min_lat, max_lng, max_lat):
+    return [[min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat], [min_lng, max_lat], [min_lng, min_lat]]
+
+
+def boundary_feature(state, district, *rings, keys=('state', 'district')):
+    return {
+        'type': 'Feature',
+        'properties': {keys[0]: state, keys[1]: district},
+        'geometry': {'type': 'Polygon', 'coordinates': list(rings)},
+    }
+
+
+# Two neighbouring districts, one with a hole holding a district of another
+# state (as Puducherry sits inside Tamil Nadu) and one far away
+BOUNDARIES = {
+    'type': 'FeatureCollection',
+    'features': [
+        boundary_feature('Tamil Nadu', 'Chennai', square(80.0, 12.9, 80.4, 13.3)),
+        boundary_feature('Tamil Nadu', 'Chengalpattu', square(79.6, 12.9, 80.0, 13.3)),
+        boundary_feature('Tamil Nadu', 'Villupuram', square(79.2, 11.8, 79.8, 12.4), square(79.4, 12.0, 79.6, 12.2)),
+        boundary_feature('Puducherry', 'Puducherry', square(79.4, 12.0, 79.6, 12.2), keys=('ST_NM', 'dtname')),
+        boundary_feature('Kerala', 'Ernakulam', square(76.2, 9.8, 76.6, 10.2)),
+    ],
+}
+
+# Points as (latitude, longitude); offshore is about 24 km east of Chennai's centroid
+CHENNAI, CHENGALPATTU, VILLUPURAM, PUDUCHERRY = (13.1, 80.2), (13.1, 79.8), (12.3, 79.3), (12.1, 79.5)
+OFFSHORE, FAR_AWAY = (13.1, 80.42), (20.0, 85.0)
+
+
+@override_settings(TASK_QUEUE_EMBEDDED_WORKER=False, GEOCODER_MAX_FALLBACK_KM=25)
+class GeocoderTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        state = State.objects.create(name='Tamil Nadu', country=Country.objects.create(name='India'))
+        cls.chennai = District.objects.create(name='Chennai', state=state)
+        cls.unknown = District.objects.create(name='Unknown', state=state)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'district_boundaries.geojson')
+        with open(self.path, 'w', encoding='utf-8') as output:
+            json.dump(BOUNDARIES, output)
+        self.locator = load_locator(self.path)
+        cache = mock.patch.dict(geocoder._cache, {'key': None, 'locator': None})
+        cache.start()
+        self.addCleanup(cache.stop)
+
+    def test_points_are_located_in_their_polygon(self):
+        points = [CHENNAI, CHENGALPATTU, VILLUPURAM, PUDUCHERRY]
+        names, exact = self.locator.locate_many([lat for lat, _ in points], [lng for _, lng in points])
+        self.assertEqual(names, [
+            ('Tamil Nadu', 'Chennai'), ('Tamil Nadu', 'Chengalpattu'),
+            ('Tamil Nadu', 'Villupuram'), ('Puducherry', 'Puducherry'),
+        ])
+        self.assertEqual(exact.tolist(), [True] * 4)
+
+    def test_points_in_no_polygon_fall_back_to_the_nearest_centroid(self):
+        names, exact = self.locator.locate_many([OFFSHORE[0], FAR_AWAY[0], None], [OFFSHORE[1], FAR_AWAY[1], None])
+        self.assertEqual(names, [('Tamil Nadu', 'Chennai'), None, None])
+        self.assertEqual(exact.tolist(), [False, False, False])
+        self.assertIsNone(self.locator.locate_many([OFFSHORE[0]], [OFFSHORE[1]], max_fallback_km=10)[0][0])
+
+    def test_points_only_match_districts_of_their_state(self):
+        self.assertEqual(self.locator.locate(*CHENNAI, 'TAMIL  NADU'), ('Tamil Nadu', 'Chennai'))
+        self.assertIsNone(self.locator.locate(*CHENNAI, 'Kerala'))
+        # Inside Puducherry's polygon, so only the nearest Tamil Nadu centroid is left
+        names, exact = self.locator.locate_many([PUDUCHERRY[0]], [PUDUCHERRY[1]], ['Tamil Nadu'])
+        self.assertEqual((names, exact.tolist()), ([('Tamil Nadu', 'Villupuram')], [False]))
+        self.assertIsNone(self.locator.locate(*OFFSHORE, 'Puducherry'))
+
+    def test_locator_is_reloaded_when_the_file_changes(self):
+        with override_settings(DISTRICT_BOUNDARIES_FILE=self.path + '.missing'):
+            self.assertIsNone(get_locator())
+        with override_settings(DISTRICT_BOUNDARIES_FILE=self.path):
+            locator = get_locator()
+            self.assertEqual(len(locator), 5)
+            self.assertIs(get_locator(), locator)
+            with open(self.path, 'w', encoding='utf-8') as output:
+                json.dump({'type': 'FeatureCollection', 'features': BOUNDARIES['features'][:2]}, output)
+            os.utime(self.path, (0, os.path.getmtime(self.path) + 10))
+            self.assertEqual(len(get_locator()), 2)
+
+    def test_repair_moves_colleges_to_the_district_of_their_coordinates(self):
+        def college(name, point, district=self.unknown):
+            return College.objects.create(
+                name=name, district=district, address_line='1 Main Road', pincode='600001',
+                latitude=point[0], longitude=point[1],
+            ).pk
+
+        ids = {
+            'chennai': college('Madras College', CHENNAI),
+            'chengalpattu': college('Tambaram College', CHENGALPATTU),
+            'offshore': college('Marina College', OFFSHORE),
+            'far_away': college('Far College', FAR_AWAY),
+            'conflict': college('Presidency College', CHENNAI),
+        }
+        college('Presidency College', CHENNAI, district=self.chennai)
+        unknown = College.objects.filter(pk__in=ids.values())
+        version = DatasetVersion.objects.get(pk=VERSION_ROW).version
+
+        self.assertEqual(
+            repair_districts(self.locator, unknown, dry_run=True),
+            {'checked': 5, 'moved': 3, 'unlocated': 1, 'conflicts': 1},
+        )
+        self.assertFalse(District.objects.filter(name='Chengalpattu').exists())
+        self.assertEqual(
+            repair_districts(self.locator, unknown, exact_only=True),
+            {'checked': 5, 'moved': 2, 'unlocated': 2, 'conflicts': 1},
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            summary = repair_districts(self.locator, College.objects.filter(pk__in=ids.values()))
+        self.assertEqual(summary, {'checked': 5, 'moved': 1, 'unlocated': 1, 'conflicts': 1})
+        # bulk_update sends no signals; the cached data must still go stale
+        self.assertGreater(DatasetVersion.objects.get(pk=VERSION_ROW).version, version)
+
+        districts = dict(College.objects.filter(pk__in=ids.values()).values_list('pk', 'district__name'))
+        self.assertEqual({name: districts[pk] for name, pk in ids.items()}, {
+            'chennai': 'Chennai', 'chengalpattu': 'Chengalpattu', 'offshore': 'Chennai',
+            'far_away': 'Unknown', 'conflict': 'Unknown',
+        })
+        self.assertEqual(District.objects.filter(name__iexact='chennai').count(), 1)
+
+    def test_import_assigns_districts_to_rows_without_one(self):
+        rows = [
+            {'state': 'Tamil Nadu', 'district': '', 'college': 'Madras College (Id: C-1)',
+             'latitude': str(CHENNAI[0]), 'longitude': str(CHENNAI[1])},
+            {'state': 'Tamil Nadu', 'district': '', 'college': 'Far College (Id: C-2)',
+             'latitude': str(FAR_AWAY[0]), 'longitude': str(FAR_AWAY[1])},
+            {'state': 'Tamil Nadu', 'district': 'Madurai', 'college': 'Madurai College (Id: C-3)',
+             'latitude': str(CHENNAI[0]), 'longitude': str(CHENNAI[1])},
+        ]
+        with tempfile.TemporaryDirectory() as directory, override_settings(DISTRICT_BOUNDARIES_FILE=self.path):
+            with open(os.path.join(directory, 'tn_colleges_details.json'), 'w', encoding='utf-8') as output:
+                json.dump(rows, output)
+            result = load_data_from_json(directory, log=lambda line: None)
+        self.assertEqual((result['added'], result['located']), (3, 1))
+        self.assertEqual(
+            dict(College.objects.values_list('name', 'district__name')),
+            {'Madras College': 'Chennai', 'Far College': 'Unknown', 'Madurai College': 'Madurai'},
+        )
+        # The existing district was reused, not created again
+        self.assertEqual(College.objects.get(name='Madras College').district, self.chennai)
+
+
+@override_settings(CHANGE_FEED_SETTLE_SECONDS=0, TASK_QUEUE_EMBEDDED_WORKER=False)
+class ChangeFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.colleges = create_colleges(5)
+
+    def sync(self, cursor=None, limit=3):
+        """Every change after ``cursor``, paging ``limit`` at a time; returns (changes, last cursor)"""
+        changes = []
+        while True:
+            page = changes_since(cursor, limit)
+            changes.extend(page['changes'])
+            cursor = decode_cursor(page['next'])
+            if not page['has_more']:
+                return changes, cursor
+
+    def test_pages_cover_every_row_once_with_parents_first(self):
+        changes, _ = self.sync()
+        district = self.colleges[0].district
+        self.assertEqual(
+            [(change['type'], change['id']) for change in changes],
+            [('country', district.state.country_id), ('state', district.state_id), ('district', district.pk)]
+            + [('college', college.pk) for college in self.colleges],
+        )
+        self.assertEqual(changes[-1]['data']['degree_ids'], [])
+
+    def test_cursor_only_returns_later_changes(self):
+        _, cursor = self.sync()
+        self.assertEqual(changes_since(cursor, 10)['changes'], [])
+
+        College.objects.filter(pk=self.colleges[1].pk).update(name='Renamed', updated_at=timezone.now())
+        deleted_pk = self.colleges[2].pk
+        College.objects.filter(pk=deleted_pk).delete()
+        changes, cursor = self.sync(cursor)
+        self.assertEqual(
+            [(change['type'], change['id'], change.get('deleted', False)) for change in changes],
+            [('college', self.colleges[1].pk, False), ('college', deleted_pk, True)],
+        )
+        self.assertEqual(changes[0]['data']['name'], 'Renamed')
+        self.assertEqual(self.sync(cursor)[0], [])
+
+    def test_recent_rows_are_held_back(self):
+        with override_settings(CHANGE_FEED_SETTLE_SECONDS=60):
+            page = changes_since(None, 10)
+        self.assertEqual((page['changes'], page['next'], page['has_more']), ([], '', False))
+
+    def test_invalid_cursors_are_rejected(self):
+        # Not base64, not three numbers, a rank past the tombstones
+        tokens = ('x', base64.urlsafe_b64encode(b'not-a-cursor').decode(), base64.urlsafe_b64encode(b'1.9.1').decode())
+        for token in tokens:
+            with self.subTest(token=token), self.assertRaises(ValueError):
+                decode_cursor(token)
+
+    def test_feed_transaction_restamps_rows_at_commit(self):
+        _, cursor = self.sync()
+        began = timezone.now() + timedelta(minutes=1)
+        committed = began + timedelta(minutes=10)
+        # A client syncing while the transaction runs has paged past its
+        # writes by the time they commit; the restamp puts them after that
+        with mock.patch.object(timezone, 'now', return_value=began):
+            with feed_transaction():
+                College.objects.filter(pk=self.colleges[0].pk).update(name='Imported', updated_at=timezone.now())
+                timezone.now.return_value = committed
+            changes, _ = self.sync(cursor)
+        self.assertEqual(
+            [(change['id'], change['updated_at']) for change in changes], [(self.colleges[0].pk, committed)],
+        )
+
+
+class UniversityMigrationTests(TransactionTestCase):
+    """Migration 0014 turning the free-text university column into University rows"""
+    before = [('site_admin', '0013_geo_extents')]
+    after = [('site_admin', '0014_university')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes('site_admin'))
+
+    def test_spelling_variants_share_a_university_and_reverse_restores_the_names(self):
+        old_apps = self.migrate(self.before)
+        Country, State, District, College = (
+            old_apps.get_model('site_admin', name) for name in ('Country', 'State', 'District', 'College')
+        )
+        state = State.objects.create(name='Tamil Nadu', country=Country.objects.create(name='India'))
+        district = District.objects.create(name='Chennai', state=state)
+        spellings = [
+            'Anna University, Chennai', 'Anna University, Chennai', 'ANNA UNIV  CHENNAI', 'جامعة القاهرة', '',
+        ]
+        for number, university in enumerate(spellings):
+            College.objects.create(
+                name=f'College {number}', district=district, university=university,
+                address_line='1 Main Road', pincode='600001',
+            )
+
+        new_apps = self.migrate(self.after)
+        University = new_apps.get_model('site_admin', 'University')
+        College = new_apps.get_model('site_admin', 'College')
+        self.assertEqual(
+            sorted(University.objects.values_list('name', 'key')),
+            [('Anna University, Chennai', 'anna university chennai'), ('جامعة القاهرة', 'جامعة القاهرة')],
+        )
+        linked = dict(College.objects.values_list('name', 'university__name'))
+        self.assertEqual(linked, {
+            'College 0': 'Anna University, Chennai', 'College 1': 'Anna University, Chennai',
+            'College 2': 'Anna University, Chennai', 'College 3': 'جامعة القاهرة', 'College 4': None,
+        })
+
+        old_apps = self.migrate(self.before)
+        College = old_apps.get_model('site_admin', 'College')
+        self.assertEqual(
+            list(College.objects.order_by('name').values_list('university', flat=True)),
+            # Blank names had no university to keep; the column is nullable
+            ['Anna University, Chennai'] * 3 + ['جامعة القاهرة', None],
+        )
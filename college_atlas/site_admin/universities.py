@@ -0,0 +1,61 @@
+"""
+Universities colleges are affiliated to.
+
+Sources spell the same university several ways ("Anna University, Chennai",
+"ANNA UNIVERSITY CHENNAI", "Anna Univ. Chennai"), so University rows are
+unique on a normalized key rather than on the name, and every write path
+goes through ``resolve_university`` or ``UniversityResolver`` to map a name
+to its row.
+"""
+from .duplicates import normalize_name
+from .models import University
+
+
+def university_key(name):
+    """
+    The normalized form spelling variants of a university name share. Names
+    with no Latin letters or digits, which normalize_name would reduce to
+    nothing, are keyed on their casefolded words instead.
+    """
+    key = normalize_name(name)
+    if not key:
+        key = ' '.join((name or '').casefold().split())
+    return key[:500]
+
+
+def resolve_university(name):
+    """The University for ``name``, created if missing; None for a blank name"""
+    name = ' '.join((name or '').split())
+    key = university_key(name)
+    if not key:
+        return None
+    university, _ = University.objects.get_or_create(key=key, defaults={'name': name[:500]})
+    return university
+
+
+class UniversityResolver:
+    """Maps names to University ids in bulk, remembering them across calls"""
+
+    def __init__(self):
+        self.ids = {}
+
+    def load(self, names):
+        """Looks up the universities for ``names``, creating the missing ones"""
+        wanted = {}
+        for name in names:
+            name = ' '.join((name or '').split())
+            key = university_key(name)
+            if key and key not in self.ids:
+                wanted.setdefault(key, name[:500])
+        if not wanted:
+            return
+        existing = dict(University.objects.filter(key__in=wanted).values_list('key', 'id'))
+        missing = [University(key=key, name=name) for key, name in wanted.items() if key not in existing]
+        if missing:
+            # bulk_create skips save(), so the keys are set above
+            University.objects.bulk_create(missing, ignore_conflicts=True, batch_size=500)
+            existing = dict(University.objects.filter(key__in=wanted).values_list('key', 'id'))
+        self.ids.update(existing)
+
+    def id(self, name):
+        return self.ids.get(university_key(' '.join((name or '').split())))
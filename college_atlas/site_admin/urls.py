@@ -9,6 +9,13 @@ urlpatterns = [
     path('colleges/create/', views.create_college, name='create_college'),
     path('colleges/<int:pk>/edit/', views.edit_college, name='edit_college'),
     path('colleges/<int:pk>/delete/', views.delete_college, name='delete_college'),
+    path('colleges/grid/', views.college_grid_save, name='college_grid_save'),
+    path('colleges/bulk/', views.college_bulk_action, name='college_bulk_action'),
+    path('colleges/import/', views.import_colleges, name='import_colleges'),
+    path('colleges/import/<int:pk>/', views.import_status, name='import_status'),
+    path('colleges/import/<int:pk>/errors.csv', views.import_errors, name='import_errors'),
+    path('colleges/duplicates/', views.duplicate_list, name='duplicate_list'),
+    path('colleges/duplicates/<int:pk>/resolve/', views.resolve_duplicate, name='resolve_duplicate'),
     
     path('degrees/', views.degree_list, name='degree_list'),
     path('degrees/create/', views.create_degree, name='create_degree'),
@@ -29,4 +36,14 @@ urlpatterns = [
     path('districts/create/', views.create_district, name='create_district'),
     path('districts/<int:pk>/edit/', views.edit_district, name='edit_district'),
     path('districts/<int:pk>/delete/', views.delete_district, name='delete_district'),
+    
+    path('tasks/', views.task_list, name='task_list'),
+    path('tasks/start/', views.start_task, name='start_task'),
+    path('api/tasks/', views.task_status, name='task_status'),
+    path('api/tasks/<int:pk>/', views.task_detail, name='task_detail'),
+    path('api/throttle-metrics/', views.throttle_metrics, name='throttle_metrics'),
+
+    path('api/districts/', views.district_autocomplete, name='district_autocomplete'),
+    path('api/degrees/', views.degree_autocomplete, name='degree_autocomplete'),
+    path('api/states/', views.state_autocomplete, name='state_autocomplete'),
 ]
@@ -0,0 +1,97 @@
+"""
+The dataset version: a counter bumped on every write to the college data.
+
+Cache entries and in-memory snapshots derived from the data record the
+version they were built from, so admin edits invalidate them without
+explicit deletes. The counter is a DatasetVersion row on the primary
+database, so every web and worker process agrees on it whatever the cache
+backend. Each process re-reads it at most every DATASET_VERSION_CHECK_INTERVAL
+seconds and sees its own bumps at once.
+
+The same row holds the card version, which only moves when something a
+rendered college card shows besides the college row itself changes (see
+public.cards), so that editing one college does not invalidate every card.
+"""
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import Signal
+
+from .models import DatasetVersion
+
+# Sent after every bump, with the new version, for derived data that is
+# rebuilt rather than looked up by version (e.g. the static atlas snapshot)
+dataset_version_bumped = Signal()
+
+VERSION_ROW = 1
+
+COUNTERS = ('version', 'card_version')
+
+_local = {'version': None, 'card_version': None, 'checked_at': 0.0}
+_local_lock = threading.Lock()
+
+
+def _versions():
+    return DatasetVersion.objects.using('default').filter(pk=VERSION_ROW)
+
+
+def _remember(row):
+    with _local_lock:
+        _local.update(dict(zip(COUNTERS, row or (1, 1))), checked_at=time.monotonic())
+    return _local['version']
+
+
+def _is_current():
+    return (
+        _local['version'] is not None
+        and time.monotonic() - _local['checked_at'] < settings.DATASET_VERSION_CHECK_INTERVAL
+    )
+
+
+def get_dataset_version():
+    """Returns the current dataset version"""
+    if not _is_current():
+        _remember(_versions().values_list(*COUNTERS).first())
+    return _local['version']
+
+
+async def aget_dataset_version():
+    """Async counterpart of get_dataset_version for async views"""
+    if not _is_current():
+        _remember(await _versions().values_list(*COUNTERS).afirst())
+    return _local['version']
+
+
+def get_card_version():
+    """Returns the current card version"""
+    if not _is_current():
+        _remember(_versions().values_list(*COUNTERS).first())
+    return _local['card_version']
+
+
+def _bump(counter):
+    if not _versions().update(**{counter: F(counter) + 1}):
+        DatasetVersion.objects.using('default').get_or_create(pk=VERSION_ROW, defaults={counter: 2})
+    version = _remember(_versions().values_list(*COUNTERS).first())
+    if counter == 'version':
+        dataset_version_bumped.send(sender=None, version=version)
+
+
+def bump_dataset_version():
+    """
+    Marks all cached data derived from colleges and geography as stale.
+    Bulk operations that bypass model signals must call this themselves.
+
+    Inside a transaction the bump happens when it commits: data rebuilt
+    under the new version must be able to see the write.
+    """
+    transaction.on_commit(partial(_bump, 'version'), using='default')
+
+
+def bump_card_version():
+    """Marks every cached college card as stale, when its transaction commits"""
+    transaction.on_commit(partial(_bump, 'card_version'), using='default')
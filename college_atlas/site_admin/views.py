@@ -1,12 +1,27 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse, HttpResponse
 from django.db.models import Count, Q
 from django.contrib import messages
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
-from .models import College, Degree, State, District, Country
+from .models import College, Degree, State, District, Country, DuplicateCandidate, Task
+from .paginator import EstimatedCountPaginator
+from .images import schedule_image_derivatives
+from .task_queue import enqueue
+from .bulk_import import COLUMNS, ImportFileError, iter_rows, upload_storage
+from .batch_edit import BULK_ACTIONS, apply_bulk_action, apply_grid_changes
+from .duplicates import merge_colleges
+from .universities import resolve_university
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
+from django.utils.http import url_has_allowed_host_and_scheme
+from college_atlas.throttling import throttled_counts
+import csv
+import os
 import json
+import uuid
 
 
 def admin_login(request):
@@ -41,50 +56,119 @@ def admin_logout(request):
     return redirect('admin_login')
 
 
-@login_required(login_url='admin_login')
-def admin_dashboard(request):
-    """
-    Custom admin dashboard view with college listing
-    """
-    search_query = request.GET.get('search', '')
-    college_type_filter = request.GET.get('college_type', '')
-    district_filter = request.GET.get('district', '')
-    
-    colleges = College.objects.select_related('district__state').prefetch_related('degrees')
-    
+def _filtered_colleges(params):
+    """Colleges matching the dashboard's search and filter parameters"""
+    search_query = params.get('search', '')
+    college_type_filter = params.get('college_type', '')
+    district_filter = params.get('district', '')
+
+    colleges = College.objects.all()
+
     if search_query:
         colleges = colleges.filter(
             Q(name__icontains=search_query) | 
             Q(district__name__icontains=search_query)
         )
-    
+
     if college_type_filter:
         colleges = colleges.filter(college_type=college_type_filter)
-    
+
     if district_filter:
+        if not (district_filter.isascii() and district_filter.isdigit()):
+            return colleges.none()
         colleges = colleges.filter(district_id=district_filter)
+
+    return colleges
+
+
+@login_required(login_url='admin_login')
+def admin_dashboard(request):
+    """
+    Custom admin dashboard view with college listing
+    """
+    search_query = request.GET.get('search', '')
+    college_type_filter = request.GET.get('college_type', '')
+    district_filter = request.GET.get('district', '')
+    grid_mode = request.GET.get('mode') == 'grid'
+    
+    colleges = _filtered_colleges(request.GET).select_related('district__state', 'university')
+    if not grid_mode:
+        colleges = colleges.prefetch_related('degrees')
     
     colleges = colleges.order_by('name')
     
-    paginator = Paginator(colleges, 10)
+    paginator = EstimatedCountPaginator(colleges, 50 if grid_mode else 10)
     page_number = request.GET.get('page', 1)
     page_obj = paginator.get_page(page_number)
     
-    districts = District.objects.select_related('state').order_by('name')
+    # Only the active filter value is rendered; other districts load on demand
+    selected_district = None
+    if district_filter.isascii() and district_filter.isdigit():
+        selected_district = District.objects.select_related('state').filter(pk=district_filter).first()
     
     context = {
         'page_obj': page_obj,
         'search_query': search_query,
         'college_type_filter': college_type_filter,
         'district_filter': district_filter,
-        'districts': districts,
+        'selected_district': selected_district,
         'college_types': College.COLLEGE_TYPES,
-        'total_colleges': College.objects.count(),
+        'grid_mode': grid_mode,
+        'bulk_actions': BULK_ACTIONS,
     }
     
     return render(request, 'site_admin/dashboard.html', context)
 
 
+@login_required(login_url='admin_login')
+@require_http_methods(["POST"])
+def college_grid_save(request):
+    """
+    AJAX endpoint for the dashboard grid; takes only the changed cells as
+    {"changes": {college id: {field: value}}}
+    """
+    try:
+        changes = json.loads(request.body)['changes']
+        updated, errors = apply_grid_changes(changes)
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': f'Error saving changes: {str(e)}'}, status=500)
+
+    if errors:
+        return JsonResponse({'updated': 0, 'errors': errors}, status=400)
+    return JsonResponse({'updated': updated, 'errors': {}})
+
+
+@login_required(login_url='admin_login')
+@require_http_methods(["POST"])
+def college_bulk_action(request):
+    """Applies an action bar operation to the selected or all filtered colleges"""
+    action = request.POST.get('action', '')
+
+    if request.POST.get('scope') == 'filtered':
+        colleges = _filtered_colleges(request.POST)
+    else:
+        colleges = College.objects.filter(pk__in=[pk for pk in request.POST.getlist('ids') if pk.isascii() and pk.isdigit()])
+
+    try:
+        count = apply_bulk_action(colleges, action, request.POST.get('value') or None)
+        plural = '' if count == 1 else 's'
+        if action == 'delete':
+            messages.success(request, f'{count} college{plural} deleted')
+        else:
+            messages.success(request, f'{BULK_ACTIONS[action]}: {count} college{plural} updated')
+    except ValidationError as e:
+        messages.error(request, ' '.join(e.messages))
+    except Exception as e:
+        messages.error(request, f'Error applying action: {str(e)}')
+
+    next_url = request.POST.get('next', '')
+    if url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('admin_dashboard')
+
+
 @login_required(login_url='admin_login')
 def create_college(request):
     """
@@ -108,7 +192,7 @@ def create_college(request):
             
             college = College.objects.create(
                 name=name,
-                university=university or None,
+                university=resolve_university(university),
                 college_type=college_type,
                 district_id=district_id,
                 address_line=address_line,
@@ -124,18 +208,16 @@ def create_college(request):
             if degree_ids:
                 college.degrees.set(degree_ids)
             
+            if college.image:
+                schedule_image_derivatives(college.pk)
+            
             messages.success(request, f'College "{name}" created successfully!')
             return redirect('admin_dashboard')
             
         except Exception as e:
             messages.error(request, f'Error creating college: {str(e)}')
     
-    districts = District.objects.select_related('state').order_by('state__name', 'name')
-    degrees = Degree.objects.order_by('name')
-    
     context = {
-        'districts': districts,
-        'degrees': degrees,
         'college_types': College.COLLEGE_TYPES,
         'is_edit': False,
     }
@@ -148,12 +230,12 @@ def edit_college(request, pk):
     """
     View to edit an existing college
     """
-    college = get_object_or_404(College, pk=pk)
+    college = get_object_or_404(College.objects.select_related('district__state'), pk=pk)
     
     if request.method == 'POST':
         try:
             college.name = request.POST.get('name')
-            college.university = request.POST.get('university') or None
+            college.university = resolve_university(request.POST.get('university'))
             college.college_type = request.POST.get('college_type')
             college.district_id = request.POST.get('district')
             college.address_line = request.POST.get('address_line')
@@ -164,27 +246,30 @@ def edit_college(request, pk):
             college.latitude = request.POST.get('latitude') or None
             college.longitude = request.POST.get('longitude') or None
             
-            if 'image' in request.FILES:
+            new_image = 'image' in request.FILES
+            if new_image:
                 college.image = request.FILES['image']
+                college.image_variants = {}
             
             college.save()
             
             degree_ids = request.POST.getlist('degrees')
             college.degrees.set(degree_ids)
             
+            if new_image:
+                schedule_image_derivatives(college.pk)
+            
             messages.success(request, f'College "{college.name}" updated successfully!')
             return redirect('admin_dashboard')
             
         except Exception as e:
             messages.error(request, f'Error updating college: {str(e)}')
     
-    districts = District.objects.select_related('state').order_by('state__name', 'name')
-    degrees = Degree.objects.order_by('name')
-    
+    # District and degree options are searched on demand; only the current
+    # selections are rendered into the form
     context = {
         'college': college,
-        'districts': districts,
-        'degrees': degrees,
+        'selected_degrees': college.degrees.only('id', 'name'),
         'college_types': College.COLLEGE_TYPES,
         'is_edit': True,
     }
@@ -507,7 +592,10 @@ def district_list(request):
         )
     
     if state_filter:
-        districts = districts.filter(state_id=state_filter)
+        if state_filter.isascii() and state_filter.isdigit():
+            districts = districts.filter(state_id=state_filter)
+        else:
+            districts = districts.none()
     
     districts = districts.order_by('name')
     
@@ -515,13 +603,15 @@ def district_list(request):
     page_number = request.GET.get('page', 1)
     page_obj = paginator.get_page(page_number)
     
-    states = State.objects.select_related('country').order_by('name')
+    selected_state = None
+    if state_filter.isascii() and state_filter.isdigit():
+        selected_state = State.objects.select_related('country').filter(pk=state_filter).first()
     
     context = {
         'page_obj': page_obj,
         'search_query': search_query,
         'state_filter': state_filter,
-        'states': states,
+        'selected_state': selected_state,
         'total_districts': District.objects.count(),
     }
     
@@ -595,3 +685,306 @@ def delete_district(request, pk):
         messages.error(request, f'Error deleting district: {str(e)}')
     
     return redirect('district_list')
+
+
+@login_required(login_url='admin_login')
+def import_colleges(request):
+    """Upload a CSV/XLSX file of colleges to be imported in the background"""
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        try:
+            if upload is None:
+                raise ImportFileError('Choose a file to upload')
+            if upload.size > settings.BULK_IMPORT_MAX_UPLOAD_BYTES:
+                raise ImportFileError('The file is too large')
+
+            # Check the format and header now so mistakes show up immediately
+            next(iter_rows(upload, upload.name), None)
+            upload.seek(0)
+
+            path = upload_storage().save(f'{uuid.uuid4().hex}/{os.path.basename(upload.name)}', upload)
+            task = enqueue('colleges.bulk_import', path=path, filename=upload.name)
+
+            messages.success(request, f'"{upload.name}" uploaded, import started')
+            return redirect('import_status', pk=task.pk)
+
+        except ImportFileError as e:
+            messages.error(request, str(e))
+        except Exception as e:
+            messages.error(request, f'Error uploading file: {str(e)}')
+
+    context = {
+        'columns': COLUMNS,
+        'college_types': College.COLLEGE_TYPES,
+        'recent_imports': Task.objects.filter(name='colleges.bulk_import').defer('kwargs', 'result')[:5],
+    }
+
+    return render(request, 'site_admin/college_import.html', context)
+
+
+@login_required(login_url='admin_login')
+def import_status(request, pk):
+    """Progress and per-row error report of one bulk import"""
+    task = get_object_or_404(Task, pk=pk, name='colleges.bulk_import')
+
+    context = {
+        'task': task,
+        'filename': task.kwargs.get('filename', ''),
+        'summary': task.result or {},
+        'error_message': task.error.split('\n', 1)[0] if task.status == Task.STATUS_FAILED else '',
+    }
+
+    return render(request, 'site_admin/import_status.html', context)
+
+
+@login_required(login_url='admin_login')
+def import_errors(request, pk):
+    """Download the error report of a finished import as CSV"""
+    task = get_object_or_404(Task, pk=pk, name='colleges.bulk_import')
+
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="import-{task.pk}-errors.csv"'
+    writer = csv.writer(response)
+    writer.writerow(['line', 'name', 'errors'])
+    for error in (task.result or {}).get('errors', []):
+        writer.writerow([error['line'], error['name'], '; '.join(error['errors'])])
+
+    return response
+
+
+AUTOCOMPLETE_PAGE_SIZE = 20
+
+
+def _autocomplete_page(request, queryset, serialize):
+    """Slice an autocomplete queryset into one page of JSON results"""
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+
+    start = (page - 1) * AUTOCOMPLETE_PAGE_SIZE
+    # Fetch one extra row to know whether another page exists without a COUNT
+    rows = list(queryset[start:start + AUTOCOMPLETE_PAGE_SIZE + 1])
+
+    return JsonResponse({
+        'results': [serialize(obj) for obj in rows[:AUTOCOMPLETE_PAGE_SIZE]],
+        'has_more': len(rows) > AUTOCOMPLETE_PAGE_SIZE,
+    })
+
+
+@login_required(login_url='admin_login')
+def district_autocomplete(request):
+    """AJAX endpoint for searchable district selects"""
+    search_query = request.GET.get('q', '').strip()
+    state_id = request.GET.get('state')
+
+    districts = District.objects.select_related('state').only('id', 'name', 'state__name')
+
+    if search_query:
+        districts = districts.filter(
+            Q(name__icontains=search_query) |
+            Q(state__name__icontains=search_query)
+        )
+
+    if state_id:
+        if not (state_id.isascii() and state_id.isdigit()):
+            return JsonResponse({'results': [], 'has_more': False})
+        districts = districts.filter(state_id=int(state_id))
+
+    districts = districts.order_by('state__name', 'name', 'id')
+
+    return _autocomplete_page(request, districts, lambda district: {
+        'id': district.id,
+        'text': district.name,
+        'group': district.state.name,
+    })
+
+
+@login_required(login_url='admin_login')
+def degree_autocomplete(request):
+    """AJAX endpoint for searchable degree selects"""
+    search_query = request.GET.get('q', '').strip()
+
+    degrees = Degree.objects.only('id', 'name')
+
+    if search_query:
+        degrees = degrees.filter(name__icontains=search_query)
+
+    degrees = degrees.order_by('name', 'id')
+
+    return _autocomplete_page(request, degrees, lambda degree: {
+        'id': degree.id,
+        'text': degree.name,
+    })
+
+
+@login_required(login_url='admin_login')
+def state_autocomplete(request):
+    """AJAX endpoint for searchable state selects"""
+    search_query = request.GET.get('q', '').strip()
+
+    states = State.objects.select_related('country').only('id', 'name', 'country__name')
+
+    if search_query:
+        states = states.filter(
+            Q(name__icontains=search_query) |
+            Q(country__name__icontains=search_query)
+        )
+
+    states = states.order_by('name', 'id')
+
+    return _autocomplete_page(request, states, lambda state: {
+        'id': state.id,
+        'text': f"{state.name}, {state.country.name}",
+    })
+
+
+# Admin-triggered background jobs: action -> (task name, kwargs, label)
+TASK_ACTIONS = {
+    'warm_cards': ('cards.warm', {}, 'Warm college card cache'),
+    'rebuild_images': ('images.rebuild_all', {'force': True}, 'Rebuild image thumbnails'),
+    'import_data': ('data.import_json', {}, 'Import colleges from data files'),
+    'find_duplicates': ('colleges.find_duplicates', {}, 'Find duplicate colleges'),
+}
+
+
+def _serialize_task(task):
+    return {
+        'id': task.id,
+        'name': task.name,
+        'status': task.status,
+        'progress': task.progress,
+        'progress_total': task.progress_total,
+        'percent': task.progress_percent,
+        'message': task.message,
+        'attempts': task.attempts,
+        'created_at': task.created_at.isoformat(),
+        'finished_at': task.finished_at.isoformat() if task.finished_at else None,
+    }
+
+
+@login_required(login_url='admin_login')
+def task_list(request):
+    """Background task history with controls to start admin jobs"""
+    status_filter = request.GET.get('status', '')
+
+    tasks = Task.objects.defer('kwargs', 'result', 'error')
+
+    if status_filter:
+        tasks = tasks.filter(status=status_filter)
+
+    paginator = Paginator(tasks.order_by('-created_at'), 20)
+    page_number = request.GET.get('page', 1)
+    page_obj = paginator.get_page(page_number)
+
+    context = {
+        'page_obj': page_obj,
+        'status_filter': status_filter,
+        'statuses': Task.STATUSES,
+        'task_actions': [(action, label) for action, (_, _, label) in TASK_ACTIONS.items()],
+    }
+
+    return render(request, 'site_admin/task_list.html', context)
+
+
+@login_required(login_url='admin_login')
+@require_http_methods(["POST"])
+def start_task(request):
+    """Queues one of the admin jobs in TASK_ACTIONS"""
+    action = request.POST.get('action', '')
+
+    if action not in TASK_ACTIONS:
+        messages.error(request, 'Unknown task')
+        return redirect('task_list')
+
+    name, kwargs, label = TASK_ACTIONS[action]
+    try:
+        enqueue(name, dedupe_key=f'admin:{action}', **kwargs)
+        messages.success(request, f'"{label}" queued')
+    except Exception as e:
+        messages.error(request, f'Error queueing task: {str(e)}')
+
+    next_url = request.POST.get('next', '')
+    if url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('task_list')
+
+
+@login_required(login_url='admin_login')
+def task_detail(request, pk):
+    """AJAX endpoint with the progress of a single task"""
+    task = get_object_or_404(Task.objects.defer('kwargs', 'result', 'error'), pk=pk)
+    return JsonResponse(_serialize_task(task))
+
+
+@login_required(login_url='admin_login')
+def task_status(request):
+    """AJAX endpoint polled by the task panels for queued and running tasks"""
+    active = Task.objects.filter(
+        status__in=[Task.STATUS_QUEUED, Task.STATUS_RUNNING]
+    ).defer('kwargs', 'result', 'error').order_by('-priority', 'run_after')[:10]
+
+    return JsonResponse({'tasks': [_serialize_task(task) for task in active]})
+
+
+@login_required(login_url='admin_login')
+def duplicate_list(request):
+    """Likely duplicate college pairs found by find_duplicates, for review"""
+    status_filter = request.GET.get('status', DuplicateCandidate.STATUS_OPEN)
+
+    candidates = DuplicateCandidate.objects.select_related(
+        'college__district__state', 'other__district__state',
+    )
+    if status_filter:
+        candidates = candidates.filter(status=status_filter)
+
+    paginator = Paginator(candidates, 20)
+    page_number = request.GET.get('page', 1)
+    page_obj = paginator.get_page(page_number)
+
+    context = {
+        'page_obj': page_obj,
+        'status_filter': status_filter,
+        'statuses': DuplicateCandidate.STATUSES,
+    }
+
+    return render(request, 'site_admin/duplicate_list.html', context)
+
+
+@login_required(login_url='admin_login')
+@require_http_methods(["POST"])
+def resolve_duplicate(request, pk):
+    """Merges a candidate pair into the chosen college, or dismisses it"""
+    candidate = get_object_or_404(DuplicateCandidate.objects.select_related('college', 'other'), pk=pk)
+    action = request.POST.get('action', '')
+
+    try:
+        if action == 'dismiss':
+            candidate.status = DuplicateCandidate.STATUS_DISMISSED
+            candidate.save(update_fields=['status', 'updated_at'])
+            messages.success(request, 'Pair marked as not a duplicate')
+        elif action in ('keep_college', 'keep_other'):
+            keep, duplicate = candidate.college, candidate.other
+            if action == 'keep_other':
+                keep, duplicate = duplicate, keep
+            duplicate_name = duplicate.name
+            merge_colleges(keep, duplicate)
+            messages.success(request, f'"{duplicate_name}" merged into "{keep.name}"')
+        else:
+            messages.error(request, 'Unknown action')
+    except Exception as e:
+        messages.error(request, f'Error resolving duplicate: {str(e)}')
+
+    next_url = request.POST.get('next', '')
+    if url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('duplicate_list')
+
+
+@login_required(login_url='admin_login')
+def throttle_metrics(request):
+    """Throttled request counts per rate limit scope, for monitoring"""
+    return JsonResponse({
+        'enabled': settings.THROTTLE_ENABLED,
+        'scopes': throttled_counts(),
+    })